@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+
+# Kept free of the model and feature imports, so asking a running server
+# from a pre-commit hook only costs the interpreter start-up
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"assess-{os.getuid()}.sock")
+
+
+def query_server(request, socket_path=DEFAULT_SOCKET, timeout=30):
+	"""Send one request to a running server and return its response."""
+	with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+		client.settimeout(timeout)
+		client.connect(socket_path)
+		client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+		with client.makefile("rb") as f:
+			return json.loads(f.readline())
+
+
+def format_result(result):
+	probability = "" if result["probability"] is None else f" ({result['probability']:.2f})"
+	return f"{result['file']}:{result['lineno']}: {result['name']} {result['label']}{probability}"
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Predict the quality of every function in Python files.",
+		epilog="Start a server once with --serve; later runs with --socket answer without loading the model.",
+	)
+	parser.add_argument("paths", nargs="*", help="Python files to assess; '-' reads a snippet from stdin")
+	parser.add_argument("--model", help="model bundle written by assessor.save_model")
+	parser.add_argument("--serve", action="store_true", help="keep the model loaded and answer requests on --socket")
+	parser.add_argument("--socket", help=f"Unix socket of a running server (default for --serve: {DEFAULT_SOCKET})")
+	parser.add_argument("--json", action="store_true", help="print results as JSON")
+	parser.add_argument("--fail-on", metavar="LABEL", help="exit with status 1 if any function gets this label")
+	args = parser.parse_args()
+
+	if args.serve:
+		if not args.model:
+			parser.error("--serve needs --model")
+		from assessor import Assessor, serve
+		serve(Assessor(args.model), args.socket or DEFAULT_SOCKET)
+		sys.exit(0)
+
+	files = [os.path.abspath(p) for p in args.paths if p != "-"]
+	snippet = sys.stdin.read() if "-" in args.paths else None
+
+	requests = []
+	if files:
+		requests.append({"files": files})
+	if snippet is not None:
+		requests.append({"source": snippet})
+
+	results = None
+	if args.socket:
+		try:
+			results = []
+			for request in requests:
+				response = query_server(request, args.socket)
+				if "error" in response:
+					print(f"[ERROR] Server failed: {response['error']}")
+					sys.exit(2)
+				results.extend(response["results"])
+		except OSError as e:
+			if not args.model:
+				print(f"[ERROR] No server on {args.socket}: {e}")
+				sys.exit(2)
+			# Fall back to loading the model in this process
+			results = None
+
+	if results is None:
+		if not args.model:
+			parser.error("give --model, or --socket of a running server")
+		from assessor import Assessor
+		assessor = Assessor(args.model)
+		results = assessor.assess_files(files)
+		if snippet is not None:
+			results += assessor.assess_source(snippet)
+
+	if args.json:
+		print(json.dumps(results, indent=2))
+	else:
+		for result in results:
+			print(format_result(result))
+
+	if args.fail_on is not None and any(str(r["label"]) == args.fail_on for r in results):
+		sys.exit(1)
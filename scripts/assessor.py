@@ -0,0 +1,164 @@
+import json
+import os
+import signal
+import socketserver
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_records import ARRAY_COLUMNS, FeatureBatch
+from github_scraper import GitHubScraper
+
+# Columns the notebooks train on: numeric and boolean features minus the
+# all-null, target (and the lint counts it is derived from) and grouping
+# columns (see data_exploration.ipynb)
+MODEL_FEATURES = [
+	name for name in ARRAY_COLUMNS
+	if name not in ("estimated_branches", "quality_score", "num_violations", "quality", "duplicate_cluster")
+]
+
+def save_model(path, model, preprocessor=None, label_encoder=None, columns=MODEL_FEATURES):
+	"""
+	Save a trained model with everything needed to score new code.
+
+	`columns` is the order of the features the preprocessor (or the model,
+	without one) was fitted on, e.g. `list(X_train.columns)`.
+	"""
+	unknown = [c for c in columns if c not in ARRAY_COLUMNS]
+	if unknown:
+		raise ValueError(f"Columns are not extractor features: {unknown}")
+	os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+	joblib.dump({
+		"model": model,
+		"preprocessor": preprocessor,
+		"label_encoder": label_encoder,
+		"columns": list(columns),
+	}, path)
+
+
+class Assessor:
+	"""
+	Score the functions of Python files or snippets with a model saved by save_model.
+
+	The model and preprocessor are loaded once. Every call extracts all of
+	its functions first and runs the preprocessor and model on a single
+	matrix built from the extracted feature arrays.
+	"""
+
+	def __init__(self, model_path):
+		bundle = joblib.load(model_path)
+		self.model = bundle["model"]
+		self.preprocessor = bundle["preprocessor"]
+		self.label_encoder = bundle["label_encoder"]
+		self.columns = bundle["columns"]
+		# Only the extractors behind the model's columns run
+		self.scraper = GitHubScraper(radon_mode="file", columns=self.columns)
+
+	def assess_source(self, code, path="<snippet>"):
+		"""Return one prediction dict per top-level function in `code`."""
+		return self.assess_sources([(path, code)])
+
+	def assess_files(self, paths):
+		"""Return one prediction dict per top-level function in the files at `paths`."""
+		sources = []
+		for path in paths:
+			try:
+				with open(path, encoding="utf-8", errors="replace") as f:
+					sources.append((path, f.read()))
+			except OSError as e:
+				print(f"[ERROR] Failed to read {path}: {e}")
+		return self.assess_sources(sources)
+
+	def assess_sources(self, sources):
+		"""Return predictions for (path, code) pairs, scored as one batch."""
+		features = []
+		for path, code in sources:
+			features.extend(self.scraper.extract_features_from_code(path, code, {}))
+		if not features:
+			return []
+
+		batch = FeatureBatch(keep_snippets=False)
+		batch.extend(features)
+		labels, probabilities = self.predict(batch.to_numpy(self.columns))
+		return [
+			{
+				"file": f.file_path,
+				"name": f.name,
+				"lineno": f.lineno,
+				"label": label,
+				"probability": probability,
+			}
+			for f, label, probability in zip(features, labels, probabilities)
+		]
+
+	def predict(self, X):
+		"""Return (labels, probability of each label) for a feature matrix in `columns` order."""
+		if self.preprocessor is not None:
+			if hasattr(self.preprocessor, "feature_names_in_"):
+				# Fitted on a DataFrame and selecting columns by name
+				X = pd.DataFrame(X, columns=self.columns)
+			X = self.preprocessor.transform(X)
+
+		encoded = np.ravel(self.model.predict(X))
+		if self.label_encoder is not None:
+			labels = self.label_encoder.inverse_transform(encoded.astype(int))
+		else:
+			labels = encoded
+
+		probabilities = [None] * len(labels)
+		if hasattr(self.model, "predict_proba"):
+			try:
+				proba = self.model.predict_proba(X)
+			except (AttributeError, NotImplementedError):
+				# e.g. SVC without probability=True
+				proba = None
+			if proba is not None:
+				index = {c: i for i, c in enumerate(np.ravel(self.model.classes_).tolist())}
+				probabilities = [
+					float(row[index[e]]) for row, e in zip(proba, encoded.tolist())
+				]
+		return np.asarray(labels).tolist(), probabilities
+
+	def handle(self, request):
+		"""Answer one server request: {"files": [...]} or {"source": ..., "path": ...}."""
+		if "files" in request:
+			return {"results": self.assess_files(request["files"])}
+		if "source" in request:
+			return {"results": self.assess_source(request["source"], request.get("path", "<snippet>"))}
+		return {"error": "expected 'files' or 'source'"}
+
+
+class AssessServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+	# One JSON object per line in, one per line out, until the client disconnects
+	def handle(self):
+		for line in self.rfile:
+			start = time.perf_counter()
+			try:
+				response = self.server.assessor.handle(json.loads(line))
+			except Exception as e:
+				response = {"error": str(e)}
+			response["seconds"] = time.perf_counter() - start
+			self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+def serve(assessor, socket_path):
+	"""Answer requests on a Unix socket until interrupted or terminated, keeping the model loaded."""
+	if os.path.exists(socket_path):
+		os.remove(socket_path)
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+	with AssessServer(socket_path, _RequestHandler) as server:
+		server.assessor = assessor
+		print(f"Serving on {socket_path}")
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			os.remove(socket_path)
@@ -0,0 +1,311 @@
+import asyncio
+import json
+import random
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+from feature_cache import from_records, to_records
+from feature_records import FeatureBatch
+from feature_sink import make_sink
+from github_scraper import GitHubScraper
+
+
+def parse_retry_after(value):
+	"""Return the seconds to wait from a Retry-After header (delay or HTTP date), or None if malformed."""
+	try:
+		return max(float(value), 0.0)
+	except ValueError:
+		pass
+	try:
+		return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+	except (TypeError, ValueError, OverflowError):
+		return None
+
+
+def _header_number(headers, name, kind=float):
+	try:
+		return kind(headers[name])
+	except (KeyError, ValueError):
+		return None
+
+
+class TokenBucket:
+	"""
+	Global request scheduler shared by every coroutine of a crawl.
+
+	Refills at `rate` tokens per second up to `capacity`. Rate-limit headers
+	from responses retune the rate so the remaining budget is spread over the
+	rest of the window, and `Retry-After` or an exhausted budget pauses all
+	requests until GitHub allows them again.
+	"""
+
+	def __init__(self, rate=5000 / 3600, capacity=50):
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated = time.monotonic()
+		self.paused_until = 0.0
+		self.lock = asyncio.Lock()
+
+	async def acquire(self):
+		async with self.lock:
+			while True:
+				now = time.monotonic()
+				if now < self.paused_until:
+					await asyncio.sleep(self.paused_until - now)
+					continue
+
+				self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+				self.updated = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				await asyncio.sleep((1 - self.tokens) / self.rate)
+
+	def update(self, headers):
+		"""Adapt to the rate-limit headers of a response."""
+		retry_after = headers.get("Retry-After")
+		if retry_after is not None:
+			delay = parse_retry_after(retry_after)
+			if delay is not None:
+				self.pause(delay)
+
+		# Malformed values are ignored like missing ones
+		remaining = _header_number(headers, "X-RateLimit-Remaining", int)
+		reset = _header_number(headers, "X-RateLimit-Reset")
+		if remaining is None or reset is None:
+			return
+
+		window = max(reset - time.time(), 1.0)
+		if remaining <= 0:
+			self.pause(window)
+		else:
+			self.rate = remaining / window
+
+	def pause(self, seconds):
+		self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AsyncGitHubScraper:
+	"""
+	asyncio counterpart of GitHubScraper built on one shared aiohttp connection pool.
+
+	API requests go through a global TokenBucket, connections are bounded per
+	host, and failed or throttled requests are retried with exponential
+	backoff. `base_url` and `raw_url` can point at a local mock server.
+	"""
+
+	RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+	def __init__(
+		self,
+		token=None,
+		base_url="https://api.github.com",
+		raw_url="https://raw.githubusercontent.com",
+		max_connections=64,
+		max_per_host=16,
+		max_retries=5,
+		bucket=None,
+		radon_mode="file",
+		cache=None,
+		dedup=None,
+	):
+		self.base_url = base_url
+		self.raw_url = raw_url
+		self.max_retries = max_retries
+		self.bucket = bucket or TokenBucket()
+		self.rate_limited_hosts = {urlsplit(base_url).netloc}
+		self.headers = {"Accept": "application/vnd.github.v3+json"}
+		if token:
+			self.headers["Authorization"] = f"token {token}"
+		self.connector_limits = (max_connections, max_per_host)
+		self.session = None
+
+		# Feature extraction and the blob cache are shared with the synchronous scraper
+		self.extractor = GitHubScraper(radon_mode=radon_mode, cache=cache, dedup=dedup)
+		self.repo_info = {}
+
+	async def __aenter__(self):
+		max_connections, max_per_host = self.connector_limits
+		self.session = aiohttp.ClientSession(
+			connector=aiohttp.TCPConnector(limit=max_connections, limit_per_host=max_per_host),
+			headers=self.headers,
+			timeout=aiohttp.ClientTimeout(total=120),
+		)
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.session.close()
+
+	async def request(self, url):
+		"""GET `url`, returning (status, body bytes). Retries throttled and failed requests."""
+		host = urlsplit(url).netloc
+		rate_limited = host in self.rate_limited_hosts
+		status, body = None, None
+
+		for attempt in range(self.max_retries + 1):
+			if rate_limited:
+				await self.bucket.acquire()
+			start = time.perf_counter()
+			try:
+				async with self.session.get(url) as response:
+					status = response.status
+					body = await response.read()
+					self.bucket.update(response.headers)
+					# Secondary rate limits answer 403 with Retry-After while budget remains
+					throttled = status in (403, 429) and (
+						"Retry-After" in response.headers
+						or response.headers.get("X-RateLimit-Remaining") == "0"
+					)
+			except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+				print(f"[WARN] Request to {url} failed: {e}")
+				status, body, throttled = None, None, False
+			metrics.observe("http_fetch_seconds", time.perf_counter() - start, host=host)
+			metrics.inc("http_requests_total", host=host, status=status)
+			if body is not None:
+				metrics.inc("http_bytes_total", len(body), host=host)
+
+			retry = status is None or status in self.RETRY_STATUSES or throttled
+			if not retry or attempt == self.max_retries:
+				break
+
+			# The bucket already waits out rate-limit pauses; this spreads out plain failures
+			await asyncio.sleep(min(60, 2 ** attempt) * random.uniform(0.5, 1.0))
+
+		return status, body
+
+	async def get_json(self, url):
+		status, body = await self.request(url)
+		if status != 200:
+			return status, None
+		return status, json.loads(body)
+
+	async def get_repo_info(self, owner, repo):
+		"""Fetch /repos/{owner}/{repo} once per scraper, however many callers need it."""
+		key = (owner, repo)
+		if key not in self.repo_info:
+			self.repo_info[key] = asyncio.ensure_future(
+				self.get_json(f"{self.base_url}/repos/{owner}/{repo}")
+			)
+		return await self.repo_info[key]
+
+	async def get_repo_metadata(self, owner, repo):
+		"""Fetch repository-level metadata."""
+		status, data = await self.get_repo_info(owner, repo)
+		if data is None:
+			print(f"[ERROR] Failed to fetch repo metadata: {status}")
+			return None
+		return {
+			"name": data["name"],
+			"full_name": data.get("full_name") or f"{owner}/{repo}",
+			"stars": data["stargazers_count"],
+			"forks": data["forks_count"],
+			"watchers": data["subscribers_count"],
+			"language": data["language"],
+			"created_at": data["created_at"],
+			"updated_at": data["updated_at"],
+			"topics": data.get("topics", [])
+		}
+
+	async def get_python_blobs(self, owner, repo):
+		"""Return the path, blob SHA and size of every .py file in a GitHub repo."""
+		status, data = await self.get_repo_info(owner, repo)
+		if data is None:
+			print(f"[ERROR] Could not fetch repo info: {status}")
+			return []
+
+		default_branch = data.get("default_branch", "main")
+		tree_url = f"{self.base_url}/repos/{owner}/{repo}/git/trees/{default_branch}?recursive=1"
+		status, tree_data = await self.get_json(tree_url)
+		if tree_data is None:
+			print(f"[ERROR] Could not fetch file tree: {status}")
+			return []
+
+		return [
+			{"path": f["path"], "sha": f["sha"], "size": f.get("size")}
+			for f in tree_data.get("tree", [])
+			if f["path"].endswith(".py") and f["type"] == "blob"
+		]
+
+	async def download_file_content(self, owner, repo, file_path):
+		"""Download raw content of a file from the repo."""
+		status, body = await self.request(f"{self.raw_url}/{owner}/{repo}/HEAD/{file_path}")
+		if status != 200:
+			print(f"[ERROR] Failed to download {file_path}: {status}")
+			return None
+		return body.decode("utf-8", errors="replace")
+
+	async def get_blob_features(self, owner, repo, blob, repo_metadata):
+		"""Return features for one blob; extraction runs off the event loop."""
+		loop = asyncio.get_running_loop()
+		cache = self.extractor.cache
+		if cache is not None:
+			records = await loop.run_in_executor(None, cache.get, blob["sha"])
+			if records is not None:
+				return self.extractor.drop_seen(from_records(records, blob["path"], repo_metadata))
+
+		code = await self.download_file_content(owner, repo, blob["path"])
+		if code is None:
+			return []
+		# With a cache every function is extracted and cached; duplicates are dropped as for a hit
+		features, complete = await loop.run_in_executor(
+			None, self.extractor.extract_file_features, blob["path"], code, repo_metadata, cache is None
+		)
+		if cache is not None:
+			if complete:
+				await loop.run_in_executor(None, cache.put, blob["sha"], to_records(features))
+			features = self.extractor.drop_seen(features)
+		return features
+
+
+async def process_repository(scraper, owner, repo, sink):
+	"""Async version of main.process_repository using a shared AsyncGitHubScraper."""
+	print(f"\n Processing repository: {owner}/{repo}")
+
+	metadata = await scraper.get_repo_metadata(owner, repo)
+	if not metadata:
+		print("Failed to fetch metadata. Exiting.")
+		return
+
+	py_files = await scraper.get_python_blobs(owner, repo)
+	if not py_files:
+		print("No Python files found. Exiting.")
+		return
+
+	print(f"Found {len(py_files)} Python files")
+
+	# Files are fetched concurrently; the connector bounds how many are in flight
+	all_features = FeatureBatch()
+	for result in asyncio.as_completed([
+		scraper.get_blob_features(owner, repo, blob, metadata) for blob in py_files
+	]):
+		all_features.extend(await result)
+
+	print(f"\nExtracted features from {len(all_features)} functions.")
+
+	# The sink's queue may be full, so hand over off the event loop
+	if all_features:
+		await asyncio.get_running_loop().run_in_executor(None, sink.write, all_features)
+		print("Queued results for writing")
+	else:
+		print("No features to save.")
+
+
+async def crawl(repos, token=None, output_file="features.csv", max_repos=8, **scraper_kwargs):
+	"""Process many repos concurrently over one connection pool and rate-limit scheduler."""
+	semaphore = asyncio.Semaphore(max_repos)
+
+	with make_sink(output_file) as sink:
+		async with AsyncGitHubScraper(token=token, **scraper_kwargs) as scraper:
+			async def run_job(owner, repo):
+				async with semaphore:
+					try:
+						await process_repository(scraper, owner, repo, sink)
+					except Exception as e:
+						print(f"Error processing a repository: {e}")
+
+			await asyncio.gather(*(run_job(owner, repo) for owner, repo in repos))
@@ -0,0 +1,513 @@
+import argparse
+import ast
+import contextlib
+import gc
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from fnmatch import fnmatch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from crawl_pipeline import CrawlPipeline
+from feature_engine import FileRadonMetrics
+from feature_registry import FEATURES
+from feature_sink import make_sink
+from github_scraper import GitHubScraper
+from score_quality import lint_batch
+
+# Default share of throughput a benchmark may lose before compare flags it
+REGRESSION_THRESHOLD = 0.10
+
+SEED = 20240601
+
+
+# ========== Synthetic corpora ==========
+# Each generator returns a list of (path, source) and depends only on `scale`
+# and its seed, so a corpus is byte-identical across runs and machines
+
+def _small_function(rng, name):
+	kind = rng.randrange(4)
+	if kind == 0:
+		return f"def {name}(a, b):\n    return a + b * {rng.randrange(100)}\n"
+	if kind == 1:
+		return (
+			f"def {name}(items):\n"
+			f'    """Return the positive items."""\n'
+			f"    return [x for x in items if x > {rng.randrange(10)}]\n"
+		)
+	if kind == 2:
+		return (
+			f"def {name}(value, default=None):\n"
+			f"    # fall back when the value is missing\n"
+			f"    if value is None:\n"
+			f"        return default\n"
+			f"    return str(value).strip()\n"
+		)
+	return f"@staticmethod\ndef {name}(*args, **kwargs):\n    print(args, kwargs)\n"
+
+
+def _medium_function(rng, name):
+	n = rng.randrange(3, 8)
+	lines = [f"def {name}(data, limit={rng.randrange(1, 50)}, verbose=False):"]
+	lines.append(f'    """Process `data` in {n} passes."""')
+	lines.append("    total = 0")
+	lines.append("    seen = set()")
+	for i in range(n):
+		lines.append(f"    for item in data[{i}::{n}]:")
+		lines.append("        # skip anything already counted")
+		lines.append("        if item in seen:")
+		lines.append("            continue")
+		lines.append(f"        elif item > limit * {i + 1}:")
+		lines.append(f"            total += helper_{i}(item) - {rng.randrange(1000)}")
+		lines.append("        else:")
+		lines.append("            seen.add(item)")
+	lines.append("    if verbose:")
+	lines.append('        print("total", total, len(seen))')
+	lines.append("    return total if total > 0 else -len(seen)")
+	return "\n".join(lines) + "\n"
+
+
+def _deep_function(rng, name, depth):
+	# Mostly ifs: Python allows at most 20 statically nested loops/with/try blocks
+	lines = [f"def {name}(x, items):"]
+	indent = "    "
+	for level in range(depth):
+		if level % 4 == 3:
+			lines.append(f"{indent}for v{level} in items:")
+		else:
+			lines.append(f"{indent}if x > {rng.randrange(100)} and x != {level}:")
+		indent += "    "
+		lines.append(f"{indent}x = x + {level}")
+	lines.append(f"{indent}return x")
+	# Nested closures exercise the per-function bookkeeping of the feature traversal
+	inner = [f"def {name}_outer(n):"]
+	indent = "    "
+	for level in range(8):
+		inner.append(f"{indent}def inner_{level}(m):")
+		indent += "    "
+		inner.append(f"{indent}m = m + {level}")
+	inner.append(f"{indent}return {name}_outer(m - 1) if m > 0 else m")
+	for level in reversed(range(8)):
+		indent = indent[:-4]
+		inner.append(f"{indent}return inner_{level}(n)" if level == 0 else f"{indent}return inner_{level}(m)")
+	return "\n".join(lines) + "\n\n" + "\n".join(inner) + "\n"
+
+
+def _pathological_function(rng, name):
+	kind = rng.randrange(4)
+	if kind == 0:
+		# Long boolean chain
+		terms = " or ".join(f"x == {rng.randrange(10 ** 6)}" for _ in range(400))
+		return f"def {name}(x):\n    return {terms}\n"
+	if kind == 1:
+		# Deeply parenthesized arithmetic (the parser allows up to 200 levels)
+		expr = "x"
+		for i in range(150):
+			expr = f"({expr} + {i})"
+		return f"def {name}(x):\n    y = {expr}\n    return y\n"
+	if kind == 2:
+		# Huge literal returned, expensive to unparse
+		values = ", ".join(f"'{rng.randrange(10 ** 9):x}'" for _ in range(2000))
+		return f"def {name}():\n    return [{values}]\n"
+	# Deeply nested calls
+	expr = "x"
+	for i in range(120):
+		expr = f"f{i % 5}({expr}, {i})"
+	return f"def {name}(x):\n    return {expr}\n"
+
+
+def many_small_corpus(scale=1.0):
+	"""Many short files of tiny functions, where per-file overhead dominates."""
+	rng = random.Random(SEED)
+	files = []
+	for i in range(max(1, int(400 * scale))):
+		body = "\n\n".join(_small_function(rng, f"func_{i}_{j}") for j in range(10))
+		files.append((f"small/module_{i}.py", "import os\n\n\n" + body))
+	return files
+
+
+def huge_file_corpus(scale=1.0):
+	"""One file of thousands of lines, where per-function work that scans the whole file shows up."""
+	rng = random.Random(SEED + 1)
+	body = "\n\n".join(_medium_function(rng, f"process_{j}") for j in range(max(10, int(600 * scale))))
+	return [("huge/module.py", body)]
+
+
+def deep_nesting_corpus(scale=1.0):
+	"""Functions with deeply nested control flow and closures."""
+	rng = random.Random(SEED + 2)
+	files = []
+	for i in range(max(1, int(40 * scale))):
+		body = "\n\n".join(_deep_function(rng, f"nested_{i}_{j}", 40) for j in range(3))
+		files.append((f"deep/module_{i}.py", body))
+	return files
+
+
+def pathological_corpus(scale=1.0):
+	"""Functions built around very long or deeply nested expressions."""
+	rng = random.Random(SEED + 3)
+	files = []
+	for i in range(max(1, int(40 * scale))):
+		body = "\n\n".join(_pathological_function(rng, f"expr_{i}_{j}") for j in range(4))
+		files.append((f"pathological/module_{i}.py", body))
+	return files
+
+
+CORPORA = {
+	"many_small": many_small_corpus,
+	"huge_file": huge_file_corpus,
+	"deep_nesting": deep_nesting_corpus,
+	"pathological": pathological_corpus,
+}
+
+
+def corpus_digest(files):
+	digest = hashlib.sha256()
+	for path, code in files:
+		digest.update(path.encode("utf-8") + b"\0" + code.encode("utf-8") + b"\0")
+	return digest.hexdigest()[:16]
+
+
+# ========== Local GitHub API mock ==========
+
+def git_blob_sha(data):
+	return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class MockGitHub:
+	"""
+	Serves repo metadata, recursive trees and raw files for in-memory repos on localhost.
+
+	`repos` maps (owner, repo) to a list of (path, source). Point the
+	scrapers' `base_url` and `raw_url` at `url`.
+	"""
+
+	def __init__(self, repos):
+		self.repos = {
+			key: {path: code.encode("utf-8") for path, code in files}
+			for key, files in repos.items()
+		}
+		self.server = None
+		self.url = None
+
+	def __enter__(self):
+		mock = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = "HTTP/1.1"
+
+			def do_GET(self):
+				status, body = mock.respond(urlsplit(self.path).path)
+				self.send_response(status)
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+		return self
+
+	def __exit__(self, *exc_info):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def respond(self, path):
+		parts = path.strip("/").split("/")
+		if parts[0] == "repos" and len(parts) >= 3:
+			files = self.repos.get((parts[1], parts[2]))
+			if files is None:
+				return 404, b"{}"
+			if len(parts) == 3:
+				return 200, json.dumps({
+					"name": parts[2],
+					"full_name": f"{parts[1]}/{parts[2]}",
+					"stargazers_count": 100,
+					"forks_count": 10,
+					"subscribers_count": 5,
+					"language": "Python",
+					"created_at": "2020-01-01T00:00:00Z",
+					"updated_at": "2024-01-01T00:00:00Z",
+					"topics": ["benchmark"],
+					"default_branch": "main",
+				}).encode("utf-8")
+			if parts[3:5] == ["git", "trees"]:
+				tree = [
+					{"path": p, "type": "blob", "sha": git_blob_sha(data), "size": len(data)}
+					for p, data in files.items()
+				]
+				return 200, json.dumps({"tree": tree}).encode("utf-8")
+			return 404, b"{}"
+		# Raw files: /{owner}/{repo}/HEAD/{path}
+		if len(parts) >= 4 and parts[2] == "HEAD":
+			data = self.repos.get((parts[0], parts[1]), {}).get("/".join(parts[3:]))
+			if data is not None:
+				return 200, data
+		return 404, b""
+
+
+# ========== Benchmarks ==========
+# Each takes a corpus and returns (number of functions, seconds) for one run
+
+def bench_extract(files, radon_mode="file", columns=None):
+	scraper = GitHubScraper(radon_mode=radon_mode, columns=columns)
+	start = time.perf_counter()
+	count = 0
+	for path, code in files:
+		count += len(scraper.extract_features_from_code(path, code, {}))
+	return count, time.perf_counter() - start
+
+
+def bench_radon(files):
+	# Parsing is not part of the radon stage, so trees are built up front
+	parsed = []
+	for _, code in files:
+		tree = ast.parse(code)
+		parsed.append((tree, [n for n in ast.walk(tree) if isinstance(n, ast.FunctionDef)]))
+	start = time.perf_counter()
+	count = 0
+	for tree, nodes in parsed:
+		radon_metrics = FileRadonMetrics(tree)
+		for node in nodes:
+			radon_metrics.complexity(node)
+			radon_metrics.halstead(node)
+		count += len(nodes)
+	return count, time.perf_counter() - start
+
+
+def bench_lint(files):
+	snippets = []
+	for _, code in files:
+		tree = ast.parse(code)
+		snippets.extend(
+			ast.get_source_segment(code, n) for n in ast.walk(tree) if isinstance(n, ast.FunctionDef)
+		)
+	start = time.perf_counter()
+	lint_batch(snippets)
+	return len(snippets), time.perf_counter() - start
+
+
+def bench_end_to_end(files, workers=None):
+	"""Crawl the corpus as one repo per top-level directory through CrawlPipeline and a mock API."""
+	repos = {}
+	for path, code in files:
+		directory, rel_path = path.split("/", 1)
+		repos.setdefault(("bench", directory), []).append((rel_path, code))
+
+	output = tempfile.mkdtemp(prefix="bench-")
+	try:
+		with MockGitHub(repos) as mock:
+			sink = make_sink(os.path.join(output, "features"))
+			pipeline = CrawlPipeline(
+				sink, io_workers=4, cpu_workers=workers, base_url=mock.url, raw_url=mock.url
+			)
+			start = time.perf_counter()
+			try:
+				pipeline.run(sorted(repos))
+			finally:
+				sink.close()
+			return pipeline.num_functions, time.perf_counter() - start
+	finally:
+		shutil.rmtree(output, ignore_errors=True)
+
+
+BENCHMARKS = {
+	"extract": bench_extract,
+	"radon": bench_radon,
+	"lint": bench_lint,
+}
+
+
+@contextlib.contextmanager
+def quiet_timing():
+	"""Silence progress output and, like timeit, keep the garbage collector out of the timings."""
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		with contextlib.redirect_stdout(io.StringIO()):
+			yield
+	finally:
+		if enabled:
+			gc.enable()
+
+
+def feature_costs(files, radon_mode="file", repeat=5):
+	"""
+	Measure what each extractor of feature_registry adds to extraction.
+
+	Each extractor, with its dependencies, runs alone and is compared with
+	runs that select none, which still parse and walk every file. The two
+	alternate so drift cancels out, and the fastest of `repeat` runs of
+	each is used. Returns {name: microseconds per function}; costs below
+	the timing noise read 0.
+	"""
+	costs = {}
+	with quiet_timing():
+		count = bench_extract(files)[0]  # also warms up
+		for name, feature in FEATURES.items():
+			base, selected = [], []
+			for _ in range(repeat):
+				base.append(bench_extract(files, radon_mode, [])[1])
+				selected.append(bench_extract(files, radon_mode, feature.columns)[1])
+			costs[name] = max(min(selected) - min(base), 0.0) / count * 1e6
+	return costs
+
+
+def measure(bench, files, repeat):
+	"""Run `bench` `repeat` times and report the median."""
+	with quiet_timing():
+		runs = [bench(files) for _ in range(repeat)]
+	count = runs[0][0]
+	seconds = statistics.median(s for _, s in runs)
+	return {
+		"functions": count,
+		"seconds": seconds,
+		"functions_per_second": count / seconds if seconds else None,
+		"runs": [s for _, s in runs],
+	}
+
+
+def environment():
+	try:
+		commit = subprocess.run(
+			["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		commit = None
+	return {
+		"created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+		"commit": commit,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"cpu_count": os.cpu_count(),
+	}
+
+
+def run_benchmarks(scale=1.0, repeat=3, only=None, workers=None):
+	"""
+	Run every benchmark on every corpus, plus the end-to-end crawl of all corpora.
+
+	Results are keyed "{benchmark}/{corpus}"; `only` is a list of glob
+	patterns over those keys.
+	"""
+	corpora = {name: make(scale) for name, make in CORPORA.items()}
+
+	def selected(key):
+		return not only or any(fnmatch(key, pattern) for pattern in only)
+
+	results = {}
+	for bench_name, bench in BENCHMARKS.items():
+		for corpus_name, files in corpora.items():
+			key = f"{bench_name}/{corpus_name}"
+			if selected(key):
+				results[key] = measure(bench, files, repeat)
+				print(f"{key}: {results[key]['functions_per_second']:.0f} functions/s")
+
+	key = "end_to_end/all"
+	if selected(key):
+		all_files = [item for files in corpora.values() for item in files]
+		results[key] = measure(lambda files: bench_end_to_end(files, workers), all_files, repeat)
+		print(f"{key}: {results[key]['functions_per_second']:.0f} functions/s")
+
+	return {
+		"environment": environment(),
+		"scale": scale,
+		"repeat": repeat,
+		"corpora": {name: corpus_digest(files) for name, files in corpora.items()},
+		"results": results,
+	}
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+	"""Return (report lines, regressed keys) comparing throughput of two result files."""
+	lines = []
+	if baseline.get("scale") != current.get("scale") or baseline.get("corpora") != current.get("corpora"):
+		lines.append("WARNING: the runs used different corpora; throughput is not directly comparable")
+
+	regressions = []
+	lines.append(f"{'benchmark':<28} {'baseline':>12} {'current':>12} {'change':>8}")
+	for key in sorted(set(baseline["results"]) | set(current["results"])):
+		old = baseline["results"].get(key, {}).get("functions_per_second")
+		new = current["results"].get(key, {}).get("functions_per_second")
+		if not old or not new:
+			lines.append(f"{key:<28} {'-' if not old else f'{old:.0f}':>12} {'-' if not new else f'{new:.0f}':>12}")
+			continue
+		change = new / old - 1
+		flag = ""
+		if change < -threshold:
+			regressions.append(key)
+			flag = "  REGRESSION"
+		lines.append(f"{key:<28} {old:>12.0f} {new:>12.0f} {change:>+8.1%}{flag}")
+	return lines, regressions
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmark feature extraction, radon, linting and the crawl.")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	run_parser = commands.add_parser("run", help="run the benchmarks and write a JSON result file")
+	run_parser.add_argument("--output", default="benchmark.json")
+	run_parser.add_argument("--scale", type=float, default=1.0, help="corpus size multiplier")
+	run_parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+	run_parser.add_argument("--only", nargs="*", help="glob patterns over benchmark keys, e.g. 'extract/*'")
+	run_parser.add_argument("--workers", type=int, default=None, help="extraction processes for end_to_end")
+	run_parser.add_argument("--compare", metavar="BASELINE", help="compare against this result file afterwards")
+	run_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+	features_parser = commands.add_parser("features", help="list the measured cost of every feature extractor")
+	features_parser.add_argument("--scale", type=float, default=0.25, help="corpus size multiplier")
+	features_parser.add_argument("--repeat", type=int, default=5)
+	features_parser.add_argument("--radon-mode", choices=("file", "snippet"), default="file")
+
+	compare_parser = commands.add_parser("compare", help="flag regressions between two result files")
+	compare_parser.add_argument("baseline")
+	compare_parser.add_argument("current")
+	compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+		help="fractional throughput loss that counts as a regression")
+
+	args = parser.parse_args()
+
+	if args.command == "features":
+		files = [item for make in CORPORA.values() for item in make(args.scale)]
+		costs = feature_costs(files, args.radon_mode, args.repeat)
+		print(f"{'feature':<20} {'declared':>8} {'us/function':>12}  columns")
+		for name, cost in sorted(costs.items(), key=lambda item: -item[1]):
+			feature = FEATURES[name]
+			print(f"{name:<20} {feature.cost:>8} {cost:>12.1f}  {', '.join(feature.columns)}")
+		sys.exit(0)
+
+	if args.command == "run":
+		result = run_benchmarks(args.scale, args.repeat, args.only, args.workers)
+		with open(args.output, "w", encoding="utf-8") as f:
+			json.dump(result, f, indent=2)
+		print(f"Saved results to {args.output}")
+		baseline_file, current = args.compare, result
+	else:
+		baseline_file = args.baseline
+		with open(args.current, encoding="utf-8") as f:
+			current = json.load(f)
+
+	if baseline_file:
+		with open(baseline_file, encoding="utf-8") as f:
+			baseline = json.load(f)
+		lines, regressions = compare(baseline, current, args.threshold)
+		print("\n".join(lines))
+		if regressions:
+			print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+			sys.exit(1)
@@ -2,6 +2,10 @@ import ast
 import re
 import radon.complexity as radon_cc
 from radon.metrics import h_visit
+import metrics
+from feature_registry import wants
+
+BAD_VARIABLE_NAMES = {"x", "y", "z", "tmp", "var", "foo", "bar"}
 
 class CodeFeatureExtractor:
 	
@@ -10,9 +14,11 @@ class CodeFeatureExtractor:
 		self.node_type = node_type  # "function" or "class"
 		self.file_path = file_path
 		self.code_snippet = code_snippet
+		self.lineno = None          # First line of the definition in file_path
 
 		# ========== Repository Metadata ========== 
 		self.repo_name = None
+		self.repo_full_name = None  # "owner/repo"
 		self.repo_stars = None
 		self.repo_forks = None
 		self.repo_watchers = None
@@ -49,36 +55,101 @@ class CodeFeatureExtractor:
 		# ========== Return-Specific ==========
 		self.max_return_length = None
 
+		# ========== Lint, from the whole file ==========
+		self.quality_score = None
+		self.num_violations = None
+		self.violation_codes = None  # JSON object of code -> count
+
 		# ========== Target Label ==========
 		self.quality = None
 
+		# ========== Deduplication ==========
+		self.ast_hash = None           # Normalized AST hash, see dedup_index
+		self.minhash = None            # Encoded MinHash signature, for clustering cache hits
+		self.duplicate_cluster = None  # Shared by exact and near-duplicate functions
+
+
+	def set_features(self, node, summary=None, radon_metrics=None, features=None, source=None):
+		"""
+		Compute the features for `node`.
 
-	def set_features(self, node):
+		`features` is a set of extractor names from feature_registry; only
+		those run and the other columns stay None. None runs all of them.
+		If `summary` (a feature_engine.FunctionSummary) is given, the subtree
+		counts are taken from it instead of walking `node` again. If
+		`radon_metrics` (a feature_engine.FileRadonMetrics) is given, radon
+		results come from the file-level pass instead of `code_snippet`. If
+		`source` (a source_buffer.SourceBuffer of the file) is given, comments
+		are counted from it instead of `code_snippet`.
+		"""
 
 		# Size & Structure
-		self.extract_loc(node)
-		self.extract_num_args(node)
-		self.extract_num_returns(node)
-		self.extract_num_variables(node)
-		self.extract_num_function_calls(node)
-		self.extract_has_decorators(node)
-		self.extract_uses_globals(node)
-		self.extract_is_recursive(node)
+		if wants(features, "loc"):
+			self._timed("loc", self.extract_loc, node)
+		if wants(features, "num_args"):
+			self._timed("num_args", self.extract_num_args, node)
+		if wants(features, "has_decorators"):
+			self._timed("has_decorators", self.extract_has_decorators, node)
+		if summary is not None:
+			self.apply_summary(summary, features)
+		elif wants(features, "subtree_counts"):
+			self._timed("num_returns", self.extract_num_returns, node)
+			self._timed("num_variables", self.extract_num_variables, node)
+			self._timed("num_function_calls", self.extract_num_function_calls, node)
+			self._timed("uses_globals", self.extract_uses_globals, node)
+			self._timed("is_recursive", self.extract_is_recursive, node)
 
 		# Estimated via radon
-		self.extract_complexity()
-		self.extract_radon_metrics()
+		if radon_metrics is not None:
+			self._timed("radon", self.apply_radon_metrics, node, radon_metrics, features)
+		else:
+			if wants(features, "complexity"):
+				self._timed("complexity", self.extract_complexity)
+			if wants(features, "halstead"):
+				self._timed("radon", self.extract_radon_metrics)
 
 		# Documentation & Comments
-		self.extract_docstring_info(node)
-		self.extract_num_comments()
+		if wants(features, "docstring"):
+			self._timed("docstring", self.extract_docstring_info, node)
+		if wants(features, "num_comments"):
+			self._timed("num_comments", self.extract_num_comments, node, source)
 
 		# Naming Quality
-		self.extract_name_quality()
-		self.extract_bad_variable_names_count(node)
-
-		# Return-Specific
-		self.extract_max_return_length(node)
+		if wants(features, "name_quality"):
+			self._timed("name_quality", self.extract_name_quality)
+		if summary is None:
+			if wants(features, "subtree_counts"):
+				self._timed("bad_variable_names", self.extract_bad_variable_names_count, node)
+
+			# Return-Specific
+			if wants(features, "max_return_length"):
+				self._timed("max_return_length", self.extract_max_return_length, node)
+
+	def _timed(self, feature, extract, *args):
+		with metrics.timer("extract", feature=feature):
+			extract(*args)
+
+	def apply_summary(self, summary, features=None):
+		if wants(features, "subtree_counts"):
+			self.num_returns = summary.num_returns
+			self.num_variables = summary.num_variables
+			self.num_function_calls = summary.num_function_calls
+			self.uses_globals = summary.uses_globals
+			self.is_recursive = summary.is_recursive
+			self.bad_variable_names_count = summary.bad_variable_names_count
+		if wants(features, "max_return_length"):
+			self.max_return_length = summary.max_return_length
+
+	def attach_repo_metadata(self, repo_metadata):
+		self.repo_name = repo_metadata.get("name")
+		self.repo_full_name = repo_metadata.get("full_name") or self.repo_name
+		self.repo_stars = repo_metadata.get("stars")
+		self.repo_forks = repo_metadata.get("forks")
+		self.repo_watchers = repo_metadata.get("watchers")
+		self.repo_language = repo_metadata.get("language")
+		self.repo_created_at = repo_metadata.get("created_at")
+		self.repo_last_updated = repo_metadata.get("updated_at")
+		self.repo_topics = repo_metadata.get("topics")
 
 	def print_features(self):
 		print("\n Code Feature Summary")
@@ -114,6 +185,10 @@ class CodeFeatureExtractor:
 		print("\n Return")
 		print(f"  Max Return Length: {self.max_return_length}")
 
+		print("\n Lint")
+		print(f"  Quality Score: {self.quality_score}")
+		print(f"  Violations: {self.num_violations} {self.violation_codes or ''}")
+
 		print("\n Repository Metadata")
 		print(f"  Repo Name: {self.repo_name}")
 		print(f"  Stars: {self.repo_stars}")
@@ -163,6 +238,19 @@ class CodeFeatureExtractor:
 			self.estimated_difficulty = -1
 			self.estimated_bugs = -1
 
+	def apply_radon_metrics(self, node, radon_metrics, features=None):
+		if wants(features, "complexity"):
+			self.estimated_complexity = radon_metrics.complexity(node)
+		if not wants(features, "halstead"):
+			return
+		report = radon_metrics.halstead(node)
+		if report is not None:
+			self.estimated_difficulty = report.difficulty
+			self.estimated_bugs = report.bugs
+		else:
+			self.estimated_difficulty = -1
+			self.estimated_bugs = -1
+
 	def extract_has_decorators(self, node):
 		if isinstance(node, ast.FunctionDef) or isinstance(node, ast.ClassDef):
 			self.has_decorators = len(node.decorator_list) > 0
@@ -190,7 +278,10 @@ class CodeFeatureExtractor:
 			self.has_docstring = False
 			self.docstring_length = 0
 
-	def extract_num_comments(self):
+	def extract_num_comments(self, node=None, source=None):
+		if source is not None:
+			self.num_comments = source.count_comment_lines(node)
+			return
 		self.num_comments = sum(1 for line in self.code_snippet.splitlines() if line.strip().startswith("#"))
 
 	def extract_name_quality(self):
@@ -207,13 +298,12 @@ class CodeFeatureExtractor:
 		self.is_name_well_formed = bool(re.fullmatch(pattern, self.name))
 
 	def extract_bad_variable_names_count(self, node):
-		bad_names = {"x", "y", "z", "tmp", "var", "foo", "bar"}
 		count = 0
 
 		for subnode in ast.walk(node):
 			if isinstance(subnode, ast.Name) and isinstance(subnode.ctx, ast.Store):
 				name = subnode.id
-				if len(name) <= 2 or name.lower() in bad_names:
+				if len(name) <= 2 or name.lower() in BAD_VARIABLE_NAMES:
 					count += 1
 
 		self.bad_variable_names_count = count
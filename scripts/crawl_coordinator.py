@@ -0,0 +1,256 @@
+import argparse
+import os
+import socket
+import threading
+import time
+from multiprocessing import Process
+
+import metrics
+from feature_cache import EXTRACTOR_VERSION, FeatureCache, from_records, to_records
+from feature_records import FeatureBatch
+from feature_sink import make_sink
+from github_scraper import GitHubScraper
+from work_queue import make_queue
+
+QUEUE_FILE = "crawl_queue.sqlite"
+
+# A lease is renewed every third of its length, so a worker is only presumed
+# dead after missing several heartbeats; idle workers poll this often
+LEASE_SECONDS = 300
+POLL_SECONDS = 5
+
+
+def repo_job(owner, repo):
+	return "repo", f"repo:{owner}/{repo}", {"owner": owner, "repo": repo}
+
+
+def file_job(owner, repo, blob, metadata):
+	# Keyed by blob SHA too, so a job stands for one version of the file. Repo keys
+	# are unique and stay done, so seeding a repo again does not list it again
+	return "file", f"file:{owner}/{repo}:{blob['path']}@{blob['sha']}", {
+		"owner": owner,
+		"repo": repo,
+		"path": blob["path"],
+		"sha": blob["sha"],
+		"metadata": metadata,
+	}
+
+
+class _Heartbeat(threading.Thread):
+	"""Keeps a lease alive while its job runs, until the queue reports it gone."""
+
+	def __init__(self, queue, lease, duration):
+		super().__init__(daemon=True)
+		self.queue = queue
+		self.lease = lease
+		self.duration = duration
+		self.stopped = threading.Event()
+
+	def run(self):
+		while not self.stopped.wait(self.duration / 3):
+			if not self.queue.heartbeat(self.lease, self.duration):
+				return
+
+	def stop(self):
+		self.stopped.set()
+		self.join()
+
+
+class CrawlWorker:
+	"""
+	Takes crawl jobs from a shared work_queue until none are left.
+
+	A repo job fetches the repo's metadata and blob list and turns them
+	into one file job per Python file; a file job downloads and extracts
+	one file and commits its feature records. Any number of workers, on
+	any number of machines, can share one queue: a lease that misses its
+	heartbeats is handed to another worker, and a worker that lost its
+	lease has its result dropped instead of committed a second time.
+	"""
+
+	def __init__(
+		self,
+		queue,
+		token=None,
+		cache=None,
+		http_cache=None,
+		lease_seconds=LEASE_SECONDS,
+		worker_id=None,
+		base_url="https://api.github.com",
+		raw_url="https://raw.githubusercontent.com",
+	):
+		self.queue = queue
+		self.cache = cache  # optional feature_cache.FeatureCache, shared by blob SHA as in CrawlPipeline
+		self.lease_seconds = lease_seconds
+		self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+		self.scraper = GitHubScraper(token=token, http_cache=http_cache, base_url=base_url, raw_url=raw_url)
+		self.jobs_done = 0
+
+	def run(self, exit_when_drained=True):
+		"""Process jobs; return once the queue has nothing pending or leased, or never with `exit_when_drained` off."""
+		while True:
+			lease = self.queue.lease(self.worker_id, self.lease_seconds)
+			if lease is not None:
+				self.process(lease)
+			elif exit_when_drained and self.queue.is_drained():
+				return self.jobs_done
+			else:
+				# Other workers' repo jobs may still add files
+				time.sleep(POLL_SECONDS)
+
+	def process(self, lease):
+		heartbeat = _Heartbeat(self.queue, lease, self.lease_seconds)
+		heartbeat.start()
+		try:
+			if lease.kind == "repo":
+				result, children = None, self.list_repository(lease.payload["owner"], lease.payload["repo"])
+			else:
+				result, children = self.extract_file(lease.payload), ()
+		except Exception as e:
+			heartbeat.stop()
+			print(f"[ERROR] {lease.kind} job {lease.job_id} failed: {e}")
+			metrics.inc("coordinator_jobs_failed_total", kind=lease.kind)
+			self.queue.fail(lease, e)
+			return
+		heartbeat.stop()
+
+		if self.queue.complete(lease, result, children):
+			self.jobs_done += 1
+			metrics.inc("coordinator_jobs_done_total", kind=lease.kind)
+		else:
+			print(f"Lease on {lease.kind} job {lease.job_id} expired; its result was dropped")
+			metrics.inc("coordinator_leases_lost_total", kind=lease.kind)
+
+	def list_repository(self, owner, repo):
+		"""Return the file jobs of a repo."""
+		print(f"\n Listing repository: {owner}/{repo}")
+		metadata = self.scraper.get_repo_metadata(owner, repo)
+		if not metadata:
+			raise RuntimeError(f"Failed to fetch metadata of {owner}/{repo}")
+		blobs = self.scraper.get_python_blobs(owner, repo)
+		print(f"Found {len(blobs)} Python files in {owner}/{repo}")
+		return [file_job(owner, repo, blob, metadata) for blob in blobs]
+
+	def extract_file(self, payload):
+		"""Return the feature records of one file, without its per-occurrence fields (see feature_cache)."""
+		if self.cache is not None:
+			records = self.cache.get(payload["sha"])
+			if records is not None:
+				return records
+
+		code = self.scraper.download_file_content(payload["owner"], payload["repo"], payload["path"])
+		if code is None:
+			raise RuntimeError(f"Failed to download {payload['path']}")
+		features, complete = self.scraper.extract_file_features(payload["path"], code, payload["metadata"])
+		records = to_records(features)
+		if self.cache is not None and complete:
+			self.cache.put(payload["sha"], records)
+		return records
+
+
+def run_worker(queue_spec, cache_file=None, lease_seconds=LEASE_SECONDS, exit_when_drained=True, **scraper_kwargs):
+	"""Entry point of one worker process: open its own queue and cache connections and work."""
+	queue = make_queue(queue_spec)
+	cache = FeatureCache(cache_file, version=f"{EXTRACTOR_VERSION}-file") if cache_file else None
+	try:
+		worker = CrawlWorker(queue, cache=cache, lease_seconds=lease_seconds, **scraper_kwargs)
+		jobs_done = worker.run(exit_when_drained)
+		print(f"Worker {worker.worker_id} finished {jobs_done} jobs")
+	finally:
+		queue.close()
+		if cache is not None:
+			cache.close()
+
+
+def run_workers(queue_spec, processes=None, **kwargs):
+	"""Run `processes` workers on this machine (one per core by default) and wait for them."""
+	workers = [
+		Process(target=run_worker, args=(queue_spec,), kwargs=kwargs)
+		for _ in range(processes or os.cpu_count())
+	]
+	for worker in workers:
+		worker.start()
+	for worker in workers:
+		worker.join()
+
+
+def export_results(queue, output_file):
+	"""Write every committed file result to a CSV or feature store; return the number of rows."""
+	num_rows = 0
+	with make_sink(output_file) as sink:
+		for payload, records in queue.results("file"):
+			batch = FeatureBatch()
+			batch.extend(from_records(records, payload["path"], payload["metadata"]))
+			sink.write(batch)
+			num_rows += len(batch)
+	return num_rows
+
+
+def read_repo_list(path):
+	"""Read owner/repo lines, skipping blanks and # comments."""
+	repos = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			line = line.split("#", 1)[0].strip()
+			if line:
+				owner, repo = line.split("/", 1)
+				repos.append((owner, repo))
+	return repos
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Crawl GitHub through a shared job queue, with workers on any number of machines.",
+		epilog="Seed the queue once, start `worker` on every node, then `export` the results.",
+	)
+	parser.add_argument("--queue", default=QUEUE_FILE, help=f"work queue: a SQLite path or backend URL (default: {QUEUE_FILE})")
+	commands = parser.add_subparsers(dest="command", required=True)
+
+	seed_parser = commands.add_parser("seed", help="add repo jobs")
+	seed_parser.add_argument("repos", nargs="*", metavar="OWNER/REPO")
+	seed_parser.add_argument("--from-file", help="file of owner/repo lines")
+	seed_parser.add_argument("--top", type=int, default=0, help="also add the N most-starred Python repos")
+
+	worker_parser = commands.add_parser("worker", help="process jobs until the queue is drained")
+	worker_parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per core)")
+	worker_parser.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+	worker_parser.add_argument("--cache", help="feature cache SQLite file shared by this node's workers")
+	worker_parser.add_argument("--keep-running", action="store_true", help="wait for new jobs instead of exiting when drained")
+
+	commands.add_parser("status", help="print job counts by kind and state")
+
+	export_parser = commands.add_parser("export", help="write all committed results")
+	export_parser.add_argument("output", help=".csv file or feature store directory")
+
+	args = parser.parse_args()
+	token = os.getenv("GITHUB_PAT", "")
+
+	if args.command == "worker":
+		run_workers(
+			args.queue,
+			processes=args.processes,
+			cache_file=args.cache,
+			lease_seconds=args.lease_seconds,
+			exit_when_drained=not args.keep_running,
+			token=token,
+		)
+	else:
+		queue = make_queue(args.queue)
+		try:
+			if args.command == "seed":
+				repos = [tuple(r.split("/", 1)) for r in args.repos]
+				if args.from_file:
+					repos += read_repo_list(args.from_file)
+				if args.top:
+					from main import get_top_python_repos
+					repos += get_top_python_repos(args.top, token)
+				added = queue.enqueue([repo_job(owner, repo) for owner, repo in repos])
+				print(f"Added {added} of {len(repos)} repos to {args.queue}")
+			elif args.command == "status":
+				for kind, states in sorted(queue.summary().items()):
+					print(f"{kind}: " + ", ".join(f"{count} {state}" for state, count in sorted(states.items())))
+			elif args.command == "export":
+				num_rows = export_results(queue, args.output)
+				print(f"Wrote {num_rows} rows to {args.output}")
+		finally:
+			queue.close()
@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class CrawlManifest:
+	"""
+	Durable record of crawl progress, per repo and per file, in SQLite.
+
+	The discovered repo list is stored once so restarts make no search API
+	calls. Each repo's metadata and blob list are stored when first fetched,
+	and a file is only marked done once the sink reports its rows durable,
+	so a resumed crawl redoes exactly the files whose rows were lost. Files
+	that could not be downloaded or extracted are marked failed instead,
+	which finishes their repo like done files do but keeps them apart; a
+	resumed crawl skips them unless `retry_failed` is called. The functions
+	a done file's rows hold are recorded with it, so a resumed crawl can
+	restore its dedup_index.DuplicateIndex to exactly the written rows.
+	Safe to share between threads.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.executescript(
+			"""
+			CREATE TABLE IF NOT EXISTS repos (
+				owner TEXT NOT NULL,
+				repo TEXT NOT NULL,
+				position INTEGER NOT NULL,
+				state TEXT NOT NULL DEFAULT 'pending',
+				metadata TEXT,
+				updated_at REAL,
+				PRIMARY KEY (owner, repo)
+			);
+			CREATE TABLE IF NOT EXISTS files (
+				owner TEXT NOT NULL,
+				repo TEXT NOT NULL,
+				path TEXT NOT NULL,
+				sha TEXT NOT NULL,
+				size INTEGER,
+				state TEXT NOT NULL DEFAULT 'pending',
+				PRIMARY KEY (owner, repo, path)
+			);
+			CREATE TABLE IF NOT EXISTS functions (
+				hash INTEGER NOT NULL UNIQUE,
+				cluster INTEGER NOT NULL,
+				signature TEXT
+			);
+			CREATE TABLE IF NOT EXISTS meta (
+				key TEXT PRIMARY KEY,
+				value TEXT
+			);
+			"""
+		)
+		self.conn.commit()
+
+	def reset(self):
+		"""Forget all progress, for a fresh (non-resumed) crawl."""
+		with self.lock:
+			self.conn.executescript("DELETE FROM files; DELETE FROM repos; DELETE FROM functions; DELETE FROM meta;")
+			self.conn.commit()
+
+	def save_repo_list(self, repos):
+		with self.lock:
+			self.conn.executemany(
+				"INSERT OR IGNORE INTO repos (owner, repo, position) VALUES (?, ?, ?)",
+				[(owner, repo, i) for i, (owner, repo) in enumerate(repos)]
+			)
+			self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('repo_list_saved', '1')")
+			self.conn.commit()
+
+	def load_repo_list(self):
+		"""Return the saved repo list, or None if discovery never completed."""
+		with self.lock:
+			saved = self.conn.execute("SELECT value FROM meta WHERE key = 'repo_list_saved'").fetchone()
+			if saved is None:
+				return None
+			rows = self.conn.execute("SELECT owner, repo FROM repos ORDER BY position").fetchall()
+		return [tuple(row) for row in rows]
+
+	def pending_repos(self):
+		with self.lock:
+			rows = self.conn.execute(
+				"SELECT owner, repo FROM repos WHERE state != 'done' ORDER BY position"
+			).fetchall()
+		return [tuple(row) for row in rows]
+
+	def is_done(self, owner, repo):
+		with self.lock:
+			row = self.conn.execute(
+				"SELECT state FROM repos WHERE owner = ? AND repo = ?", (owner, repo)
+			).fetchone()
+		return row is not None and row[0] == "done"
+
+	def get_listing(self, owner, repo):
+		"""Return (metadata, blobs not yet done) for a repo listed by an earlier run, else None."""
+		with self.lock:
+			row = self.conn.execute(
+				"SELECT state, metadata FROM repos WHERE owner = ? AND repo = ?", (owner, repo)
+			).fetchone()
+			if row is None or row[0] != "listed":
+				return None
+			files = self.conn.execute(
+				"SELECT path, sha, size FROM files WHERE owner = ? AND repo = ? AND state = 'pending'",
+				(owner, repo)
+			).fetchall()
+		blobs = [{"path": path, "sha": sha, "size": size} for path, sha, size in files]
+		return json.loads(row[1]), blobs
+
+	def record_listing(self, owner, repo, metadata, blobs):
+		"""Store a repo's metadata and blob list; its files start out pending."""
+		with self.lock:
+			self.conn.executemany(
+				"INSERT OR IGNORE INTO files (owner, repo, path, sha, size) VALUES (?, ?, ?, ?, ?)",
+				[(owner, repo, b["path"], b["sha"], b.get("size")) for b in blobs]
+			)
+			self.conn.execute(
+				"""INSERT INTO repos (owner, repo, position, state, metadata, updated_at)
+				VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM repos), 'listed', ?, ?)
+				ON CONFLICT (owner, repo) DO UPDATE SET
+					state = 'listed', metadata = excluded.metadata, updated_at = excluded.updated_at""",
+				(owner, repo, json.dumps(metadata), time.time())
+			)
+			self._maybe_finish(owner, repo)
+			self.conn.commit()
+
+	def mark_file_done(self, owner, repo, path, functions=()):
+		"""Record that a file's rows are durable, with the (AST hash, cluster, signature) of their functions."""
+		self._mark_file(owner, repo, path, "done", functions)
+
+	def mark_file_failed(self, owner, repo, path):
+		"""Record that a file could not be downloaded or extracted, so it has no rows."""
+		self._mark_file(owner, repo, path, "failed")
+
+	def _mark_file(self, owner, repo, path, state, functions=()):
+		with self.lock:
+			self.conn.execute(
+				"UPDATE files SET state = ? WHERE owner = ? AND repo = ? AND path = ? AND state = 'pending'",
+				(state, owner, repo, path)
+			)
+			self.conn.executemany(
+				"INSERT OR IGNORE INTO functions (hash, cluster, signature) VALUES (?, ?, ?)", functions
+			)
+			self._maybe_finish(owner, repo)
+			self.conn.commit()
+
+	def seen_functions(self):
+		"""Return (AST hash, cluster, signature) of every function in the rows of done files."""
+		with self.lock:
+			return self.conn.execute("SELECT hash, cluster, signature FROM functions ORDER BY rowid").fetchall()
+
+	def retry_failed(self):
+		"""Make failed files pending again and reopen their repos; return how many there were."""
+		with self.lock:
+			count = self.conn.execute("UPDATE files SET state = 'pending' WHERE state = 'failed'").rowcount
+			self.conn.execute(
+				"""UPDATE repos SET state = 'listed', updated_at = ? WHERE state = 'done' AND EXISTS (
+					SELECT 1 FROM files WHERE files.owner = repos.owner AND files.repo = repos.repo
+					AND files.state = 'pending'
+				)""",
+				(time.time(),)
+			)
+			self.conn.commit()
+		return count
+
+	def _maybe_finish(self, owner, repo):
+		remaining = self.conn.execute(
+			"SELECT 1 FROM files WHERE owner = ? AND repo = ? AND state = 'pending' LIMIT 1",
+			(owner, repo)
+		).fetchone()
+		if remaining is None:
+			self.conn.execute(
+				"UPDATE repos SET state = 'done', updated_at = ? WHERE owner = ? AND repo = ? AND state = 'listed'",
+				(time.time(), owner, repo)
+			)
+
+	def summary(self):
+		with self.lock:
+			repos = dict(self.conn.execute("SELECT state, COUNT(*) FROM repos GROUP BY state").fetchall())
+			files = dict(self.conn.execute("SELECT state, COUNT(*) FROM files GROUP BY state").fetchall())
+		return {"repos": repos, "files": files}
+
+	def close(self):
+		with self.lock:
+			self.conn.close()
@@ -0,0 +1,317 @@
+import os
+import queue
+import threading
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from dedup_index import DuplicateIndex
+from feature_cache import from_records, to_records
+from feature_records import FeatureBatch
+from github_scraper import GitHubScraper
+
+_DONE = object()
+
+# Per-process scraper used by the extraction stage, created by _init_worker
+_scraper = None
+
+
+def _init_worker(radon_mode, dedup):
+	global _scraper
+	# Only skips functions this worker already returned; the parent's index assigns clusters
+	_scraper = GitHubScraper(radon_mode=radon_mode, dedup=DuplicateIndex(near=False) if dedup else None)
+
+
+def _extract_file(item, keep_snippets, with_records):
+	repo_metadata, path, sha, code = item
+	# Blobs that will be cached are extracted whole; the parent drops the duplicates
+	features, complete = _scraper.extract_file_features(path, code, repo_metadata, skip_seen=not with_records)
+	batch = FeatureBatch(keep_snippets=keep_snippets)
+	batch.extend(features)
+	records = to_records(features) if with_records and complete else None
+	# Metrics recorded in this process travel back with the result
+	fingerprints = [(f.ast_hash, f.minhash) for f in features]
+	return sha, batch, records, fingerprints, metrics.drain()
+
+
+class CrawlPipeline:
+	"""
+	Staged crawl: I/O threads -> bounded queue -> extraction processes -> sink.
+
+	`io_workers` threads each fetch one repo at a time and push downloaded
+	files onto a queue of at most `queue_depth` items. A dispatcher thread
+	feeds them to a pool of `cpu_workers` processes with at most
+	`max_pending` extractions in flight and hands the resulting batches to
+	`sink`. A full queue blocks the downloaders, so memory stays flat however
+	far the network gets ahead of extraction. Errors on one file are logged
+	and skipped; an error that stops the dispatcher (e.g. a broken process
+	pool) stops the downloaders too and is raised again from `run`.
+
+	With a `manifest` (crawl_manifest.CrawlManifest), finished repos are
+	skipped, listed repos only redo their unfinished files, and each file is
+	marked done once the sink reports its rows durable, or failed right away
+	if it could not be downloaded or extracted. An `http_cache`
+	(http_cache.HttpCache) is shared by every I/O thread's session.
+	`base_url` and `raw_url` can point at a local mock server.
+
+	With `dedup`, one dedup_index.DuplicateIndex in this process decides
+	which rows are written and assigns their duplicate clusters, for
+	extracted files and cache hits alike, so clusters do not depend on which
+	worker saw a function. Without a `cache`, each extraction process also
+	skips, before radon, exact duplicates of functions it already returned;
+	with one, blobs are extracted whole so their records can be cached. The
+	functions of each done file are recorded in the manifest, and the index
+	is restored from it, so a resumed crawl keeps skipping the functions
+	already written and assigns the same clusters.
+	"""
+
+	def __init__(
+		self,
+		sink,
+		token=None,
+		cache=None,
+		io_workers=8,
+		cpu_workers=None,
+		queue_depth=256,
+		max_pending=None,
+		radon_mode="file",
+		keep_snippets=True,
+		manifest=None,
+		http_cache=None,
+		dedup=False,
+		base_url="https://api.github.com",
+		raw_url="https://raw.githubusercontent.com",
+	):
+		self.sink = sink
+		self.manifest = manifest
+		self.token = token
+		self.cache = cache
+		self.http_cache = http_cache
+		self.io_workers = io_workers
+		self.cpu_workers = cpu_workers
+		self.queue_depth = queue_depth
+		self.max_pending = max_pending
+		self.radon_mode = radon_mode
+		self.keep_snippets = keep_snippets
+		self.dedup = DuplicateIndex() if dedup else None
+		if self.dedup is not None and manifest is not None:
+			self.dedup.restore(manifest.seen_functions())
+		self.base_url = base_url
+		self.raw_url = raw_url
+		self.local = threading.local()
+		self.lock = threading.Lock()
+		self.files = None
+		self.stop = threading.Event()
+		self.error = None
+		self.num_functions = 0
+
+	def run(self, repos):
+		self.files = queue.Queue(maxsize=self.queue_depth)
+		self.stop.clear()
+		self.error = None
+
+		cpu_workers = self.cpu_workers or os.cpu_count()
+		max_pending = self.max_pending or cpu_workers * 2
+
+		with ProcessPoolExecutor(
+			max_workers=cpu_workers,
+			initializer=_init_worker,
+			initargs=(self.radon_mode, self.dedup is not None)
+		) as pool:
+			dispatcher = threading.Thread(target=self._dispatch, args=(pool, max_pending))
+			dispatcher.start()
+
+			try:
+				with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool:
+					futures = [io_pool.submit(self._fetch_repository, owner, repo) for owner, repo in repos]
+					try:
+						for future in as_completed(futures):
+							try:
+								future.result()
+							except Exception as e:
+								print(f"Error processing a repository: {e}")
+					except BaseException:
+						# e.g. Ctrl-C: repos not started are dropped, downloaders stop at
+						# their next file and extractions in flight are written
+						self.stop.set()
+						io_pool.shutdown(wait=False, cancel_futures=True)
+						raise
+			finally:
+				self._put(_DONE)
+				dispatcher.join()
+
+		if self.error is not None:
+			raise self.error
+		print(f"\nExtracted features from {self.num_functions} functions.")
+
+	def _get_scraper(self):
+		# requests.Session is not thread-safe, so each I/O thread keeps its own
+		if not hasattr(self.local, "scraper"):
+			self.local.scraper = GitHubScraper(
+				token=self.token,
+				radon_mode=self.radon_mode,
+				http_cache=self.http_cache,
+				dedup=self.dedup,
+				base_url=self.base_url,
+				raw_url=self.raw_url,
+			)
+		return self.local.scraper
+
+	def _fetch_repository(self, owner, repo):
+		# A stopped crawl lists no more repos, so no API quota or manifest rows are spent on them
+		if self.stop.is_set():
+			return
+		if self.manifest is not None and self.manifest.is_done(owner, repo):
+			print(f"Skipping completed repository: {owner}/{repo}")
+			return
+
+		print(f"\n Processing repository: {owner}/{repo}")
+		scraper = self._get_scraper()
+
+		listing = self.manifest.get_listing(owner, repo) if self.manifest is not None else None
+		if listing is not None:
+			metadata, py_files = listing
+			# Listings stored before repos were keyed by full name
+			metadata.setdefault("full_name", f"{owner}/{repo}")
+			print(f"Resuming {owner}/{repo}: {len(py_files)} Python files left")
+		else:
+			metadata = scraper.get_repo_metadata(owner, repo)
+			if not metadata:
+				print("Failed to fetch metadata. Exiting.")
+				return
+
+			py_files = scraper.get_python_blobs(owner, repo)
+			print(f"Found {len(py_files)} Python files in {owner}/{repo}")
+			if self.manifest is not None:
+				self.manifest.record_listing(owner, repo, metadata, py_files)
+
+		for blob in py_files:
+			if self.stop.is_set():
+				return
+			file_key = (owner, repo, blob["path"])
+
+			if self.cache is not None:
+				records = self.cache.get(blob["sha"])
+				if records is not None:
+					features = scraper.drop_seen(from_records(records, blob["path"], metadata))
+					functions = [(f.ast_hash, f.duplicate_cluster, f.minhash) for f in features]
+					self._write(features, self._file_done_callback(*file_key, functions))
+					continue
+
+			code = scraper.download_file_content(owner, repo, blob["path"])
+			if code is None:
+				self._file_failed(*file_key)
+				continue
+			# Blocks while the extraction stage is behind
+			if not self._put(((metadata, blob["path"], blob["sha"], code), file_key)):
+				return
+
+	def _put(self, item):
+		"""Queue `item` for extraction; False if the crawl was stopped first."""
+		while not self.stop.is_set():
+			try:
+				self.files.put(item, timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def _file_done_callback(self, owner, repo, path, functions=()):
+		if self.manifest is None:
+			return None
+		if self.dedup is None:
+			functions = ()
+		return lambda: self.manifest.mark_file_done(owner, repo, path, functions)
+
+	def _file_failed(self, owner, repo, path):
+		# Nothing of the file will be written, so it need not wait for the sink
+		if self.manifest is not None:
+			self.manifest.mark_file_failed(owner, repo, path)
+
+	def _dispatch(self, pool, max_pending):
+		try:
+			self._dispatch_files(pool, max_pending)
+		except BaseException as e:
+			print(f"[ERROR] Extraction stopped: {e!r}")
+			self.error = e
+			self.stop.set()
+			# Frees the queue; downloaders see the stop event and return
+			while True:
+				try:
+					self.files.get_nowait()
+				except queue.Empty:
+					break
+
+	def _dispatch_files(self, pool, max_pending):
+		in_flight = set()
+		input_done = False
+		with_records = self.cache is not None
+
+		file_keys = {}  # future -> (owner, repo, path) of its file
+
+		while (not input_done and not self.stop.is_set()) or in_flight:
+			# Top up the process pool without ever holding more than max_pending files
+			while not input_done and not self.stop.is_set() and len(in_flight) < max_pending:
+				try:
+					item = self.files.get(timeout=0.05 if in_flight else 0.5)
+				except queue.Empty:
+					break
+				if item is _DONE:
+					input_done = True
+				else:
+					file_item, file_key = item
+					future = pool.submit(_extract_file, file_item, self.keep_snippets, with_records)
+					file_keys[future] = file_key
+					in_flight.add(future)
+
+			if not in_flight:
+				continue
+			block = input_done or len(in_flight) >= max_pending
+			done, in_flight = wait(in_flight, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+			for future in done:
+				file_key = file_keys.pop(future)
+				try:
+					sha, batch, records, fingerprints, worker_metrics = future.result()
+				except BrokenProcessPool:
+					# Not the file's fault; it stays pending for a resumed crawl
+					raise
+				except Exception as e:
+					print(f"[ERROR] Feature extraction failed for {file_key[2]}: {e}")
+					self._file_failed(*file_key)
+					continue
+				try:
+					metrics.merge(worker_metrics)
+					functions = ()
+					if self.dedup is not None:
+						batch, functions = self._drop_duplicates(batch, fingerprints)
+					self._write(batch, self._file_done_callback(*file_key, functions))
+					if records is not None:
+						self.cache.put(sha, records)
+				except Exception as e:
+					print(f"[ERROR] Failed to store extracted features: {e}")
+
+	def _drop_duplicates(self, batch, fingerprints):
+		# Keeps the rows whose function the shared index has not seen, with their
+		# cluster; also returns (hash, cluster, signature) of the kept functions
+		rows, clusters, functions = [], [], []
+		for i, (node_hash, signature) in enumerate(fingerprints):
+			cluster = self.dedup.assign(node_hash, signature)
+			if cluster is not None:
+				rows.append(i)
+				clusters.append(cluster)
+				functions.append((node_hash, cluster, signature))
+		metrics.inc("duplicates_skipped_total", len(fingerprints) - len(rows))
+		if len(rows) < len(fingerprints):
+			batch = batch.select(rows)
+		batch.columns["duplicate_cluster"] = array("q", clusters)
+		return batch, functions
+
+	def _write(self, features, on_durable=None):
+		if not isinstance(features, FeatureBatch):
+			batch = FeatureBatch(keep_snippets=self.keep_snippets)
+			batch.extend(features)
+			features = batch
+		self.sink.write(features, on_durable=on_durable)
+		with self.lock:
+			self.num_functions += len(features)
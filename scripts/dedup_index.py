@@ -0,0 +1,175 @@
+import ast
+import hashlib
+import threading
+import zlib
+
+import numpy as np
+
+# MinHash / LSH parameters: 16 bands of 4 rows flag pairs above roughly 0.5
+# Jaccard as candidates, which are then checked against `threshold`
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def ast_hash(node):
+	"""
+	Hash a function's normalized AST as a signed 64-bit int.
+
+	The dump leaves out line and column attributes, so copies that differ
+	only in layout or comments hash the same.
+	"""
+	dump = ast.dump(node, annotate_fields=False, include_attributes=False)
+	digest = hashlib.blake2b(dump.encode("utf-8"), digest_size=8).digest()
+	return int.from_bytes(digest, "big", signed=True)
+
+
+def ast_tokens(node):
+	"""Flatten a function into node types, identifiers and constants."""
+	tokens = []
+	for child in ast.walk(node):
+		tokens.append(type(child).__name__)
+		for field in ("id", "attr", "arg", "name"):
+			value = getattr(child, field, None)
+			if isinstance(value, str):
+				tokens.append(value)
+		if isinstance(child, ast.Constant):
+			tokens.append(repr(child.value)[:32])
+	return tokens
+
+
+def minhash_signature(tokens):
+	"""MinHash signature over the token shingles, or None if there are too few tokens."""
+	shingles = {
+		"\0".join(tokens[i:i + SHINGLE_SIZE])
+		for i in range(len(tokens) - SHINGLE_SIZE + 1)
+	}
+	if not shingles:
+		return None
+	hashes = np.fromiter(
+		(zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+	)
+	# a * h + b stays below 2**64 because a, b and h are all 32-bit
+	permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+	return permuted.min(axis=0).astype(np.uint32)
+
+
+def encode_signature(signature):
+	"""Hex string of a MinHash signature, so it can be pickled, cached and sent between processes cheaply."""
+	return None if signature is None else signature.tobytes().hex()
+
+
+def decode_signature(encoded):
+	return None if encoded is None else np.frombuffer(bytes.fromhex(encoded), dtype=np.uint32)
+
+
+class DuplicateIndex:
+	"""
+	Index of the functions seen so far, consulted before the expensive stages.
+
+	`check(node)` returns the function's AST hash, its encoded MinHash
+	signature and its duplicate cluster. The cluster is None for an exact
+	duplicate (same normalized AST as an earlier function), which the caller
+	skips. Otherwise it is the cluster of an earlier function whose estimated
+	token Jaccard similarity is at least `threshold`, or a new one.
+	Cluster ids are the AST hash of the cluster's first function, so they
+	depend on the order functions are seen in: one index must assign them
+	for a whole crawl. An index built with `near` off only skips exact
+	duplicates and leaves clustering to the one that later `assign`s the
+	hashes and signatures it returned, and `fingerprint(node)` only
+	computes the hash and signature. `restore` reloads the functions an
+	earlier run kept, so a resumed crawl goes on with the same clusters.
+	Functions with fewer than `min_tokens` tokens are only matched exactly.
+	Safe to share between threads.
+	"""
+
+	def __init__(self, threshold=0.8, min_tokens=24, near=True):
+		self.threshold = threshold
+		self.min_tokens = min_tokens
+		self.near_enabled = near
+		self.rows = NUM_PERM // BANDS
+		self.lock = threading.Lock()
+		self.hashes = set()
+		self.buckets = [{} for _ in range(BANDS)]
+		self.signatures = []  # MinHash signature of each cluster leader
+		self.clusters = []    # cluster id of each cluster leader
+		self.exact = 0
+		self.near = 0
+
+	def check(self, node):
+		"""Return (AST hash, signature, duplicate cluster or None for an exact duplicate) for `node`."""
+		node_hash = ast_hash(node)
+		if not self._add(node_hash):
+			return node_hash, None, None
+
+		signature = self._signature(node)
+		return node_hash, encode_signature(signature), self._cluster(node_hash, signature)
+
+	def fingerprint(self, node):
+		"""Return (AST hash, encoded signature) for `node` without adding it to the index."""
+		return ast_hash(node), encode_signature(self._signature(node))
+
+	def _signature(self, node):
+		tokens = ast_tokens(node)
+		if len(tokens) >= self.min_tokens:
+			return minhash_signature(tokens)
+		return None
+
+	def assign(self, node_hash, signature):
+		"""
+		Cluster a function fingerprinted elsewhere, from the hash and signature check() returned.
+
+		Returns None if an earlier function had the same hash.
+		"""
+		if not self._add(node_hash):
+			return None
+		return self._cluster(node_hash, decode_signature(signature))
+
+	def restore(self, functions):
+		"""Add (AST hash, cluster, encoded signature) of functions kept by an earlier run."""
+		with self.lock:
+			for node_hash, cluster, signature in functions:
+				if node_hash in self.hashes:
+					continue
+				self.hashes.add(node_hash)
+				# Only cluster leaders carry their own hash as cluster id
+				if self.near_enabled and signature is not None and cluster == node_hash:
+					self._lead(node_hash, decode_signature(signature))
+
+	def _add(self, node_hash):
+		with self.lock:
+			if node_hash in self.hashes:
+				self.exact += 1
+				return False
+			self.hashes.add(node_hash)
+			return True
+
+	def _keys(self, signature):
+		return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(BANDS)]
+
+	def _cluster(self, node_hash, signature):
+		if signature is None or not self.near_enabled:
+			return node_hash
+		keys = self._keys(signature)
+
+		with self.lock:
+			for band, key in enumerate(keys):
+				for leader in self.buckets[band].get(key, ()):
+					if np.mean(self.signatures[leader] == signature) >= self.threshold:
+						self.near += 1
+						return self.clusters[leader]
+			self._lead(node_hash, signature, keys)
+		return node_hash
+
+	def _lead(self, node_hash, signature, keys=None):
+		# Called with the lock held
+		leader = len(self.signatures)
+		self.signatures.append(signature)
+		self.clusters.append(node_hash)
+		for band, key in enumerate(keys or self._keys(signature)):
+			self.buckets[band].setdefault(key, []).append(leader)
@@ -0,0 +1,133 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from code_processing import CodeFeatureExtractor
+
+# Bump whenever feature extraction changes, so stale cache entries are ignored
+EXTRACTOR_VERSION = "4"
+
+# Per-occurrence fields, filled in again on every cache hit; duplicate
+# clusters depend on the functions seen before (see dedup_index)
+CONTEXT_FIELDS = (
+	"duplicate_cluster",
+	"file_path",
+	"repo_name",
+	"repo_full_name",
+	"repo_stars",
+	"repo_forks",
+	"repo_watchers",
+	"repo_language",
+	"repo_created_at",
+	"repo_last_updated",
+	"repo_topics",
+)
+
+
+class FeatureCache:
+	"""
+	Persistent, content-addressed store of extracted features keyed by git blob SHA.
+
+	A blob's features do not depend on which repo or path it was found at, so
+	vendored and copied files are downloaded and analyzed only once. Entries
+	are keyed by (sha, version) and the least recently used ones are evicted
+	once the stored payloads exceed `max_bytes`. Safe to share between threads.
+	"""
+
+	def __init__(self, path, max_bytes=2 * 1024 ** 3, version=EXTRACTOR_VERSION):
+		self.path = path
+		self.max_bytes = max_bytes
+		self.version = version
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute(
+			"""CREATE TABLE IF NOT EXISTS blobs (
+				sha TEXT NOT NULL,
+				version TEXT NOT NULL,
+				payload BLOB NOT NULL,
+				size INTEGER NOT NULL,
+				last_access REAL NOT NULL,
+				PRIMARY KEY (sha, version)
+			)"""
+		)
+		self.conn.execute("CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs (last_access)")
+		self.conn.commit()
+		self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, sha):
+		"""Return the cached feature records for a blob, or None on a miss."""
+		with self.lock:
+			row = self.conn.execute(
+				"SELECT payload FROM blobs WHERE sha = ? AND version = ?", (sha, self.version)
+			).fetchone()
+			if row is None:
+				self.misses += 1
+				return None
+			self.hits += 1
+			self.conn.execute(
+				"UPDATE blobs SET last_access = ? WHERE sha = ? AND version = ?",
+				(time.time(), sha, self.version),
+			)
+			self.conn.commit()
+		return json.loads(zlib.decompress(row[0]))
+
+	def put(self, sha, records):
+		"""Store the feature records extracted from a blob."""
+		payload = zlib.compress(json.dumps(records).encode("utf-8"))
+		with self.lock:
+			old = self.conn.execute(
+				"SELECT size FROM blobs WHERE sha = ? AND version = ?", (sha, self.version)
+			).fetchone()
+			self.conn.execute(
+				"INSERT OR REPLACE INTO blobs (sha, version, payload, size, last_access) VALUES (?, ?, ?, ?, ?)",
+				(sha, self.version, payload, len(payload), time.time()),
+			)
+			self.total_bytes += len(payload) - (old[0] if old else 0)
+			if self.total_bytes > self.max_bytes:
+				self._evict()
+			self.conn.commit()
+
+	def _evict(self):
+		# Drop least recently used entries until the cache is back under 90% of its budget
+		target = self.max_bytes * 0.9
+		rows = self.conn.execute("SELECT sha, version, size FROM blobs ORDER BY last_access")
+		stale = []
+		for sha, version, size in rows:
+			if self.total_bytes <= target:
+				break
+			stale.append((sha, version))
+			self.total_bytes -= size
+		self.conn.executemany("DELETE FROM blobs WHERE sha = ? AND version = ?", stale)
+
+	def close(self):
+		with self.lock:
+			self.conn.close()
+
+
+def to_records(features):
+	"""Strip per-occurrence fields from extractors so they can be cached by content."""
+	return [
+		{k: v for k, v in vars(f).items() if k not in CONTEXT_FIELDS}
+		for f in features
+	]
+
+
+def from_records(records, file_path, repo_metadata):
+	"""Rebuild extractors from cached records for a given path and repo."""
+	features = []
+	for record in records:
+		extractor = CodeFeatureExtractor(
+			name=record["name"],
+			node_type=record["node_type"],
+			file_path=file_path,
+			code_snippet=record["code_snippet"]
+		)
+		vars(extractor).update(record)
+		extractor.attach_repo_metadata(repo_metadata)
+		features.append(extractor)
+	return features
@@ -0,0 +1,174 @@
+import ast
+from radon.complexity import cc_visit_ast
+from radon.metrics import h_visit_ast, halstead_visitor_report
+from radon.visitors import ComplexityVisitor, Function, HalsteadVisitor
+from code_processing import BAD_VARIABLE_NAMES
+
+
+class FunctionSummary:
+	"""Subtree counts for one FunctionDef, filled in during a single file traversal."""
+
+	def __init__(self, node, depth, order):
+		self.node = node
+		self.depth = depth  # AST depth, used to reproduce ast.walk ordering
+		self.order = order  # pre-order index of the node in the file
+
+		self.num_returns = 0
+		self.num_variables = 0
+		self.num_function_calls = 0
+		self.uses_globals = False
+		self.is_recursive = False
+		self.bad_variable_names_count = 0
+		self.max_return_length = 0
+
+	def merge(self, child):
+		"""Fold a finished nested function's summary into this one."""
+		self.num_returns += child.num_returns
+		self.num_variables += child.num_variables
+		self.num_function_calls += child.num_function_calls
+		self.uses_globals = self.uses_globals or child.uses_globals
+		self.bad_variable_names_count += child.bad_variable_names_count
+		self.max_return_length = max(self.max_return_length, child.max_return_length)
+
+
+class FileFeatureEngine:
+	"""
+	Compute the subtree features of every function in a file with one AST traversal.
+
+	Each node is visited once. Counts are recorded on the innermost enclosing
+	function and merged into the parent function when the child is closed, so
+	nested functions and methods are not walked again from every ancestor.
+	With `return_lengths=False` return values are not unparsed and
+	max_return_length stays 0.
+	"""
+
+	def __init__(self, tree, return_lengths=True):
+		self.tree = tree
+		self.return_lengths = return_lengths
+
+	def run(self):
+		"""Return one FunctionSummary per FunctionDef, in ast.walk order."""
+		summaries = []
+		frames = []      # open functions, innermost last
+		open_names = {}  # function name -> open frames with that name
+		order = 0
+
+		# Iterative pre/post-order walk so deeply nested expressions cannot hit the recursion limit
+		stack = [(self.tree, 0, False)]
+		while stack:
+			node, depth, leaving = stack.pop()
+
+			if leaving:
+				frame = frames.pop()
+				open_names[frame.node.name].pop()
+				if frames:
+					frames[-1].merge(frame)
+				continue
+
+			if isinstance(node, ast.FunctionDef):
+				frame = FunctionSummary(node, depth, order)
+				summaries.append(frame)
+				frames.append(frame)
+				open_names.setdefault(node.name, []).append(frame)
+				stack.append((node, depth, True))
+			elif frames:
+				self.visit(node, frames[-1], open_names)
+			order += 1
+
+			children = list(ast.iter_child_nodes(node))
+			for child in reversed(children):
+				stack.append((child, depth + 1, False))
+
+		summaries.sort(key=lambda s: (s.depth, s.order))
+		return summaries
+
+	def visit(self, node, frame, open_names):
+		if isinstance(node, ast.Return):
+			frame.num_returns += 1
+			if self.return_lengths and node.value is not None:
+				try:
+					length = len(ast.unparse(node.value))
+					frame.max_return_length = max(frame.max_return_length, length)
+				except Exception:
+					pass
+		elif isinstance(node, ast.Assign):
+			frame.num_variables += 1
+		elif isinstance(node, ast.Call):
+			frame.num_function_calls += 1
+			if isinstance(node.func, ast.Name):
+				# A call is recursive for every open function it names, not just the innermost
+				for caller in open_names.get(node.func.id, ()):
+					caller.is_recursive = True
+		elif isinstance(node, ast.Global):
+			frame.uses_globals = True
+		elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+			if len(node.id) <= 2 or node.id.lower() in BAD_VARIABLE_NAMES:
+				frame.bad_variable_names_count += 1
+
+
+class _LineHalsteadVisitor(HalsteadVisitor):
+	"""HalsteadVisitor that tags each function visitor with the def line it came from."""
+
+	def visit_FunctionDef(self, node):
+		super().visit_FunctionDef(node)
+		self.function_visitors[-1].lineno = node.lineno
+
+
+class FileRadonMetrics:
+	"""
+	Radon complexity and Halstead results for every function in a file.
+
+	Both visitors run once over the already-parsed module and their blocks are
+	matched to functions by def line, so snippets are never re-parsed and
+	indented methods get real values instead of the -1 error flag. Either
+	visitor can be skipped when its results are not needed.
+	"""
+
+	def __init__(self, tree, complexity=True, halstead=True):
+		self.blocks = {}
+		self.reports = {}
+
+		if complexity:
+			try:
+				visitor = ComplexityVisitor.from_ast(tree)
+				self._collect_blocks(visitor.functions + visitor.classes)
+			except Exception:
+				pass
+
+		if halstead:
+			try:
+				visitor = _LineHalsteadVisitor.from_ast(tree)
+				for func_visitor in visitor.function_visitors:
+					self.reports[func_visitor.lineno] = halstead_visitor_report(func_visitor)
+			except Exception:
+				pass
+
+	def _collect_blocks(self, blocks):
+		for block in blocks:
+			if isinstance(block, Function):
+				self.blocks[block.lineno] = block
+				self._collect_blocks(block.closures)
+			else:
+				self._collect_blocks(block.methods + block.inner_classes)
+
+	def complexity(self, node):
+		"""Cyclomatic complexity of `node`, or -1 if radon fails on it."""
+		try:
+			block = self.blocks.get(node.lineno)
+			if block is None:
+				# Radon drops methods of classes defined inside functions
+				block = cc_visit_ast(node)[0]
+			return block.complexity
+		except Exception:
+			return -1
+
+	def halstead(self, node):
+		"""Halstead report for `node`, or None if radon fails on it."""
+		try:
+			report = self.reports.get(node.lineno)
+			if report is None:
+				# The file-level visitor only reports functions not nested in other functions
+				report = h_visit_ast(node).total
+			return report
+		except Exception:
+			return None
@@ -0,0 +1,236 @@
+import math
+from array import array
+
+import numpy as np
+import pyarrow as pa
+
+# Strings with few distinct values are stored once per column chunk and read back as categoricals
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+# Explicit column types, in CodeFeatureExtractor attribute order
+FEATURE_SCHEMA = pa.schema([
+	("name", pa.string()),
+	("node_type", DICT_STRING),
+	("file_path", DICT_STRING),
+	("code_snippet", pa.string()),
+	("repo_name", DICT_STRING),
+	("repo_full_name", DICT_STRING),
+	("repo_stars", pa.int64()),
+	("repo_forks", pa.int64()),
+	("repo_watchers", pa.int64()),
+	("repo_language", DICT_STRING),
+	("repo_created_at", DICT_STRING),
+	("repo_last_updated", DICT_STRING),
+	("repo_topics", pa.list_(pa.string())),
+	("loc", pa.int64()),
+	("num_args", pa.int64()),
+	("num_returns", pa.int64()),
+	("num_variables", pa.int64()),
+	("num_function_calls", pa.int64()),
+	("has_decorators", pa.bool_()),
+	("uses_globals", pa.bool_()),
+	("is_recursive", pa.bool_()),
+	("estimated_branches", pa.float64()),
+	("estimated_difficulty", pa.float64()),
+	("estimated_bugs", pa.float64()),
+	("has_docstring", pa.bool_()),
+	("docstring_length", pa.int64()),
+	("num_comments", pa.int64()),
+	("name_length", pa.int64()),
+	("is_name_well_formed", pa.bool_()),
+	("bad_variable_names_count", pa.int64()),
+	("max_return_length", pa.int64()),
+	("quality_score", pa.float64()),
+	("num_violations", pa.int64()),
+	("violation_codes", pa.string()),
+	("quality", pa.float64()),
+	("estimated_complexity", pa.int64()),
+	("duplicate_cluster", pa.int64()),
+])
+
+FEATURE_COLUMNS = FEATURE_SCHEMA.names
+
+# Columns that are the same for every function of a repo
+REPO_FIELDS = (
+	"repo_name",
+	"repo_full_name",
+	"repo_stars",
+	"repo_forks",
+	"repo_watchers",
+	"repo_language",
+	"repo_created_at",
+	"repo_last_updated",
+	"repo_topics",
+)
+
+# Null markers for array-backed columns
+INT_NULL = -2 ** 63
+BOOL_NULL = -1
+
+_NUMPY_TYPES = {"q": np.int64, "d": np.float64, "b": np.int8}
+
+
+def _typecode(data_type):
+	if pa.types.is_integer(data_type):
+		return "q"
+	if pa.types.is_floating(data_type):
+		return "d"
+	if pa.types.is_boolean(data_type):
+		return "b"
+	return None
+
+
+# Numeric and boolean columns are stored in typed arrays instead of per-row objects
+ARRAY_COLUMNS = {
+	field.name: _typecode(field.type)
+	for field in FEATURE_SCHEMA
+	if _typecode(field.type) is not None and field.name not in REPO_FIELDS
+}
+
+
+def _encode(value, typecode):
+	if typecode == "q":
+		return INT_NULL if value is None else value
+	if typecode == "d":
+		return math.nan if value is None else value
+	return BOOL_NULL if value is None else int(value)
+
+
+def _decode(value, typecode):
+	if typecode == "q":
+		return None if value == INT_NULL else value
+	if typecode == "d":
+		return None if math.isnan(value) else value
+	return None if value == BOOL_NULL else bool(value)
+
+
+class RepoTable:
+	"""Dimension table of repository metadata; feature rows reference entries by id."""
+
+	def __init__(self):
+		self.rows = []
+		self.ids = {}
+
+	def get_id(self, values):
+		key = tuple(tuple(v) if isinstance(v, list) else v for v in values)
+		repo_id = self.ids.get(key)
+		if repo_id is None:
+			repo_id = len(self.rows)
+			self.ids[key] = repo_id
+			self.rows.append(dict(zip(REPO_FIELDS, values)))
+		return repo_id
+
+
+class FeatureBatch:
+	"""
+	Column-oriented store for extracted features.
+
+	Numeric and boolean features live in typed arrays, repo metadata is kept
+	once in a RepoTable and file paths once in a file table, so a row costs a
+	few machine words plus its name. Snippets are dropped unless
+	`keep_snippets` is set. Extractors can be discarded once appended.
+	"""
+
+	def __init__(self, keep_snippets=True, repos=None):
+		self.keep_snippets = keep_snippets
+		self.repos = repos if repos is not None else RepoTable()
+		self.files = []
+		self.file_index = {}
+
+		self.repo_ids = array("l")
+		self.file_ids = array("l")
+		self.names = []
+		self.node_types = []
+		self.snippets = []
+		self.violation_codes = []
+		self.columns = {name: array(typecode) for name, typecode in ARRAY_COLUMNS.items()}
+
+	def __len__(self):
+		return len(self.names)
+
+	def append(self, feature):
+		values = vars(feature)
+
+		self.repo_ids.append(self.repos.get_id(tuple(values.get(f) for f in REPO_FIELDS)))
+
+		file_path = values.get("file_path")
+		file_id = self.file_index.get(file_path)
+		if file_id is None:
+			file_id = len(self.files)
+			self.file_index[file_path] = file_id
+			self.files.append(file_path)
+		self.file_ids.append(file_id)
+
+		self.names.append(values.get("name"))
+		self.node_types.append(values.get("node_type"))
+		if self.keep_snippets:
+			self.snippets.append(values.get("code_snippet"))
+		self.violation_codes.append(values.get("violation_codes"))
+
+		for name, column in self.columns.items():
+			column.append(_encode(values.get(name), ARRAY_COLUMNS[name]))
+
+	def extend(self, features):
+		for feature in features:
+			self.append(feature)
+
+	def select(self, rows):
+		"""Return a new batch of the rows at the given positions, sharing this batch's repo table."""
+		batch = FeatureBatch(keep_snippets=self.keep_snippets, repos=self.repos)
+		batch.files = list(self.files)
+		batch.file_index = dict(self.file_index)
+		batch.repo_ids = array("l", (self.repo_ids[i] for i in rows))
+		batch.file_ids = array("l", (self.file_ids[i] for i in rows))
+		batch.names = [self.names[i] for i in rows]
+		batch.node_types = [self.node_types[i] for i in rows]
+		if self.keep_snippets:
+			batch.snippets = [self.snippets[i] for i in rows]
+		batch.violation_codes = [self.violation_codes[i] for i in rows]
+		batch.columns = {
+			name: array(column.typecode, (column[i] for i in rows))
+			for name, column in self.columns.items()
+		}
+		return batch
+
+	def to_numpy(self, columns):
+		"""
+		Return a float64 matrix of the numeric and boolean `columns`, one row per function.
+
+		Columns are read straight from the typed arrays; booleans become 0/1
+		and missing values NaN.
+		"""
+		matrix = np.empty((len(self), len(columns)))
+		for j, name in enumerate(columns):
+			typecode = ARRAY_COLUMNS[name]
+			values = np.frombuffer(self.columns[name], dtype=_NUMPY_TYPES[typecode])
+			matrix[:, j] = values
+			if typecode == "q":
+				matrix[values == INT_NULL, j] = np.nan
+			elif typecode == "b":
+				matrix[values == BOOL_NULL, j] = np.nan
+		return matrix
+
+	def iter_rows(self):
+		"""Yield one dict per row, in FEATURE_COLUMNS order."""
+		for i in range(len(self)):
+			row = dict.fromkeys(FEATURE_COLUMNS)
+			row.update(self.repos.rows[self.repo_ids[i]])
+			row["name"] = self.names[i]
+			row["node_type"] = self.node_types[i]
+			row["file_path"] = self.files[self.file_ids[i]]
+			if self.keep_snippets:
+				row["code_snippet"] = self.snippets[i]
+			row["violation_codes"] = self.violation_codes[i]
+			for name, column in self.columns.items():
+				row[name] = _decode(column[i], ARRAY_COLUMNS[name])
+			yield row
+
+
+def iter_feature_rows(features):
+	"""Yield row dicts from a FeatureBatch or a list of CodeFeatureExtractor objects."""
+	if isinstance(features, FeatureBatch):
+		yield from features.iter_rows()
+		return
+	for feature in features:
+		values = vars(feature)
+		yield {column: values.get(column) for column in FEATURE_COLUMNS}
@@ -0,0 +1,72 @@
+class Feature:
+	"""
+	One extractor: the output columns it fills, a rough cost and the extractors it needs first.
+
+	`cost` is "low" (reads a few node attributes), "medium" (one pass over
+	the function or its source) or "high" (radon or ast.unparse).
+	`python benchmark.py features` measures it.
+	"""
+
+	def __init__(self, name, columns, cost, requires=()):
+		self.name = name
+		self.columns = columns
+		self.cost = cost
+		self.requires = requires
+
+
+FEATURES = {feature.name: feature for feature in [
+	Feature("snippet", ("code_snippet",), "medium"),
+	Feature("loc", ("loc",), "low"),
+	Feature("num_args", ("num_args",), "low"),
+	Feature("has_decorators", ("has_decorators",), "low"),
+	Feature(
+		"subtree_counts",
+		(
+			"num_returns",
+			"num_variables",
+			"num_function_calls",
+			"uses_globals",
+			"is_recursive",
+			"bad_variable_names_count",
+		),
+		"medium",
+	),
+	Feature("max_return_length", ("max_return_length",), "high"),
+	Feature("complexity", ("estimated_complexity",), "high"),
+	Feature("halstead", ("estimated_difficulty", "estimated_bugs"), "high"),
+	Feature("docstring", ("has_docstring", "docstring_length"), "low"),
+	Feature("num_comments", ("num_comments",), "medium"),
+	Feature("name_quality", ("is_name_well_formed",), "low"),
+	Feature("lint", ("quality_score", "num_violations", "violation_codes"), "high"),
+]}
+
+# Radon extractors that work on the snippet instead of the file-level pass
+SNIPPET_RADON = ("complexity", "halstead")
+
+
+def select_features(columns, radon_mode="file"):
+	"""
+	Return the names of the extractors needed for `columns`, or None for all of them.
+
+	Columns no extractor fills (names, paths, repo metadata, name_length)
+	are always present and need nothing.
+	"""
+	if columns is None:
+		return None
+	columns = set(columns)
+	selected = set()
+	pending = [f.name for f in FEATURES.values() if columns & set(f.columns)]
+	while pending:
+		name = pending.pop()
+		if name in selected:
+			continue
+		selected.add(name)
+		pending.extend(FEATURES[name].requires)
+		if radon_mode == "snippet" and name in SNIPPET_RADON:
+			pending.append("snippet")
+	return frozenset(selected)
+
+
+def wants(features, name):
+	"""True if extractor `name` is selected; `features` None selects everything."""
+	return features is None or name in features
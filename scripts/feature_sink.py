@@ -0,0 +1,261 @@
+import abc
+import csv
+import os
+import queue
+import shutil
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import metrics
+from feature_records import FEATURE_COLUMNS, FEATURE_SCHEMA, iter_feature_rows
+from feature_store import PARTITIONING
+
+_CLOSE = object()
+
+
+class FeatureSink(abc.ABC):
+	"""
+	Single writer thread fed by a bounded queue.
+
+	Producers hand over whole lists of extractors with `write`, which only
+	enqueues; the writer thread owns the output, batches rows and flushes
+	when `batch_rows` rows are buffered or `flush_interval` seconds have
+	passed. A full queue blocks producers, which is the only backpressure.
+
+	`write` can take an `on_durable` callback, run on the writer thread once
+	the rows of that call can no longer be lost; checkpointing relies on it.
+	Subclasses implement `_open`, `_write_rows` and `_close` and call
+	`_durable` whenever everything written so far is safely on disk.
+	"""
+
+	def __init__(self, batch_rows=50000, flush_interval=30.0, max_queue=64):
+		self.batch_rows = batch_rows
+		self.flush_interval = flush_interval
+		self.queue = queue.Queue(maxsize=max_queue)
+		self.rows_written = 0
+		self.error = None
+		self.buffered_callbacks = []  # for rows still in the writer's buffer
+		self.written_callbacks = []   # for rows handed to _write_rows but not yet durable
+		self.thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+		self.thread.start()
+
+	def write(self, features, on_durable=None):
+		"""Queue a FeatureBatch or a list of CodeFeatureExtractor objects for writing."""
+		if self.error is not None:
+			raise RuntimeError("Feature sink writer failed") from self.error
+		if features:
+			self.queue.put((features, on_durable))
+		elif on_durable is not None:
+			on_durable()
+
+	def close(self):
+		"""Flush everything still queued and finalize the output."""
+		self.queue.put(_CLOSE)
+		self.thread.join()
+		if self.error is not None:
+			raise RuntimeError("Feature sink writer failed") from self.error
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def _run(self):
+		buffer = []
+		last_flush = time.monotonic()
+		closing = False
+		try:
+			self._open()
+			while True:
+				timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+				try:
+					item = self.queue.get(timeout=timeout)
+				except queue.Empty:
+					item = None
+
+				closing = item is _CLOSE
+				if item is not None and not closing:
+					features, on_durable = item
+					buffer.extend(iter_feature_rows(features))
+					if on_durable is not None:
+						self.buffered_callbacks.append(on_durable)
+
+				due = time.monotonic() - last_flush >= self.flush_interval
+				if buffer and (len(buffer) >= self.batch_rows or due or closing):
+					self.written_callbacks.extend(self.buffered_callbacks)
+					self.buffered_callbacks = []
+					with metrics.timer("sink_write", sink=type(self).__name__):
+						self._write_rows(buffer)
+					metrics.inc("rows_written_total", len(buffer))
+					self.rows_written += len(buffer)
+					buffer = []
+				if due or not buffer:
+					last_flush = time.monotonic()
+
+				if closing:
+					break
+			self._close()
+		except Exception as e:
+			self.error = e
+			# Keep draining so producers blocked on a full queue are released
+			while not closing:
+				closing = self.queue.get() is _CLOSE
+
+	def _durable(self):
+		callbacks, self.written_callbacks = self.written_callbacks, []
+		for callback in callbacks:
+			try:
+				callback()
+			except Exception as e:
+				print(f"[ERROR] Durability callback failed: {e}")
+
+	@abc.abstractmethod
+	def _open(self):
+		pass
+
+	@abc.abstractmethod
+	def _write_rows(self, rows):
+		pass
+
+	@abc.abstractmethod
+	def _close(self):
+		pass
+
+
+class ParquetFeatureSink(FeatureSink):
+	"""
+	Writes row groups into a directory of Parquet part files.
+
+	Each part is written under a temporary name and renamed once its footer
+	is written, after `rows_per_file` rows or on close, so every *.parquet
+	file in the directory is always complete and readable.
+	"""
+
+	def __init__(self, directory, rows_per_file=1000000, compression="zstd", **kwargs):
+		self.directory = directory
+		self.rows_per_file = rows_per_file
+		self.compression = compression
+		self.writer = None
+		self.part_rows = 0
+		self.part_index = 0
+		super().__init__(**kwargs)
+
+	def _open(self):
+		os.makedirs(self.directory, exist_ok=True)
+		# Parts a crashed run never finished are not readable; their rows were never reported durable
+		for f in os.listdir(self.directory):
+			if f.endswith(".parquet.inprogress"):
+				os.remove(os.path.join(self.directory, f))
+		# Continue numbering after parts left by earlier runs
+		existing = [f for f in os.listdir(self.directory) if f.startswith("part-") and f.endswith(".parquet")]
+		self.part_index = len(existing)
+
+	def _part_path(self):
+		return os.path.join(self.directory, f"part-{self.part_index:05d}.parquet")
+
+	def _write_rows(self, rows):
+		if self.writer is None:
+			self.writer = pq.ParquetWriter(
+				self._part_path() + ".inprogress", FEATURE_SCHEMA, compression=self.compression
+			)
+		self.writer.write_table(pa.Table.from_pylist(rows, schema=FEATURE_SCHEMA))
+		self.part_rows += len(rows)
+		if self.part_rows >= self.rows_per_file:
+			self._finish_part()
+
+	def _finish_part(self):
+		self.writer.close()
+		os.replace(self._part_path() + ".inprogress", self._part_path())
+		self.writer = None
+		self.part_rows = 0
+		self.part_index += 1
+		self._durable()
+
+	def _close(self):
+		if self.writer is not None:
+			self._finish_part()
+
+
+class PartitionedParquetSink(FeatureSink):
+	"""
+	Writes a feature store: Parquet parts partitioned by repo (see feature_store).
+
+	Each flush writes one part per repo it contains, first into a staging
+	directory and then renamed into `{directory}/repo_full_name=<owner>%2F<repo>/`, so
+	every part in the store is complete and all flushed rows are durable.
+	Fewer, larger parts come from a larger `batch_rows`.
+	"""
+
+	STAGING = ".staging"
+
+	def __init__(self, directory, compression="zstd", **kwargs):
+		self.directory = directory
+		self.compression = compression
+		self.part_index = 0
+		super().__init__(**kwargs)
+
+	def _open(self):
+		os.makedirs(self.directory, exist_ok=True)
+		# A crashed run's staged parts were never reported durable
+		shutil.rmtree(os.path.join(self.directory, self.STAGING), ignore_errors=True)
+		# Continue numbering after parts left by earlier runs
+		for dirpath, dirnames, filenames in os.walk(self.directory):
+			self.part_index += sum(1 for f in filenames if f.startswith("part-") and f.endswith(".parquet"))
+
+	def _write_rows(self, rows):
+		staging = os.path.join(self.directory, self.STAGING)
+		ds.write_dataset(
+			pa.Table.from_pylist(rows, schema=FEATURE_SCHEMA),
+			staging,
+			format="parquet",
+			partitioning=PARTITIONING,
+			basename_template=f"part-{self.part_index:05d}-{{i}}.parquet",
+			file_options=ds.ParquetFileFormat().make_write_options(compression=self.compression),
+		)
+		for dirpath, dirnames, filenames in os.walk(staging):
+			target = os.path.join(self.directory, os.path.relpath(dirpath, staging))
+			for filename in filenames:
+				os.makedirs(target, exist_ok=True)
+				os.replace(os.path.join(dirpath, filename), os.path.join(target, filename))
+		shutil.rmtree(staging)
+		self.part_index += 1
+		self._durable()
+
+	def _close(self):
+		pass
+
+
+class CsvFeatureSink(FeatureSink):
+	"""Single-writer CSV output with a fixed column order and exactly one header."""
+
+	def __init__(self, filename, **kwargs):
+		self.filename = filename
+		self.file = None
+		super().__init__(**kwargs)
+
+	def _open(self):
+		self.file = open(self.filename, "a", newline="", encoding="utf-8")
+		self.writer = csv.DictWriter(self.file, fieldnames=FEATURE_COLUMNS)
+		if self.file.tell() == 0:
+			self.writer.writeheader()
+
+	def _write_rows(self, rows):
+		self.writer.writerows(rows)
+		self.file.flush()
+		os.fsync(self.file.fileno())
+		self._durable()
+
+	def _close(self):
+		self.file.close()
+
+
+def make_sink(output, **kwargs):
+	"""CSV sink for a .csv path, otherwise a feature store directory partitioned by repo."""
+	if output.endswith(".csv"):
+		return CsvFeatureSink(output, **kwargs)
+	return PartitionedParquetSink(output, **kwargs)
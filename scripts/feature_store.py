@@ -0,0 +1,71 @@
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from feature_records import FEATURE_COLUMNS, FEATURE_SCHEMA
+
+# Rows are stored under {root}/repo_full_name=<owner>%2F<repo>/part-*.parquet
+# (partition values are URI-encoded); the column itself lives in the
+# directory name, not in the files. Repo names alone are not unique across owners
+PARTITION_COLUMN = "repo_full_name"
+PARTITIONING = ds.partitioning(
+	pa.schema([(PARTITION_COLUMN, pa.string())]),
+	flavor="hive",
+)
+
+# Schema of the files inside a partition
+FILE_SCHEMA = pa.schema([field for field in FEATURE_SCHEMA if field.name != PARTITION_COLUMN])
+
+
+def open_dataset(root):
+	"""Open a feature store directory as a pyarrow dataset with its repo partitioning."""
+	return ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+
+
+def _filter(repos, filter):
+	# Repo filters prune whole partition directories; other predicates use row group statistics
+	expression = None
+	if repos is not None:
+		expression = ds.field(PARTITION_COLUMN).isin(list(repos))
+	if filter is not None:
+		expression = filter if expression is None else expression & filter
+	return expression
+
+
+def read_features(root, columns=None, repos=None, filter=None):
+	"""
+	Read a feature store into a DataFrame.
+
+	Only `columns` are read (all, in FEATURE_COLUMNS order, by default), only
+	the partitions of `repos` ("owner/repo" names) are opened, and `filter` (a pyarrow.dataset
+	expression such as `ds.field("loc") > 5`) is pushed down to the scan.
+	Dictionary-encoded strings come back as pandas categoricals.
+	"""
+	dataset = open_dataset(root)
+	if columns is None:
+		# Feature columns first, then anything else stored alongside them (scores)
+		columns = [c for c in FEATURE_COLUMNS if c in dataset.schema.names]
+		columns += [c for c in dataset.schema.names if c not in columns]
+	table = dataset.to_table(columns=columns, filter=_filter(repos, filter))
+	return table.to_pandas()
+
+
+def iter_feature_batches(root, columns=None, repos=None, filter=None, batch_size=50000):
+	"""Yield DataFrames of up to `batch_size` rows, with the same pushdown as read_features."""
+	dataset = open_dataset(root)
+	for batch in dataset.to_batches(columns=columns, filter=_filter(repos, filter), batch_size=batch_size):
+		if batch.num_rows:
+			yield batch.to_pandas()
+
+
+def write_features(df, root, basename_template="part-{i}.parquet", compression="zstd"):
+	"""Write a DataFrame with a repo_full_name column into a feature store, one file per repo."""
+	table = pa.Table.from_pandas(df, preserve_index=False)
+	ds.write_dataset(
+		table,
+		root,
+		format="parquet",
+		partitioning=PARTITIONING,
+		basename_template=basename_template,
+		existing_data_behavior="overwrite_or_ignore",
+		file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+	)
@@ -0,0 +1,444 @@
+import argparse
+import ast
+import csv
+import os
+import re
+import subprocess
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+
+import metrics
+from feature_records import ARRAY_COLUMNS
+from github_scraper import GitHubScraper
+
+# Numeric features followed over time, without the all-null, label and grouping columns
+HISTORY_COLUMNS = [
+	name for name in ARRAY_COLUMNS
+	if name not in ("estimated_branches", "quality", "duplicate_cluster")
+]
+
+FUNCTION_SERIES_COLUMNS = ["commit", "timestamp", "file_path", "function", "status", "lineno"] + HISTORY_COLUMNS
+
+# Columns of the whole-file lint pass, refreshed for every function of a changed file
+LINT_COLUMNS = ("quality_score", "num_violations")
+
+# Sums kept up to date as functions change, so repo totals never rescan the tree
+TOTAL_COLUMNS = ("loc", "num_violations", "quality_score", "estimated_complexity")
+
+REPO_SERIES_COLUMNS = [
+	"commit",
+	"timestamp",
+	"files",
+	"functions",
+	"functions_changed",
+	"loc",
+	"num_violations",
+	"mean_quality_score",
+	"mean_complexity",
+]
+
+# Function results of recently seen blobs, so reverted and copied files are not analyzed again
+BLOB_CACHE_SIZE = 4096
+
+_HUNK = re.compile(rb"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_INDEX = re.compile(rb"^index ([0-9a-f]+)\.\.([0-9a-f]+)")
+
+# Modes of symlinks and submodules, whose entries are not Python source
+_SKIP_MODES = {"120000", "160000"}
+
+
+class GitRepository:
+	"""Commits, tree diffs and blobs of a local checkout or bare repo, read through git plumbing."""
+
+	def __init__(self, path):
+		self.path = path
+		self.cat_file = subprocess.Popen(
+			["git", "-C", path, "cat-file", "--batch"],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE
+		)
+		# Diffing against the empty tree lists every file of a commit as added
+		self.empty_tree = self.git("hash-object", "-t", "tree", "/dev/null").decode("ascii").strip()
+
+	def git(self, *args):
+		return subprocess.run(["git", "-C", self.path, *args], capture_output=True, check=True).stdout
+
+	def commits(self, rev="HEAD", since=None):
+		"""Return (sha, commit time) along the first-parent history of `rev`, oldest first."""
+		revision = f"{since}..{rev}" if since else rev
+		output = self.git("log", "--first-parent", "--reverse", "--format=%H %ct", revision)
+		commits = []
+		for line in output.decode("ascii").splitlines():
+			sha, timestamp = line.split()
+			commits.append((sha, int(timestamp)))
+		return commits
+
+	def changes(self, parent, commit):
+		"""Return (status, path, old blob, new blob) for every changed .py file between two commits."""
+		output = self.git("diff-tree", "-r", "-z", "--no-renames", parent, commit, "--", "*.py")
+		fields = output.decode("utf-8", errors="replace").split("\0")
+		changes = []
+		for info, path in zip(fields[0::2], fields[1::2]):
+			old_mode, new_mode, old_sha, new_sha, status = info.lstrip(":").split()
+			if status == "D":
+				if old_mode not in _SKIP_MODES:
+					changes.append(("D", path, old_sha, None))
+			elif new_mode in _SKIP_MODES:
+				# A file replaced by a symlink is gone as far as its functions go
+				if old_mode not in _SKIP_MODES and status != "A":
+					changes.append(("D", path, old_sha, None))
+			elif status == "A" or old_mode in _SKIP_MODES:
+				changes.append(("A", path, None, new_sha))
+			elif old_sha != new_sha:
+				changes.append(("M", path, old_sha, new_sha))
+		return changes
+
+	def hunks(self, parent, commit):
+		"""
+		Return {(old blob, new blob): [(old first, old count, new first, new count)]} for modified .py files.
+
+		Diffs have no context lines, so their size follows the number of
+		changed lines.
+		"""
+		output = self.git(
+			"diff-tree", "-r", "-p", "-U0", "--no-color", "--no-ext-diff", "--full-index", "--no-renames",
+			parent, commit, "--", "*.py",
+		)
+		hunks = {}
+		file_hunks = None
+		for line in output.split(b"\n"):
+			match = _HUNK.match(line)
+			if match is not None:
+				if file_hunks is not None:
+					old_first, old_count, new_first, new_count = match.groups()
+					file_hunks.append((
+						int(old_first), 1 if old_count is None else int(old_count),
+						int(new_first), 1 if new_count is None else int(new_count),
+					))
+				continue
+			match = _INDEX.match(line)
+			if match is not None:
+				file_hunks = hunks.setdefault((match.group(1).decode("ascii"), match.group(2).decode("ascii")), [])
+		return hunks
+
+	def read_blob(self, sha):
+		self.cat_file.stdin.write(sha.encode("ascii") + b"\n")
+		self.cat_file.stdin.flush()
+		header = self.cat_file.stdout.readline().split()
+		if len(header) < 3 or header[1] != b"blob":
+			return None
+		data = self.cat_file.stdout.read(int(header[2]) + 1)[:-1]  # drop the trailing newline
+		return data.decode("utf-8", errors="replace")
+
+	def close(self):
+		self.cat_file.stdin.close()
+		self.cat_file.wait()
+
+
+def function_names(tree):
+	"""
+	Return {def line: (node, name)} for every FunctionDef in `tree`.
+
+	Names are qualified like __qualname__ (`Class.method`,
+	`outer.<locals>.inner`), with `#2`, `#3`... for later definitions of the
+	same name in one file, so a function keeps its name across commits.
+	"""
+	names = {}
+	seen = Counter()
+	stack = [(tree, "")]
+	while stack:
+		node, prefix = stack.pop()
+		scopes = []
+		for child in ast.iter_child_nodes(node):
+			if isinstance(child, ast.FunctionDef):
+				name = prefix + child.name
+				seen[name] += 1
+				names[child.lineno] = (child, name if seen[name] == 1 else f"{name}#{seen[name]}")
+				scopes.append((child, name + ".<locals>."))
+			elif isinstance(child, ast.AsyncFunctionDef):
+				scopes.append((child, prefix + child.name + ".<locals>."))
+			elif isinstance(child, ast.ClassDef):
+				scopes.append((child, prefix + child.name + "."))
+			else:
+				scopes.append((child, prefix))
+		# Reversed so definitions are numbered in source order
+		stack.extend(reversed(scopes))
+	return names
+
+
+def touched(node, starts, ends):
+	"""True if a changed line range falls inside `node`, decorators included."""
+	first = min([d.lineno for d in node.decorator_list] + [node.lineno])
+	i = bisect_left(ends, first)
+	return i < len(starts) and starts[i] <= node.end_lineno
+
+
+def changed_ranges(hunks):
+	"""New-side (first, last) lines of `hunks`; a pure deletion touches the lines on both sides of it."""
+	return [
+		(new_first, new_first + new_count - 1) if new_count else (new_first, new_first + 1)
+		for _, _, new_first, new_count in hunks
+	]
+
+
+def shift_line(hunks, lineno):
+	"""Where old line `lineno` is after `hunks`, or None if a hunk replaced it."""
+	offset = 0
+	for old_first, old_count, _, new_count in hunks:
+		if old_count and old_first <= lineno < old_first + old_count:
+			return None
+		# A pure insertion comes after old line `old_first`
+		if old_first + max(old_count, 1) - 1 >= lineno:
+			break
+		offset += new_count - old_count
+	return lineno + offset
+
+
+class HistoryAnalyzer:
+	"""
+	Quality time series over the first-parent history of a local git repo.
+
+	Each commit is diffed against the previous one and only changed .py
+	blobs are read. In a modified file only the functions whose lines (or
+	decorators) a hunk touches are extracted again. The others carry their
+	previous results forward when the previous record of their name, moved
+	by the hunks above it, starts on their line; otherwise the name now
+	belongs to another function (e.g. a same-named def inserted above
+	shifts the `#2`, `#3`... ordinals) and they are extracted again. Lint
+	scores are never carried: the whole changed file is linted, and every
+	function takes its score from that pass, since an edit elsewhere in the
+	file (an import, a shadowed name) can change another function's
+	violations. Function rows are only written when a function is added,
+	removed or its features change, and repo totals are kept as running
+	sums, so the work per commit follows the size of its diff.
+	"""
+
+	def __init__(self, path, radon_mode="file", lint="flake8"):
+		self.repo = GitRepository(path)
+		self.scraper = GitHubScraper(radon_mode=radon_mode, columns=HISTORY_COLUMNS, lint=lint)
+		self.files = {}  # path -> (blob sha, {function name: values})
+		self.blobs = OrderedDict()  # blob sha -> {function name: values}, least recently used first
+		self.totals = Counter()
+		self.counts = Counter()
+		self.num_functions = 0
+
+	def run(self, function_writer, repo_writer, rev="HEAD", since=None):
+		"""Walk the history and write a row per function change and per commit; return the commit count."""
+		commits = self.repo.commits(rev, since)
+		parent = self.repo.empty_tree
+		if since:
+			# Start from the full state at `since`, without writing rows for it
+			self.analyze_commit(since, parent, None, None)
+			parent = since
+
+		for sha, timestamp in commits:
+			with metrics.timer("history_commit"):
+				rows = self.analyze_commit(sha, parent, sha, timestamp)
+			function_writer.writerows(rows)
+			repo_writer.writerow(self.repo_row(sha, timestamp, len(rows)))
+			metrics.inc("history_commits_total")
+			parent = sha
+		return len(commits)
+
+	def analyze_commit(self, commit, parent, sha, timestamp):
+		changes = self.repo.changes(parent, commit)
+		hunks = self.repo.hunks(parent, commit) if any(c[0] == "M" for c in changes) else {}
+
+		# New states are computed against the previous commit first, so a
+		# file moved within this commit can reuse the results of its old path
+		updates = []
+		for status, path, old_sha, new_sha in changes:
+			if status == "D":
+				updates.append((path, None, {}))
+				continue
+			functions = self.blobs.get(new_sha)
+			if functions is not None:
+				self.blobs.move_to_end(new_sha)
+				metrics.inc("history_blobs_reused_total")
+			else:
+				previous = self.files.get(path)
+				if status == "M" and previous is not None and previous[0] == old_sha:
+					functions = self.update_file(path, new_sha, previous[1], hunks.get((old_sha, new_sha), []))
+				else:
+					functions = self.analyze_file(path, new_sha)
+				self.remember(new_sha, functions)
+			updates.append((path, new_sha, functions))
+
+		rows = []
+		for path, new_sha, functions in updates:
+			_, old_functions = self.files.pop(path, (None, {}))
+			if new_sha is not None:
+				self.files[path] = (new_sha, functions)
+			if sha is not None:
+				rows.extend(self.diff_functions(path, old_functions, functions, sha, timestamp))
+			self.update_totals(old_functions, functions)
+		return rows
+
+	def analyze_file(self, path, sha):
+		"""Extract every function of a blob; return {name: values}."""
+		metrics.inc("history_files_analyzed_total")
+		code = self.repo.read_blob(sha)
+		tree = self._parse(path, code)
+		if tree is None:
+			return {}
+		features, _ = self.scraper.extract_tree_features(path, code, tree, {})
+		return self._values(function_names(tree), features, {})
+
+	def update_file(self, path, sha, previous, hunks):
+		"""Extract the functions of a modified blob that `hunks` touch or move to another name; carry the rest forward."""
+		metrics.inc("history_files_updated_total")
+		code = self.repo.read_blob(sha)
+		tree = self._parse(path, code)
+		if tree is None:
+			return {}
+
+		names = function_names(tree)
+		ranges = changed_ranges(hunks)
+		starts = [first for first, _ in ranges]
+		ends = [last for _, last in ranges]
+		select = {
+			node for node, name in names.values()
+			if name not in previous
+			or shift_line(hunks, previous[name]["lineno"]) != node.lineno
+			or touched(node, starts, ends)
+		}
+		metrics.inc("history_functions_reused_total", len(names) - len(select))
+		scores = {}
+		features, _ = self.scraper.extract_tree_features(path, code, tree, {}, select=select, scores=scores)
+		return self._values(names, features, previous, scores)
+
+	def _parse(self, path, code):
+		if code is None:
+			return None
+		try:
+			with metrics.timer("ast_parse"):
+				return ast.parse(code)
+		except SyntaxError as e:
+			print(f"[ERROR] Failed to parse {path}: {e}")
+			metrics.inc("parse_errors_total")
+			return None
+
+	@staticmethod
+	def _values(names, features, previous, scores=None):
+		extracted = {f.lineno: f for f in features}
+		functions = {}
+		for lineno, (node, name) in names.items():
+			feature = extracted.get(lineno)
+			if feature is not None:
+				values = {column: getattr(feature, column) for column in HISTORY_COLUMNS}
+			else:
+				values = dict(previous[name])
+				if scores and node in scores:
+					values.update(zip(LINT_COLUMNS, scores[node]))
+			values["lineno"] = lineno
+			functions[name] = values
+		return functions
+
+	def remember(self, sha, functions):
+		self.blobs[sha] = functions
+		if len(self.blobs) > BLOB_CACHE_SIZE:
+			self.blobs.popitem(last=False)
+
+	@staticmethod
+	def diff_functions(path, old, new, sha, timestamp):
+		"""Rows for the functions of `path` that were added, removed or changed."""
+		rows = []
+		for name, values in new.items():
+			before = old.get(name)
+			if before is None:
+				status = "added"
+			elif any(before[c] != values[c] for c in HISTORY_COLUMNS):
+				status = "modified"
+			else:
+				continue
+			row = {"commit": sha, "timestamp": timestamp, "file_path": path, "function": name, "status": status}
+			row.update(values)
+			rows.append(row)
+		for name, values in old.items():
+			if name not in new:
+				rows.append({
+					"commit": sha,
+					"timestamp": timestamp,
+					"file_path": path,
+					"function": name,
+					"status": "removed",
+					"lineno": values["lineno"],
+				})
+		return rows
+
+	def update_totals(self, old, new):
+		for sign, functions in ((-1, old), (1, new)):
+			self.num_functions += sign * len(functions)
+			for values in functions.values():
+				for column in TOTAL_COLUMNS:
+					if values[column] is not None:
+						self.totals[column] += sign * values[column]
+						self.counts[column] += sign
+
+	def repo_row(self, sha, timestamp, functions_changed):
+		def mean(column):
+			return self.totals[column] / self.counts[column] if self.counts[column] else None
+
+		return {
+			"commit": sha,
+			"timestamp": timestamp,
+			"files": len(self.files),
+			"functions": self.num_functions,
+			"functions_changed": functions_changed,
+			"loc": self.totals["loc"],
+			"num_violations": self.totals["num_violations"],
+			"mean_quality_score": mean("quality_score"),
+			"mean_complexity": mean("estimated_complexity"),
+		}
+
+	def close(self):
+		self.repo.close()
+
+
+def analyze_history(path, output_prefix="history", rev="HEAD", since=None, radon_mode="file", lint="flake8"):
+	"""
+	Write `{output_prefix}_functions.csv` and `{output_prefix}_repo.csv` for a local git repo.
+
+	The function series has one row per function change (see
+	HistoryAnalyzer); the repo series one row per commit.
+	"""
+	path = os.path.abspath(path)
+	print(f"\n Analyzing history of: {path}")
+
+	analyzer = HistoryAnalyzer(path, radon_mode=radon_mode, lint=lint)
+	functions_file = f"{output_prefix}_functions.csv"
+	repo_file = f"{output_prefix}_repo.csv"
+	try:
+		with open(functions_file, "w", newline="", encoding="utf-8") as f, \
+				open(repo_file, "w", newline="", encoding="utf-8") as r:
+			function_writer = csv.DictWriter(f, fieldnames=FUNCTION_SERIES_COLUMNS)
+			repo_writer = csv.DictWriter(r, fieldnames=REPO_SERIES_COLUMNS)
+			function_writer.writeheader()
+			repo_writer.writeheader()
+			num_commits = analyzer.run(function_writer, repo_writer, rev=rev, since=since)
+	finally:
+		analyzer.close()
+
+	print(f"\nAnalyzed {num_commits} commits.")
+	print(f"Saved results to {functions_file} and {repo_file}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Follow function quality over the history of a local git repo.")
+	parser.add_argument("path", help="Checkout or bare git repository")
+	parser.add_argument("--output", default="history", help="prefix of the two output CSV files")
+	parser.add_argument("--rev", default="HEAD", help="last commit to analyze")
+	parser.add_argument("--since", help="start after this commit instead of at the first one")
+	parser.add_argument("--lint", default="flake8", choices=["flake8", "ruff", "none"])
+	parser.add_argument("--metrics-file", help="write a JSON metrics summary here when done")
+	args = parser.parse_args()
+
+	analyze_history(
+		args.path,
+		args.output,
+		rev=args.rev,
+		since=args.since,
+		lint=None if args.lint == "none" else args.lint,
+	)
+	if args.metrics_file:
+		metrics.REGISTRY.write_summary(args.metrics_file)
@@ -1,11 +1,43 @@
 import requests
 import ast
+import hashlib
+import json
+import tarfile
+import metrics
 from code_processing import CodeFeatureExtractor
+from feature_cache import from_records, to_records
+from feature_engine import FileFeatureEngine, FileRadonMetrics
+from feature_registry import select_features, wants
+from lint_backend import LINTERS, assign_violations, score_from_violations, summarize_violations
+from source_buffer import SourceBuffer
 
 class GitHubScraper:
-	def __init__(self, token=None):
-		self.base_url = "https://api.github.com"
+	def __init__(
+		self,
+		token=None,
+		radon_mode="file",
+		cache=None,
+		http_cache=None,
+		dedup=None,
+		base_url="https://api.github.com",
+		raw_url="https://raw.githubusercontent.com",
+		columns=None,
+		lint="flake8",
+	):
+		self.base_url = base_url  # both URLs can point at a local mock server
+		self.raw_url = raw_url
+		self.radon_mode = radon_mode  # "file": one radon pass per file, "snippet": one per function
+		# Extractors needed for `columns` (see feature_registry); None computes every feature
+		self.features = select_features(columns, radon_mode)
+		# Each file is linted once, in context: "flake8" (in process), "ruff" or None to skip
+		self.linter = LINTERS[lint]() if lint is not None and wants(self.features, "lint") else None
+		self.cache = cache  # optional feature_cache.FeatureCache keyed by blob SHA
+		self.dedup = dedup  # optional dedup_index.DuplicateIndex; exact duplicates are skipped
 		self.session = requests.Session()
+		self.session.hooks["response"].append(metrics.record_response)
+		if http_cache is not None:
+			# Conditional requests for API calls; 304s do not count against the rate limit
+			http_cache.mount(self.session, self.base_url)
 		if token:
 			self.session.headers.update({"Authorization": f"token {token}"})
 		self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
@@ -18,6 +50,7 @@ class GitHubScraper:
 			data = response.json()
 			return {
 				"name": data["name"],
+				"full_name": data.get("full_name") or f"{owner}/{repo}",
 				"stars": data["stargazers_count"],
 				"forks": data["forks_count"],
 				"watchers": data["subscribers_count"],
@@ -31,8 +64,12 @@ class GitHubScraper:
 			return None
 		
 	def get_python_files(self, owner, repo):
-
 		"""Return a list of all .py file paths in a GitHub repo."""
+		return [blob["path"] for blob in self.get_python_blobs(owner, repo)]
+
+	def get_python_blobs(self, owner, repo):
+
+		"""Return the path, blob SHA and size of every .py file in a GitHub repo."""
 
 		# Step 1: Get the default branch (usually 'main' or 'master')
 		repo_url = f"{self.base_url}/repos/{owner}/{repo}"
@@ -54,13 +91,17 @@ class GitHubScraper:
 		all_files = tree_data.get("tree", [])
 
 		# Step 3: Filter for Python files
-		py_files = [f["path"] for f in all_files if f["path"].endswith(".py") and f["type"] == "blob"]
+		py_files = [
+			{"path": f["path"], "sha": f["sha"], "size": f.get("size")}
+			for f in all_files
+			if f["path"].endswith(".py") and f["type"] == "blob"
+		]
 
 		return py_files
 	
 	def download_file_content(self, owner, repo, file_path):
 		"""Download raw content of a file from the repo."""
-		url = f"https://raw.githubusercontent.com/{owner}/{repo}/HEAD/{file_path}"
+		url = f"{self.raw_url}/{owner}/{repo}/HEAD/{file_path}"
 		response = self.session.get(url)
 
 		if response.status_code == 200:
@@ -69,43 +110,252 @@ class GitHubScraper:
 			print(f"[ERROR] Failed to download {file_path}: {response.status_code}")
 			return None
 	
+	def get_blob_features(self, owner, repo, blob, repo_metadata):
+		"""Return features for one blob, skipping download and extraction on a cache hit."""
+		return self._features_with_cache(
+			blob["sha"],
+			blob["path"],
+			repo_metadata,
+			lambda: self.download_file_content(owner, repo, blob["path"])
+		)
+
+	def open_repo_archive(self, owner, repo):
+		"""Open a streaming download of the repo's default-branch tarball."""
+		url = f"{self.base_url}/repos/{owner}/{repo}/tarball"
+		response = self.session.get(url, stream=True)
+		if response.status_code != 200:
+			print(f"[ERROR] Failed to download archive for {owner}/{repo}: {response.status_code}")
+			return None
+		return response.raw
+
+	def iter_archive_python_files(self, fileobj):
+		"""Yield (path, raw bytes, git blob SHA) for each .py file in a streamed tarball."""
+		# "r|*" reads members sequentially, so nothing is unpacked to disk or seeked
+		with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+			for member in archive:
+				if not member.isfile() or not member.name.endswith(".py"):
+					continue
+
+				# GitHub prefixes every member with an "{owner}-{repo}-{commit}/" directory
+				path = member.name.split("/", 1)[-1]
+				data = archive.extractfile(member).read()
+				sha = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+				yield path, data, sha
+
+	def _lint_file(self, file_path, code_str, summaries):
+		"""Lint the whole file and return {node: (quality_score, num_violations, violation_codes)}."""
+		try:
+			with metrics.timer("lint_file"):
+				violations = self.linter.check(code_str)
+		except Exception as e:
+			print(f"[ERROR] Failed to lint {file_path}: {e}")
+			metrics.inc("lint_errors_total")
+			return {summary.node: (None, None, None) for summary in summaries}
+
+		# Spans of every function, also skipped duplicates, so violations go to the innermost one
+		nodes = [summary.node for summary in summaries]
+		assigned = assign_violations(violations, [(node.lineno, node.end_lineno) for node in nodes])
+		results = {}
+		for node, node_violations in zip(nodes, assigned):
+			num_violations, codes = summarize_violations(node_violations)
+			results[node] = (
+				score_from_violations(num_violations),
+				num_violations,
+				json.dumps(codes, sort_keys=True),
+			)
+		return results
+
+	def get_archive_features(self, owner, repo, repo_metadata, archive_file=None, into=None):
+		"""
+		Return features for every .py file in a repo from a single archive download.
+
+		`archive_file` may be a local tarball path or file object, which is read
+		instead of the network. Features are added file by file to `into` (for
+		example a feature_records.FeatureBatch) when given.
+		"""
+		if archive_file is None:
+			fileobj = self.open_repo_archive(owner, repo)
+			if fileobj is None:
+				return []
+		elif isinstance(archive_file, str):
+			fileobj = open(archive_file, "rb")
+		else:
+			fileobj = archive_file
+
+		features = into if into is not None else []
+		try:
+			for path, data, sha in self.iter_archive_python_files(fileobj):
+				print(f"Analyzing {path}")
+				features.extend(self._features_with_cache(
+					sha,
+					path,
+					repo_metadata,
+					lambda: data.decode("utf-8", errors="replace")
+				))
+		except tarfile.TarError as e:
+			print(f"[ERROR] Failed to read archive for {owner}/{repo}: {e}")
+		finally:
+			if fileobj is not archive_file:
+				fileobj.close()
+
+		return features
+
+	def _features_with_cache(self, sha, path, repo_metadata, load_code):
+		if self.cache is not None:
+			records = self.cache.get(sha)
+			if records is not None:
+				return self.drop_seen(from_records(records, path, repo_metadata))
+
+		code = load_code()
+		if code is None:
+			return []
+
+		# With a cache every function of the blob is extracted and cached, and
+		# duplicates are dropped afterwards, as for a hit
+		features, complete = self.extract_file_features(path, code, repo_metadata, skip_seen=self.cache is None)
+		if self.cache is not None:
+			# Rows with only some features computed must not be served to full extractions
+			if complete and self.features is None:
+				self.cache.put(sha, to_records(features))
+			features = self.drop_seen(features)
+		return features
+
+	def drop_seen(self, features):
+		"""Drop cached features of functions the duplicate index has already seen, and cluster the rest."""
+		if self.dedup is None:
+			return features
+		kept = []
+		for feature in features:
+			if feature.ast_hash is not None:
+				feature.duplicate_cluster = self.dedup.assign(feature.ast_hash, feature.minhash)
+				if feature.duplicate_cluster is None:
+					continue
+			kept.append(feature)
+		return kept
+
 	def extract_features_from_code(self, file_path, code_str, repo_metadata):
 		"""Extract features from top-level functions in a code string."""
-		features = []
+		return self.extract_file_features(file_path, code_str, repo_metadata)[0]
+
+	def extract_file_features(self, file_path, code_str, repo_metadata, skip_seen=True):
+		"""
+		Return (features, complete) for a code string.
 
+		`complete` is False when exact duplicates were skipped, since the rows
+		then depend on what was seen before and must not be cached by blob.
+		With `skip_seen` off, every function is extracted and only
+		fingerprinted, for the caller to cache the rows and `drop_seen` them.
+		"""
+		metrics.inc("files_total")
+		metrics.inc("source_bytes_total", len(code_str))
 		try:
-			tree = ast.parse(code_str)
+			with metrics.timer("ast_parse"):
+				tree = ast.parse(code_str)
 		except SyntaxError as e:
 			print(f"[ERROR] Failed to parse {file_path}: {e}")
-			return features
+			metrics.inc("parse_errors_total")
+			return [], True
 
-		for node in ast.walk(tree):
-			if isinstance(node, ast.FunctionDef):
-				name = node.name
-				node_type = "function"
+		return self.extract_tree_features(file_path, code_str, tree, repo_metadata, skip_seen=skip_seen)
 
-				snippet = ast.get_source_segment(code_str, node) or ""
+	def extract_tree_features(self, file_path, code_str, tree, repo_metadata, select=None, scores=None, skip_seen=True):
+		"""
+		Return (features, complete) for an already parsed code string.
 
-				extractor = CodeFeatureExtractor(
-					name=name,
-					node_type=node_type,
-					file_path=file_path,
-					code_snippet=snippet
-				)
+		With `select`, a set of FunctionDef nodes of `tree`, only those
+		functions are extracted and radon only visits them; the file is
+		still linted whole so their scores keep their context. With
+		`scores`, a dict, the lint results of every function of the file,
+		selected or not, are added to it by node.
+		"""
+		features = []
 
-				# Attach repo metadata
-				extractor.repo_name = repo_metadata.get("name")
-				extractor.repo_stars = repo_metadata.get("stars")
-				extractor.repo_forks = repo_metadata.get("forks")
-				extractor.repo_watchers = repo_metadata.get("watchers")
-				extractor.repo_language = repo_metadata.get("language")
-				extractor.repo_created_at = repo_metadata.get("created_at")
-				extractor.repo_last_updated = repo_metadata.get("updated_at")
-				extractor.repo_topics = repo_metadata.get("topics")
+		# One traversal of the file computes the subtree features of every function
+		with metrics.timer("feature_engine"):
+			summaries = FileFeatureEngine(tree, return_lengths=wants(self.features, "max_return_length")).run()
 
-				# Extract internal features
-				extractor.set_features(node)
+		selected = summaries
+		if select is not None:
+			selected = [summary for summary in summaries if summary.node in select]
 
-				features.append(extractor)
+		if self.dedup is not None and skip_seen:
+			# Skip exact duplicates before the radon pass
+			with metrics.timer("dedup"):
+				checked = [(summary,) + self.dedup.check(summary.node) for summary in selected]
+			kept = [item for item in checked if item[3] is not None]
+			metrics.inc("duplicates_skipped_total", len(selected) - len(kept))
+		elif self.dedup is not None:
+			with metrics.timer("dedup"):
+				kept = [(summary,) + self.dedup.fingerprint(summary.node) + (None,) for summary in selected]
+		else:
+			kept = [(summary, None, None, None) for summary in selected]
 
-		return features
+		lint_results = None
+		if self.linter is not None and (kept or scores is not None):
+			lint_results = self._lint_file(file_path, code_str, summaries)
+			if scores is not None:
+				scores.update(lint_results)
+		if not kept:
+			return features, not summaries
+
+		radon_metrics = None
+		complexity = wants(self.features, "complexity")
+		halstead = wants(self.features, "halstead")
+		if self.radon_mode == "file" and (complexity or halstead):
+			radon_tree = tree
+			if select is not None:
+				# Selected functions not nested in another selected one, as a module of their own
+				radon_tree = ast.Module(body=_outermost([item[0].node for item in kept]), type_ignores=[])
+			with metrics.timer("radon_file"):
+				radon_metrics = FileRadonMetrics(radon_tree, complexity=complexity, halstead=halstead)
+
+		# Line offsets are indexed once, so slicing out each function is linear in the file
+		source = None
+		if wants(self.features, "snippet") or wants(self.features, "num_comments"):
+			with metrics.timer("source_buffer"):
+				source = SourceBuffer(code_str)
+
+		for summary, node_hash, signature, cluster in kept:
+			node = summary.node
+			name = node.name
+			node_type = "function"
+
+			snippet = None
+			if wants(self.features, "snippet"):
+				with metrics.timer("snippet"):
+					snippet = source.text(node)
+
+			extractor = CodeFeatureExtractor(
+				name=name,
+				node_type=node_type,
+				file_path=file_path,
+				code_snippet=snippet
+			)
+
+			# Attach repo metadata
+			extractor.attach_repo_metadata(repo_metadata)
+
+			# Extract internal features
+			extractor.set_features(node, summary=summary, radon_metrics=radon_metrics, features=self.features, source=source)
+			extractor.lineno = node.lineno
+			if lint_results is not None:
+				extractor.quality_score, extractor.num_violations, extractor.violation_codes = lint_results[node]
+			extractor.ast_hash = node_hash
+			extractor.minhash = signature
+			extractor.duplicate_cluster = cluster
+
+			features.append(extractor)
+
+		metrics.inc("functions_total", len(features))
+		return features, len(kept) == len(summaries)
+
+
+def _outermost(nodes):
+	"""The nodes whose line range is not inside another node's, in source order."""
+	outermost = []
+	end = 0
+	for node in sorted(nodes, key=lambda n: (n.lineno, -n.end_lineno)):
+		if node.lineno > end:
+			outermost.append(node)
+			end = node.end_lineno
+	return outermost
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers describing the body as it came over the wire; the stored body is already decoded
+WIRE_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+def _stored_headers(headers):
+	return {name: value for name, value in headers.items() if name.lower() not in WIRE_HEADERS}
+
+
+class HttpCache:
+	"""
+	Persistent ETag / Last-Modified cache for GitHub API GET requests.
+
+	Stored responses are revalidated with If-None-Match / If-Modified-Since;
+	GitHub answers unchanged resources with a 304, which does not count
+	against the rate limit, and the stored body is returned instead. A URL
+	fetched or revalidated once in this run is served from the store without
+	any request, which removes repeated fetches such as the repo info that
+	both get_repo_metadata and get_python_files need. Safe to share between
+	threads.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.lock = threading.Lock()
+		self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute(
+			"""CREATE TABLE IF NOT EXISTS responses (
+				key TEXT PRIMARY KEY,
+				url TEXT NOT NULL,
+				etag TEXT,
+				last_modified TEXT,
+				headers TEXT NOT NULL,
+				body BLOB NOT NULL,
+				stored_at REAL NOT NULL
+			)"""
+		)
+		self.conn.commit()
+		self.validated = set()  # keys known to be current in this run
+		self.hits = 0          # served from the store without any request
+		self.revalidated = 0   # 304 answers
+		self.misses = 0
+
+	def mount(self, session, prefix="https://api.github.com"):
+		"""Route `session`'s requests under `prefix` through this cache."""
+		session.mount(prefix, ConditionalCacheAdapter(self))
+		return session
+
+	@staticmethod
+	def key(request):
+		# GitHub varies responses on Accept and Authorization; hash the token rather than store it
+		auth = request.headers.get("Authorization", "")
+		vary = request.headers.get("Accept", "") + "\0" + hashlib.sha256(auth.encode("utf-8")).hexdigest()
+		return hashlib.sha256(f"{request.url}\0{vary}".encode("utf-8")).hexdigest()
+
+	def get(self, key):
+		with self.lock:
+			row = self.conn.execute(
+				"SELECT etag, last_modified, headers, body FROM responses WHERE key = ?", (key,)
+			).fetchone()
+		if row is None:
+			return None
+		etag, last_modified, headers, body = row
+		return {"etag": etag, "last_modified": last_modified, "headers": json.loads(headers), "body": body}
+
+	def put(self, key, url, response):
+		with self.lock:
+			self.conn.execute(
+				"INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+				(
+					key,
+					url,
+					response.headers.get("ETag"),
+					response.headers.get("Last-Modified"),
+					json.dumps(_stored_headers(response.headers)),
+					response.content,
+					time.time(),
+				)
+			)
+			self.conn.commit()
+			self.validated.add(key)
+
+	def mark_validated(self, key):
+		with self.lock:
+			self.validated.add(key)
+			self.revalidated += 1
+
+	def count(self, outcome):
+		"""Count a "hits" or "misses" outcome."""
+		with self.lock:
+			setattr(self, outcome, getattr(self, outcome) + 1)
+
+	def is_validated(self, key):
+		with self.lock:
+			return key in self.validated
+
+	def close(self):
+		with self.lock:
+			self.conn.close()
+
+
+class ConditionalCacheAdapter(HTTPAdapter):
+	"""Transport adapter that turns cacheable GETs into conditional requests."""
+
+	def __init__(self, cache, **kwargs):
+		super().__init__(**kwargs)
+		self.cache = cache
+
+	def send(self, request, stream=False, **kwargs):
+		# Streamed downloads (archives) are never buffered into the cache
+		if request.method != "GET" or stream:
+			return super().send(request, stream=stream, **kwargs)
+
+		key = self.cache.key(request)
+		entry = self.cache.get(key)
+		if entry is not None and self.cache.is_validated(key):
+			self.cache.count("hits")
+			return self._from_entry(request, entry)
+
+		if entry is not None:
+			if entry["etag"]:
+				request.headers["If-None-Match"] = entry["etag"]
+			if entry["last_modified"]:
+				request.headers["If-Modified-Since"] = entry["last_modified"]
+
+		response = super().send(request, stream=stream, **kwargs)
+
+		if response.status_code == 304 and entry is not None:
+			self.cache.mark_validated(key)
+			# Read the (empty) body so the connection goes back to the pool
+			response.content
+			response.close()
+			return self._from_entry(request, entry, response.headers)
+
+		if response.status_code == 200 and ("ETag" in response.headers or "Last-Modified" in response.headers):
+			self.cache.count("misses")
+			self.cache.put(key, request.url, response)
+		return response
+
+	@staticmethod
+	def _from_entry(request, entry, fresh_headers=None):
+		response = requests.Response()
+		response.status_code = 200
+		response.reason = "OK"
+		# Entries stored before wire headers were dropped may still carry them
+		response.headers = CaseInsensitiveDict(_stored_headers(entry["headers"]))
+		if fresh_headers is not None:
+			# Keep the current rate-limit counters from the 304
+			for name, value in fresh_headers.items():
+				if name.lower().startswith("x-ratelimit"):
+					response.headers[name] = value
+		response._content = entry["body"]
+		response.encoding = get_encoding_from_headers(response.headers)
+		response.url = request.url
+		response.request = request
+		response.from_cache = True
+		return response
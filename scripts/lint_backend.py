@@ -0,0 +1,155 @@
+import ast
+import json
+import subprocess
+import tokenize
+from collections import Counter
+
+import pycodestyle
+from flake8.defaults import NOQA_INLINE_REGEXP
+from flake8.plugins.pyflakes import FLAKE8_PYFLAKES_CODES
+from pyflakes.checker import Checker as PyflakesChecker
+
+
+class _CollectingReport(pycodestyle.BaseReport):
+	"""pycodestyle report that keeps (line, code) pairs instead of printing them."""
+
+	def init_file(self, filename, lines, expected, line_offset):
+		super().init_file(filename, lines, expected, line_offset)
+		self.violations = []
+
+	def error(self, line_number, offset, text, check):
+		code = super().error(line_number, offset, text, check)
+		if code:
+			self.violations.append((line_number, code))
+		return code
+
+
+class InProcessLinter:
+	"""
+	flake8-equivalent linting of source strings without subprocesses or temp files.
+
+	Runs pyflakes (F codes) and pycodestyle (E/W codes) with flake8's default
+	selection, reports E999 alone on syntax errors and honours inline `# noqa`
+	comments, like flake8 does. Build one instance per worker and reuse it;
+	`check` may be called from several threads at once.
+	"""
+
+	def __init__(self, max_line_length=pycodestyle.MAX_LINE_LENGTH):
+		style = pycodestyle.StyleGuide(
+			quiet=True,
+			max_line_length=max_line_length,
+			ignore=list(pycodestyle.DEFAULT_IGNORE.split(",")),
+		)
+		self.options = style.options
+
+	def check(self, source):
+		"""Return a sorted list of (line_number, code) violations for `source`."""
+		try:
+			tree = ast.parse(source)
+		except SyntaxError as e:
+			return [(e.lineno or 1, "E999")]
+
+		violations = []
+		for message in PyflakesChecker(tree).messages:
+			code = FLAKE8_PYFLAKES_CODES.get(type(message).__name__)
+			if code:
+				violations.append((message.lineno, code))
+
+		lines = source.splitlines(True)
+		report = _CollectingReport(self.options)
+		checker = pycodestyle.Checker(lines=lines, options=self.options, report=report)
+		try:
+			checker.check_all()
+		except tokenize.TokenError as e:
+			return [(e.args[1][0] if len(e.args) > 1 else 1, "E902")]
+		violations.extend(report.violations)
+
+		return sorted(v for v in violations if not self._is_noqa(lines, *v))
+
+	def check_batch(self, sources):
+		return [self.check(source) for source in sources]
+
+	@staticmethod
+	def _is_noqa(lines, line_number, code):
+		if not 0 < line_number <= len(lines):
+			return False
+		match = NOQA_INLINE_REGEXP.search(lines[line_number - 1])
+		if match is None:
+			return False
+		codes = match.group("codes")
+		if not codes:
+			return True
+		return any(code.startswith(c.strip()) for c in codes.replace(",", " ").split())
+
+
+class RuffLinter:
+	"""
+	Lints source strings with the `ruff` executable and reads its JSON output.
+
+	`select` defaults to the pycodestyle and pyflakes rules, the closest to
+	flake8's defaults; ruff only has part of pycodestyle outside preview, so
+	scores are not comparable with InProcessLinter's. Runs one subprocess
+	per source, so lint whole files rather than snippets.
+	"""
+
+	def __init__(self, select=("E", "W", "F"), executable="ruff"):
+		self.command = [
+			executable, "check", "--isolated", "--no-cache", "--output-format", "json",
+			"--select", ",".join(select), "--stdin-filename", "source.py", "-",
+		]
+
+	def check(self, source):
+		"""Return a sorted list of (line_number, code) violations for `source`."""
+		result = subprocess.run(self.command, input=source, capture_output=True, text=True)
+		if result.returncode not in (0, 1):
+			raise RuntimeError(f"ruff failed: {result.stderr.strip()}")
+
+		violations = []
+		for message in json.loads(result.stdout):
+			code = message["code"]
+			if code is None or code == "invalid-syntax":
+				# flake8 reports a syntax error alone
+				return [(message["location"]["row"], "E999")]
+			violations.append((message["location"]["row"], code))
+		return sorted(violations)
+
+	def check_batch(self, sources):
+		return [self.check(source) for source in sources]
+
+
+# Backends for GitHubScraper's `lint` option
+LINTERS = {"flake8": InProcessLinter, "ruff": RuffLinter}
+
+
+def score_from_violations(num_violations):
+	# Convert number of violations into a score from 10 to 0
+	return max(10.0 - num_violations, 0.0)
+
+
+def assign_violations(violations, spans):
+	"""
+	Group file-level violations by function.
+
+	`spans` is a list of (lineno, end_lineno) ranges; each violation goes to
+	the innermost range containing its line, and violations outside every
+	range (module-level code) are dropped. Returns one list per span.
+	"""
+	owners = {}
+	# Outer functions start first, so nested ones overwrite their lines
+	for index in sorted(range(len(spans)), key=lambda i: (spans[i][0], -spans[i][1])):
+		lineno, end_lineno = spans[index]
+		for line in range(lineno, end_lineno + 1):
+			owners[line] = index
+
+	assigned = [[] for _ in spans]
+	for violation in violations:
+		index = owners.get(violation[0])
+		if index is not None:
+			assigned[index].append(violation)
+	return assigned
+
+
+def summarize_violations(violations):
+	"""Return (number of violations, {code: count}) for a list of (line, code) pairs."""
+	counts = Counter(code for _, code in violations)
+	return len(violations), dict(counts)
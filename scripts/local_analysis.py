@@ -0,0 +1,168 @@
+import argparse
+import mmap
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from feature_records import FeatureBatch
+from feature_sink import make_sink
+from github_scraper import GitHubScraper
+
+# Directories never worth descending into when walking a checkout
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", ".tox", ".nox", ".venv", "venv", "node_modules"}
+
+# Per-worker state, created once by _init_worker
+_scraper = None
+_repo_metadata = None
+_git_batch = None
+
+
+def is_bare_repository(path):
+	result = subprocess.run(
+		["git", "-C", path, "rev-parse", "--is-bare-repository"],
+		capture_output=True,
+		text=True
+	)
+	return result.returncode == 0 and result.stdout.strip() == "true"
+
+
+def find_python_files(root):
+	"""Return the paths of all .py files under `root`, relative to it and '/'-separated."""
+	py_files = []
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+		for filename in sorted(filenames):
+			if filename.endswith(".py"):
+				rel_path = os.path.relpath(os.path.join(dirpath, filename), root)
+				py_files.append(rel_path.replace(os.sep, "/"))
+	return py_files
+
+
+def list_git_python_blobs(git_dir, rev="HEAD"):
+	"""Return (path, blob sha) for every .py file in `rev` of a (bare) git repo."""
+	result = subprocess.run(
+		["git", "--git-dir", git_dir, "ls-tree", "-r", "-z", rev],
+		capture_output=True,
+		check=True
+	)
+	blobs = []
+	for entry in result.stdout.decode("utf-8", errors="replace").split("\0"):
+		if not entry:
+			continue
+		info, path = entry.split("\t", 1)
+		mode, obj_type, sha = info.split()
+		# Mode 120000 is a symlink, whose blob is the link target rather than code
+		if obj_type == "blob" and mode != "120000" and path.endswith(".py"):
+			blobs.append((path, sha))
+	return blobs
+
+
+def read_file_mmap(path):
+	"""Read a source file through a memory map instead of buffered reads."""
+	with open(path, "rb") as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			return ""
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+			return mapped[:].decode("utf-8", errors="replace")
+
+
+def read_git_blob(sha):
+	"""Read a blob through this worker's long-lived `git cat-file --batch` process."""
+	_git_batch.stdin.write(sha.encode("ascii") + b"\n")
+	_git_batch.stdin.flush()
+	header = _git_batch.stdout.readline().split()
+	if len(header) < 3 or header[1] != b"blob":
+		return None
+	data = _git_batch.stdout.read(int(header[2]) + 1)[:-1]  # drop the trailing newline
+	return data.decode("utf-8", errors="replace")
+
+
+def _init_worker(repo_metadata, radon_mode, git_dir):
+	global _scraper, _repo_metadata, _git_batch
+	_scraper = GitHubScraper(radon_mode=radon_mode)
+	_repo_metadata = repo_metadata
+	if git_dir is not None:
+		_git_batch = subprocess.Popen(
+			["git", "--git-dir", git_dir, "cat-file", "--batch"],
+			stdin=subprocess.PIPE,
+			stdout=subprocess.PIPE
+		)
+
+
+def _extract_file(task):
+	# task is (rel_path, absolute path) for checkouts or (rel_path, blob sha) for git repos.
+	# Returns the file's features and this worker's metrics since its last task
+	rel_path, source = task
+	try:
+		code = read_git_blob(source) if _git_batch is not None else read_file_mmap(source)
+	except OSError as e:
+		print(f"[ERROR] Failed to read {rel_path}: {e}")
+		return [], metrics.drain()
+	if code is None:
+		return [], metrics.drain()
+
+	# Send back a compact batch rather than pickling every extractor object
+	batch = FeatureBatch()
+	batch.extend(_scraper.extract_features_from_code(rel_path, code, _repo_metadata))
+	return batch, metrics.drain()
+
+
+def analyze_local_repository(path, output_file="features.csv", workers=None, rev="HEAD", radon_mode="file"):
+	"""
+	Extract features from a local checkout or bare git repo without any network access.
+
+	Files are read and analyzed in a process pool, so throughput scales with
+	cores; rows go to a single feature_sink writer, a CSV for a .csv
+	`output_file` and a feature store (see feature_store) otherwise.
+	"""
+	path = os.path.abspath(path)
+	print(f"\n Processing local repository: {path}")
+
+	name = os.path.basename(path.rstrip(os.sep))
+	if name.endswith(".git"):
+		name = name[:-len(".git")]
+	repo_metadata = {"name": name, "full_name": name}
+
+	if is_bare_repository(path):
+		git_dir = path
+		tasks = list_git_python_blobs(git_dir, rev)
+	else:
+		git_dir = None
+		tasks = [(rel, os.path.join(path, rel)) for rel in find_python_files(path)]
+
+	if not tasks:
+		print("No Python files found. Exiting.")
+		return
+
+	print(f"Found {len(tasks)} Python files")
+
+	workers = workers or os.cpu_count()
+	num_features = 0
+	with make_sink(output_file) as sink, ProcessPoolExecutor(
+		max_workers=workers,
+		initializer=_init_worker,
+		initargs=(repo_metadata, radon_mode, git_dir)
+	) as executor:
+		chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+		for features, worker_metrics in executor.map(_extract_file, tasks, chunksize=chunksize):
+			metrics.merge(worker_metrics)
+			sink.write(features)
+			num_features += len(features)
+
+	print(f"\nExtracted features from {num_features} functions.")
+	print(f"Saved results to {output_file}")
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Extract function features from a local directory or git repo.")
+	parser.add_argument("path", help="Directory, checkout or bare git repository")
+	parser.add_argument("--output", default="function_features.csv")
+	parser.add_argument("--workers", type=int, default=None)
+	parser.add_argument("--rev", default="HEAD", help="Revision to read from a bare repository")
+	parser.add_argument("--metrics-file", help="write a JSON metrics summary here when done")
+	args = parser.parse_args()
+
+	analyze_local_repository(args.path, args.output, workers=args.workers, rev=args.rev)
+	if args.metrics_file:
+		metrics.REGISTRY.write_summary(args.metrics_file)
@@ -1,14 +1,62 @@
+import argparse
 import csv
 import os
+import time
 
+import metrics
 import requests
+from crawl_manifest import CrawlManifest
+from crawl_pipeline import CrawlPipeline
+from feature_cache import EXTRACTOR_VERSION, FeatureCache
+from feature_records import FEATURE_COLUMNS, FeatureBatch, iter_feature_rows
+from feature_sink import make_sink
 from github_scraper import GitHubScraper
+from http_cache import HttpCache
 
+CACHE_FILE = "feature_cache.sqlite"
+HTTP_CACHE_FILE = "http_cache.sqlite"
+METRICS_FILE = "crawl_metrics.json"
+MANIFEST_FILE = "crawl_manifest.sqlite"
+FEATURE_STORE = "function_features"
 
-def process_repository(owner, repo, token=None, output_file="features.csv"):
+# Crawl pipeline sizing: download threads, extraction processes (None = all cores)
+# and how many downloaded files may wait for extraction
+IO_WORKERS = 8
+CPU_WORKERS = None
+QUEUE_DEPTH = 256
+ROWS_PER_PART = 100000
+
+
+def process_repository(
+    owner,
+    repo,
+    token=None,
+    output_file="features.csv",
+    cache=None,
+    use_archive=False,
+    archive_file=None,
+    sink=None,
+    keep_snippets=True,
+    http_cache=None,
+    dedup=None,
+):
+    """
+    Extract features for every function in a repo and append them to a CSV.
+
+    With `use_archive`, the repo tarball is downloaded once and streamed instead
+    of fetching each file; `archive_file` (a local tarball) replaces the download.
+    With `sink` (a feature_sink.FeatureSink), rows are handed to its writer
+    thread instead of being appended to `output_file`. Features are held in a
+    compact FeatureBatch; `keep_snippets=False` also drops the code snippets.
+    With `http_cache` (an http_cache.HttpCache), API calls are conditional.
+    With `dedup` (a dedup_index.DuplicateIndex shared across repos), exact
+    duplicate functions are skipped and rows get a duplicate_cluster id.
+    """
     print(f"\n Processing repository: {owner}/{repo}")
 
-    scraper = GitHubScraper(token=token)
+    scraper = GitHubScraper(
+        token=token, cache=cache, http_cache=http_cache, dedup=dedup
+    )
 
     # Step 1: Get repo metadata
     metadata = scraper.get_repo_metadata(owner, repo)
@@ -16,30 +64,37 @@ def process_repository(owner, repo, token=None, output_file="features.csv"):
         print("Failed to fetch metadata. Exiting.")
         return
 
-    # Step 2: Get Python files
-    py_files = scraper.get_python_files(owner, repo)
-    if not py_files:
-        print("No Python files found. Exiting.")
-        return
+    # Extractors are folded into the batch per file, so only one file's objects
+    # are alive at once
+    all_features = FeatureBatch(keep_snippets=keep_snippets)
 
-    print(f"Found {len(py_files)} Python files")
-
-    # Step 3: Process each file
-    all_features = []
+    if use_archive or archive_file is not None:
+        # Steps 2-3: Stream every Python file out of a single archive
+        scraper.get_archive_features(
+            owner, repo, metadata, archive_file=archive_file, into=all_features
+        )
+    else:
+        # Step 2: Get Python files
+        py_files = scraper.get_python_blobs(owner, repo)
+        if not py_files:
+            print("No Python files found. Exiting.")
+            return
 
-    for path in py_files:
-        print(f"Analyzing {path}")
-        code = scraper.download_file_content(owner, repo, path)
-        if not code:
-            continue
+        print(f"Found {len(py_files)} Python files")
 
-        feature_objects = scraper.extract_features_from_code(path, code, metadata)
-        all_features.extend(feature_objects)
+        # Step 3: Process each file
+        for blob in py_files:
+            print(f"Analyzing {blob['path']}")
+            feature_objects = scraper.get_blob_features(owner, repo, blob, metadata)
+            all_features.extend(feature_objects)
 
     print(f"\nExtracted features from {len(all_features)} functions.")
 
     # Step 4: Save to CSV
-    if all_features:
+    if all_features and sink is not None:
+        sink.write(all_features)
+        print("Queued results for writing")
+    elif all_features:
         save_features_to_csv(all_features, output_file)
         print(f"Saved results to {output_file}")
     else:
@@ -51,18 +106,19 @@ def save_features_to_csv(objects, filename):
     write_header = not file_exists or os.stat(filename).st_size == 0
 
     with open(filename, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        header = list(vars(objects[0]).keys())
+        writer = csv.DictWriter(f, fieldnames=FEATURE_COLUMNS)
 
         if write_header:
-            writer.writerow(header)
+            writer.writeheader()
 
-        for obj in objects:
-            writer.writerow([getattr(obj, key) for key in header])
+        writer.writerows(iter_feature_rows(objects))
 
 
-def get_top_python_repos(x, github_token=None):
+def get_top_python_repos(x, github_token=None, http_cache=None):
     headers = {"Authorization": f"token {github_token}"} if github_token else {}
+    session = requests.Session()
+    if http_cache is not None:
+        http_cache.mount(session)
     repos = []
     per_page = 100
 
@@ -90,7 +146,7 @@ def get_top_python_repos(x, github_token=None):
                 f"?q=language:python+{star_filter}&sort=stars&order=desc"
                 f"&per_page={per_page}&page={page}"
             )
-            resp = requests.get(url, headers=headers)
+            resp = session.get(url, headers=headers)
             if resp.status_code != 200:
                 raise Exception(f"GitHub API error: {resp.status_code}, {resp.text}")
             data = resp.json()
@@ -106,8 +162,50 @@ def get_top_python_repos(x, github_token=None):
     return repos
 
 
+def rotate_output(path):
+    """Move an earlier crawl's output aside so a fresh crawl does not append to it; return the new path."""
+    if not os.path.exists(path):
+        return None
+    rotated = f"{path}.{time.strftime('%Y%m%d-%H%M%S')}"
+    os.rename(path, rotated)
+    return rotated
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl GitHub repositories for function features."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the crawl recorded in the manifest instead of starting over",
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="with --resume, also redo files that failed to download or extract",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus-style metrics on http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--profile",
+        default="",
+        help="comma-separated stages to run under cProfile, e.g. radon_file,extract",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        metrics.enable_profiling(args.profile.split(","))
+    if args.metrics_port:
+        metrics.REGISTRY.serve(args.metrics_port)
+
     token = os.getenv("GITHUB_PAT", "")
+    manifest = CrawlManifest(MANIFEST_FILE)
+    # ETags from earlier runs turn unchanged API responses into free 304s
+    http_cache = HttpCache(HTTP_CACHE_FILE)
     # NOTE: initial repo list
     repos = {
         ("psf", "requests"),  # Popular HTTP library
@@ -281,23 +379,62 @@ if __name__ == "__main__":
         ("python", "python-education"),  # Educational resources
         ("python", "python-community"),  # Community-driven projects
     }
-    # NOTE: add the top 1000 most-starred Python repos
-    repos.update(get_top_python_repos(1000, token))
-
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    if args.resume and args.retry_failed:
+        print(f"Retrying {manifest.retry_failed()} failed files")
+    saved_repos = manifest.load_repo_list() if args.resume else None
+    if saved_repos is not None:
+        # The saved list makes a resumed crawl independent of the search API
+        print(f"Resuming crawl of {len(saved_repos)} saved repositories")
+        repos = saved_repos
+    else:
+        if not args.resume:
+            manifest.reset()
+            # The store holds the rows of the crawl the manifest just forgot
+            rotated = rotate_output(FEATURE_STORE)
+            if rotated:
+                print(f"Moved the previous crawl's {FEATURE_STORE} to {rotated}")
+        # NOTE: add the top 1000 most-starred Python repos
+        repos.update(get_top_python_repos(1000, token, http_cache=http_cache))
+        repos = sorted(repos)
+        manifest.save_repo_list(repos)
 
     if __name__ == "__main__":
         token = os.getenv("GITHUB_PAT", "")
-        output_file = "function_features.csv"
-
-        def run_job(repo_tuple):
-            owner, repo = repo_tuple
-            process_repository(owner, repo, token=token, output_file=output_file)
-
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            futures = [executor.submit(run_job, repo_pair) for repo_pair in repos]
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"Error processing a repository: {e}")
+        output_file = FEATURE_STORE
+        # Shared by all workers; the key version covers the default "file" radon mode
+        cache = FeatureCache(CACHE_FILE, version=f"{EXTRACTOR_VERSION}-file")
+        # One writer thread owns the output, a feature store partitioned by repo;
+        # workers only enqueue their rows. Each flush of up to ROWS_PER_PART rows
+        # is durable, and so checkpointed, once written
+        sink = make_sink(output_file, batch_rows=ROWS_PER_PART)
+
+        # Downloads run on I/O threads, extraction in a process pool
+        pipeline = CrawlPipeline(
+            sink,
+            token=token,
+            cache=cache,
+            io_workers=IO_WORKERS,
+            cpu_workers=CPU_WORKERS,
+            queue_depth=QUEUE_DEPTH,
+            manifest=manifest,
+            http_cache=http_cache,
+            dedup=True,
+        )
+        try:
+            pipeline.run(repos)
+        finally:
+            # Also on Ctrl-C: finalize the open part so its files count as done
+            sink.close()
+            metrics.REGISTRY.write_summary(METRICS_FILE)
+
+        print(f"Wrote {sink.rows_written} rows to {output_file}")
+        print(f"Feature cache: {cache.hits} hits, {cache.misses} misses")
+        print(f"Crawl manifest: {manifest.summary()}")
+        print(f"Metrics summary written to {METRICS_FILE}")
+        print(
+            f"HTTP cache: {http_cache.hits} reused,"
+            f" {http_cache.revalidated} not modified, {http_cache.misses} fetched"
+        )
+        cache.close()
+        manifest.close()
+        http_cache.close()
@@ -0,0 +1,262 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stages to run under cProfile, e.g. PROFILE_STAGES=radon,lint; read from the
+# environment so pool worker processes pick them up too
+PROFILE_STAGES_ENV = "PROFILE_STAGES"
+PROFILE_DIR_ENV = "PROFILE_DIR"
+
+
+def _key(name, labels):
+	return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+
+def _format_key(key, extra=None):
+	name, labels = key
+	labels = list(labels) + (extra or [])
+	if not labels:
+		return name
+	return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class StageProfiler:
+	"""
+	cProfile hook for named stages, at most one profiled section per process at a time.
+
+	Sections that start while another thread is being profiled run
+	unprofiled, so busy thread pools are sampled rather than serialized.
+	Stats accumulate across sections and are dumped to
+	`{directory}/{stage}.{pid}.prof` at most every `interval` seconds and
+	by `dump()`; open the files with pstats or snakeviz.
+	"""
+
+	def __init__(self, stages, directory=".", interval=30.0):
+		self.stages = set(stages)
+		self.directory = directory
+		self.interval = interval
+		self.lock = threading.Lock()
+		self.profilers = {}
+		self.last_dump = {}
+
+	@contextmanager
+	def section(self, stage):
+		if stage not in self.stages or not self.lock.acquire(blocking=False):
+			yield
+			return
+		try:
+			profiler = self.profilers.get(stage)
+			if profiler is None:
+				profiler = self.profilers[stage] = cProfile.Profile()
+			profiler.enable()
+			try:
+				yield
+			finally:
+				profiler.disable()
+				if time.monotonic() - self.last_dump.get(stage, 0) >= self.interval:
+					self._dump(stage)
+		finally:
+			self.lock.release()
+
+	def dump(self):
+		with self.lock:
+			for stage in self.profilers:
+				self._dump(stage)
+
+	def _dump(self, stage):
+		os.makedirs(self.directory, exist_ok=True)
+		self.profilers[stage].dump_stats(os.path.join(self.directory, f"{stage}.{os.getpid()}.prof"))
+		self.last_dump[stage] = time.monotonic()
+
+
+class Metrics:
+	"""
+	In-process counters and latency histograms.
+
+	Updates take one lock and a dict lookup, cheap enough for per-function
+	use. Worker processes `drain()` their metrics into task results and the
+	parent `merge()`s them, so one registry sees the whole run.
+	"""
+
+	def __init__(self, buckets=LATENCY_BUCKETS, profiler=None):
+		self.buckets = buckets
+		self.profiler = profiler
+		self.lock = threading.Lock()
+		self.counters = {}
+		self.histograms = {}  # key -> [bucket counts..., +Inf count, sum]
+		self.started = time.time()
+
+	def _after_fork(self):
+		# A forked worker starts empty, and with fresh locks in case another thread held them
+		self.lock = threading.Lock()
+		self.counters, self.histograms = {}, {}
+		if self.profiler is not None:
+			self.profiler.lock = threading.Lock()
+			self.profiler.profilers, self.profiler.last_dump = {}, {}
+
+	def inc(self, name, value=1, **labels):
+		key = _key(name, labels)
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + value
+
+	def observe(self, name, value, **labels):
+		key = _key(name, labels)
+		index = len(self.buckets)
+		for i, bound in enumerate(self.buckets):
+			if value <= bound:
+				index = i
+				break
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = [0] * (len(self.buckets) + 2)
+			histogram[index] += 1
+			histogram[-1] += value
+
+	@contextmanager
+	def timer(self, stage, **labels):
+		"""Time a block into the `{stage}_seconds` histogram, profiling it if the stage is selected."""
+		start = time.perf_counter()
+		try:
+			if self.profiler is not None:
+				with self.profiler.section(stage):
+					yield
+			else:
+				yield
+		finally:
+			self.observe(f"{stage}_seconds", time.perf_counter() - start, **labels)
+
+	def drain(self):
+		"""Return and reset everything recorded so far, for merging into another process's registry."""
+		with self.lock:
+			data = {"counters": self.counters, "histograms": self.histograms}
+			self.counters, self.histograms = {}, {}
+		return data
+
+	def merge(self, data):
+		with self.lock:
+			for key, value in data["counters"].items():
+				self.counters[key] = self.counters.get(key, 0) + value
+			for key, counts in data["histograms"].items():
+				histogram = self.histograms.get(key)
+				if histogram is None:
+					self.histograms[key] = list(counts)
+				else:
+					for i, count in enumerate(counts):
+						histogram[i] += count
+
+	def to_prometheus(self):
+		"""Render the Prometheus text exposition format."""
+		lines = []
+		with self.lock:
+			for key, value in sorted(self.counters.items()):
+				lines.append(f"{_format_key(key)} {value}")
+			for key, histogram in sorted(self.histograms.items()):
+				name, labels = key
+				cumulative = 0
+				for bound, count in zip(self.buckets + ("+Inf",), histogram[:-1]):
+					cumulative += count
+					lines.append(f"{_format_key((name + '_bucket', labels), [('le', bound)])} {cumulative}")
+				lines.append(f"{_format_key((name + '_sum', labels))} {histogram[-1]}")
+				lines.append(f"{_format_key((name + '_count', labels))} {cumulative}")
+		return "\n".join(lines) + "\n"
+
+	def summary(self):
+		"""Counters plus count, total, mean and approximate p50/p95 of every histogram."""
+		with self.lock:
+			counters = {_format_key(key): value for key, value in sorted(self.counters.items())}
+			histograms = {}
+			for key, histogram in sorted(self.histograms.items()):
+				count = sum(histogram[:-1])
+				histograms[_format_key(key)] = {
+					"count": count,
+					"total": histogram[-1],
+					"mean": histogram[-1] / count if count else None,
+					"p50": self._quantile(histogram, count, 0.5),
+					"p95": self._quantile(histogram, count, 0.95),
+				}
+		return {
+			"elapsed_seconds": time.time() - self.started,
+			"counters": counters,
+			"histograms": histograms,
+		}
+
+	def _quantile(self, histogram, count, q):
+		# Upper bound of the bucket holding the q-th observation
+		seen = 0
+		for bound, bucket_count in zip(self.buckets + (None,), histogram[:-1]):
+			seen += bucket_count
+			if count and seen >= q * count:
+				return bound
+		return None
+
+	def write_summary(self, path):
+		with open(path, "w", encoding="utf-8") as f:
+			json.dump(self.summary(), f, indent=2)
+		if self.profiler is not None:
+			self.profiler.dump()
+
+	def serve(self, port, host="127.0.0.1"):
+		"""Serve the Prometheus text format on http://host:port/metrics from a daemon thread."""
+		registry = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				body = registry.to_prometheus().encode("utf-8")
+				self.send_response(200)
+				self.send_header("Content-Type", "text/plain; version=0.0.4")
+				self.send_header("Content-Length", str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		server = ThreadingHTTPServer((host, port), Handler)
+		threading.Thread(target=server.serve_forever, daemon=True).start()
+		return server
+
+
+def _profiler_from_env():
+	stages = [s for s in os.environ.get(PROFILE_STAGES_ENV, "").split(",") if s]
+	if not stages:
+		return None
+	return StageProfiler(stages, os.environ.get(PROFILE_DIR_ENV, "profiles"))
+
+
+# Process-wide registry used by the scrapers, extractors, sinks and scorer
+REGISTRY = Metrics(profiler=_profiler_from_env())
+
+os.register_at_fork(after_in_child=REGISTRY._after_fork)
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+drain = REGISTRY.drain
+merge = REGISTRY.merge
+
+
+def enable_profiling(stages, directory="profiles"):
+	"""Profile `stages` in this process and in worker processes started afterwards."""
+	os.environ[PROFILE_STAGES_ENV] = ",".join(stages)
+	os.environ[PROFILE_DIR_ENV] = directory
+	REGISTRY.profiler = StageProfiler(stages, directory)
+
+
+def record_response(response, stream=False, **kwargs):
+	"""requests response hook counting API calls, statuses, latency and bytes."""
+	host = response.url.split("/")[2] if "://" in response.url else ""
+	if getattr(response, "from_cache", False):
+		inc("http_cache_hits_total", host=host)
+		return
+	inc("http_requests_total", host=host, status=response.status_code)
+	observe("http_fetch_seconds", response.elapsed.total_seconds(), host=host)
+	if not stream:
+		inc("http_bytes_total", len(response.content), host=host)
@@ -0,0 +1,341 @@
+import argparse
+import importlib.util
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from threadpoolctl import threadpool_limits
+
+from preprocessing import PreparedData, prepare
+
+RESULTS_FILE = "sweep_results.csv"
+
+# Share of the training rows held out to rank configurations; the test
+# split is only used for the final models' scores
+VALIDATION_SIZE = 0.2
+
+# Repeats of the one-row prediction whose median is the single-row latency
+LATENCY_REPEATS = 20
+
+
+def _logistic(params, threads):
+	from sklearn.linear_model import LogisticRegression
+	return LogisticRegression(class_weight="balanced", solver="saga", max_iter=1000, random_state=42, **params)
+
+
+def _random_forest(params, threads):
+	from sklearn.ensemble import RandomForestClassifier
+	return RandomForestClassifier(class_weight="balanced", max_features="sqrt", random_state=42, n_jobs=threads, **params)
+
+
+def _svm(params, threads):
+	from sklearn.svm import SVC
+	return SVC(class_weight="balanced", gamma="scale", random_state=42, **params)
+
+
+def _xgboost(params, threads):
+	from xgboost import XGBClassifier
+	return XGBClassifier(subsample=0.9, colsample_bytree=0.9, random_state=42, n_jobs=threads, **params)
+
+
+def _lightgbm(params, threads):
+	from lightgbm import LGBMClassifier
+	return LGBMClassifier(random_state=42, n_jobs=threads, verbose=-1, **params)
+
+
+def _catboost(params, threads):
+	from catboost import CatBoostClassifier
+	return CatBoostClassifier(
+		auto_class_weights="Balanced", random_seed=42, thread_count=threads, verbose=False, **params
+	)
+
+
+def _mlp(params, threads):
+	from sklearn.neural_network import MLPClassifier
+	return MLPClassifier(hidden_layer_sizes=(64, 32), early_stopping=True, max_iter=200, random_state=42, **params)
+
+
+class Family:
+	"""A model family: the library it needs, the scaler its notebook uses, a model builder and its grid."""
+
+	def __init__(self, module, scaler, build, grid):
+		self.module = module
+		self.scaler = scaler
+		self.build = build
+		self.grid = grid
+
+	def configurations(self):
+		keys = sorted(self.grid)
+		return [dict(zip(keys, values)) for values in itertools.product(*(self.grid[k] for k in keys))]
+
+
+# The notebooks' model families, with their scaler and a grid around the
+# notebook's settings; the ANN notebook's Keras network is stood in for by an
+# MLP of the same layer sizes, so the sweep does not need TensorFlow
+FAMILIES = {
+	"logistic": Family("sklearn", "standard", _logistic, {"C": [0.1, 1.0, 10.0]}),
+	"random_forest": Family("sklearn", "robust", _random_forest, {
+		"n_estimators": [100, 200],
+		"max_depth": [15, 30],
+		"min_samples_leaf": [1, 10],
+	}),
+	"svm": Family("sklearn", "robust", _svm, {"C": [0.1, 1.0, 10.0]}),
+	"xgboost": Family("xgboost", "robust", _xgboost, {
+		"n_estimators": [150],
+		"max_depth": [6, 12, 30],
+		"learning_rate": [0.05, 0.1],
+	}),
+	"lightgbm": Family("lightgbm", None, _lightgbm, {
+		"num_leaves": [31, 127],
+		"learning_rate": [0.05, 0.1],
+	}),
+	"catboost": Family("catboost", "robust", _catboost, {
+		"iterations": [500],
+		"depth": [6, 10],
+		"learning_rate": [0.05, 0.1],
+	}),
+	"mlp": Family("sklearn", "standard", _mlp, {"alpha": [1e-4, 1e-2]}),
+}
+
+
+def rung_sizes(num_rows, eta=3, min_rows=1000, num_candidates=None):
+	"""
+	Return the training rows of each successive halving round, ending with all of them.
+
+	Each round has `eta` times the rows of the one before; rounds stop at
+	`min_rows` and, when `num_candidates` is given, at the number of rounds
+	it takes to narrow the candidates down to one.
+	"""
+	rounds = 1 + max(0, int(math.log(max(num_rows / min_rows, 1), eta)))
+	if num_candidates is not None:
+		rounds = min(rounds, 1 + max(0, math.ceil(math.log(num_candidates, eta))))
+	return [max(1, int(num_rows / eta ** (rounds - 1 - r))) for r in range(rounds)]
+
+
+def survivors(results, eta=3, keep_per_family=1):
+	"""Keep the best 1/eta of a round's results by validation accuracy, plus the best `keep_per_family` of each family."""
+	ranked = sorted(
+		(r for r in results if r["error"] is None),
+		key=lambda r: r["val_accuracy"],
+		reverse=True,
+	)
+	kept = ranked[:math.ceil(len(ranked) / eta)]
+	per_family = {}
+	for result in ranked:
+		family_results = per_family.setdefault(result["family"], [])
+		if len(family_results) < keep_per_family:
+			family_results.append(result)
+			if result not in kept:
+				kept.append(result)
+	return kept
+
+
+# Per worker process: the prepared data by scaler, memory-mapped, and the row split
+_data = {}
+_split = {}
+
+
+def _init_worker(paths, fit_index, val_index, threads):
+	for scaler, path in paths.items():
+		_data[scaler] = PreparedData(path)
+	_split["fit"] = fit_index
+	_split["val"] = val_index
+	_split["threads"] = threads
+	# Caps the BLAS/OpenMP pools of every library, so workers x threads stays within the budget
+	threadpool_limits(threads)
+
+
+def _single_row_latency(model, X):
+	timings = []
+	for i in range(min(LATENCY_REPEATS, len(X))):
+		row = np.ascontiguousarray(X[i:i + 1])
+		start = time.perf_counter()
+		model.predict(row)
+		timings.append(time.perf_counter() - start)
+	return float(np.median(timings)) if timings else None
+
+
+def _run_job(job):
+	family = FAMILIES[job["family"]]
+	data = _data[family.scaler]
+	result = dict(job, val_accuracy=None, train_seconds=None, test_accuracy=None,
+		batch_latency_us=None, single_latency_ms=None, model_path=None, error=None)
+	try:
+		# Sorted, so the rows are read from the mapped file in order
+		fit_rows = np.sort(_split["fit"][:job["rows"]])
+		X_fit, y_fit = data.X_train[fit_rows], data.y_train[fit_rows]
+		model = family.build(job["params"], _split["threads"])
+
+		start = time.perf_counter()
+		model.fit(X_fit, y_fit)
+		result["train_seconds"] = time.perf_counter() - start
+
+		val_rows = _split["val"]
+		predicted = np.ravel(model.predict(data.X_train[val_rows]))
+		result["val_accuracy"] = float(np.mean(predicted == data.y_train[val_rows]))
+
+		if job["final"]:
+			X_test = np.ascontiguousarray(data.X_test)
+			start = time.perf_counter()
+			predicted = np.ravel(model.predict(X_test))
+			elapsed = time.perf_counter() - start
+			result["test_accuracy"] = float(np.mean(predicted == data.y_test))
+			result["batch_latency_us"] = elapsed / max(len(X_test), 1) * 1e6
+			latency = _single_row_latency(model, X_test)
+			result["single_latency_ms"] = None if latency is None else latency * 1e3
+			if job["models_dir"]:
+				from assessor import save_model
+				path = os.path.join(job["models_dir"], f"{job['family']}-{job['config']}.joblib")
+				save_model(path, model, data.preprocessor, data.label_encoder, columns=data.columns)
+				result["model_path"] = path
+	except Exception as e:
+		result["error"] = f"{type(e).__name__}: {e}"
+	return result
+
+
+def available_families(names=None):
+	"""Return the requested families whose library is installed, reporting the others."""
+	families = {}
+	for name in names or FAMILIES:
+		if name not in FAMILIES:
+			raise ValueError(f"Unknown model family: {name}")
+		if importlib.util.find_spec(FAMILIES[name].module) is None:
+			print(f"[ERROR] Skipping {name}: {FAMILIES[name].module} is not installed")
+			continue
+		families[name] = FAMILIES[name]
+	return families
+
+
+def sweep(
+	data_dir,
+	families=None,
+	cpus=None,
+	threads_per_model=1,
+	eta=3,
+	min_rows=1000,
+	keep_per_family=1,
+	models_dir=None,
+	cache_dir=None,
+):
+	"""
+	Train every configuration of every family by successive halving on one CPU budget.
+
+	All configurations train on a small sample of the training rows, the
+	best 1/eta by validation accuracy (and the best of each family) move on
+	to a sample eta times larger, and so on until the survivors train on all
+	of them and are scored on the test split. `cpus // threads_per_model`
+	models train at once, each limited to `threads_per_model` threads.
+	Workers memory-map the preprocessing cache, so every process reads the
+	same pages instead of its own copy. Returns one row per trained model.
+	"""
+	families = available_families(families)
+	paths = {
+		scaler: prepare(data_dir, scaler=scaler, cache_dir=cache_dir).path
+		for scaler in {family.scaler for family in families.values()}
+	}
+	if not paths:
+		print("No model family to train. Exiting.")
+		return pd.DataFrame()
+	# Every scaler's entry holds the same rows, so one split serves all families
+	y_train = np.asarray(PreparedData(next(iter(paths.values()))).y_train)
+
+	rows = np.arange(len(y_train))
+	stratify = y_train if np.bincount(y_train).min() >= 2 else None
+	fit_index, val_index = train_test_split(rows, test_size=VALIDATION_SIZE, random_state=42, stratify=stratify)
+	# Shuffled once, so each round's sample contains the previous one
+	fit_index = np.random.default_rng(42).permutation(fit_index)
+
+	candidates = [
+		{"family": name, "config": i, "params": params}
+		for name, family in families.items()
+		for i, params in enumerate(family.configurations())
+	]
+	sizes = rung_sizes(len(fit_index), eta, min_rows, len(candidates))
+	print(f"Sweeping {len(candidates)} configurations of {len(families)} families over rounds of {sizes} rows")
+
+	workers = max(1, (cpus or os.cpu_count()) // threads_per_model)
+	results = []
+	with ProcessPoolExecutor(
+		max_workers=workers,
+		initializer=_init_worker,
+		initargs=(paths, fit_index, val_index, threads_per_model)
+	) as pool:
+		for rung, size in enumerate(sizes):
+			final = rung == len(sizes) - 1
+			jobs = [
+				dict(candidate, rung=rung, rows=size, final=final, models_dir=models_dir)
+				for candidate in candidates
+			]
+			# Slowest first (by the previous round's time), so the round does not end on one long model
+			jobs.sort(key=lambda job: -job.get("train_seconds", 0))
+			futures = [pool.submit(_run_job, {k: v for k, v in job.items() if k != "train_seconds"}) for job in jobs]
+
+			round_results = []
+			for future in as_completed(futures):
+				result = future.result()
+				if result["error"] is not None:
+					print(f"[ERROR] {result['family']} #{result['config']} failed on {size} rows: {result['error']}")
+				round_results.append(result)
+			results.extend(round_results)
+
+			if not final:
+				kept = survivors(round_results, eta, keep_per_family)
+				candidates = [
+					{"family": r["family"], "config": r["config"], "params": r["params"], "train_seconds": r["train_seconds"]}
+					for r in kept
+				]
+				print(f"Round {rung + 1}/{len(sizes)}: kept {len(candidates)} of {len(round_results)}")
+
+	return results_table(results)
+
+
+def results_table(results):
+	"""Return the sweep results as a DataFrame, final models first, best first."""
+	if not results:
+		return pd.DataFrame()
+	table = pd.DataFrame(results).drop(columns=["final", "models_dir"])
+	table["params"] = table["params"].map(lambda params: json.dumps(params, sort_keys=True))
+	return table.sort_values(
+		["rung", "test_accuracy", "val_accuracy"], ascending=False, na_position="last"
+	).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(
+		description="Train the model families and their grids together by successive halving on one CPU budget."
+	)
+	parser.add_argument("--data-dir", default="../data/processed", help="directory of X_train/X_test/y_train/y_test.parquet")
+	parser.add_argument("--cache-dir", help="preprocessing cache (default: {data-dir}/cache)")
+	parser.add_argument("--families", nargs="+", choices=sorted(FAMILIES), help="default: every installed family")
+	parser.add_argument("--cpus", type=int, default=None, help="CPU budget (default: all cores)")
+	parser.add_argument("--threads-per-model", type=int, default=1)
+	parser.add_argument("--eta", type=int, default=3, help="each round keeps 1/eta of the models on eta times the rows")
+	parser.add_argument("--min-rows", type=int, default=1000, help="training rows of the first round")
+	parser.add_argument("--keep-per-family", type=int, default=1, help="best models of each family that always move on")
+	parser.add_argument("--models-dir", help="save the final models here with assessor.save_model")
+	parser.add_argument("--output", default=RESULTS_FILE)
+	args = parser.parse_args()
+
+	table = sweep(
+		args.data_dir,
+		families=args.families,
+		cpus=args.cpus,
+		threads_per_model=args.threads_per_model,
+		eta=args.eta,
+		min_rows=args.min_rows,
+		keep_per_family=args.keep_per_family,
+		models_dir=args.models_dir,
+		cache_dir=args.cache_dir,
+	)
+	if not table.empty:
+		table.to_csv(args.output, index=False)
+		final = table[table["test_accuracy"].notna()]
+		columns = ["family", "params", "test_accuracy", "train_seconds", "batch_latency_us", "single_latency_ms"]
+		print(final[columns].to_string(index=False))
+		print(f"Saved results to {args.output}")
@@ -0,0 +1,200 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import LabelEncoder, RobustScaler, StandardScaler
+
+# Bump whenever prepare() changes its output, so stale cache entries are ignored
+PREPROCESSING_VERSION = "2"
+
+SPLITS = ("X_train", "X_test", "y_train", "y_test")
+
+# Scalers of the numeric columns: robust for the tree and SVM notebooks,
+# standard for logistic_model and ANN, none for LightGBM
+SCALERS = {"robust": RobustScaler, "standard": StandardScaler, None: None}
+
+DROP_COLUMNS = ("code_snippet",)
+
+
+def _hash_file(digest, path):
+	with open(path, "rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			digest.update(chunk)
+
+
+def cache_key(data_dir, scaler="robust", dedup=True):
+	"""Return the hash of the four split files and the preprocessing settings."""
+	digest = hashlib.sha256()
+	digest.update(json.dumps({
+		"version": PREPROCESSING_VERSION,
+		"scaler": scaler,
+		"dedup": dedup,
+	}, sort_keys=True).encode("utf-8"))
+	for split in SPLITS:
+		digest.update(split.encode("utf-8"))
+		_hash_file(digest, os.path.join(data_dir, f"{split}.parquet"))
+	return digest.hexdigest()[:32]
+
+
+def load_splits(data_dir, dedup=True):
+	"""
+	Read the train/test splits as the notebooks do.
+
+	`code_snippet` is dropped, duplicate feature rows are removed from each
+	split together with their labels, and boolean columns are cast to int.
+	Returns the splits by name and the boolean columns of X_train.
+	"""
+	bool_cols = []
+	splits = {split: pd.read_parquet(os.path.join(data_dir, f"{split}.parquet")) for split in SPLITS}
+	for part in ("train", "test"):
+		X = splits[f"X_{part}"].drop(columns=[c for c in DROP_COLUMNS if c in splits[f"X_{part}"].columns])
+		y = splits[f"y_{part}"].squeeze(axis=1)
+		if dedup:
+			keep = ~X.duplicated()
+			X = X[keep]
+			y = y.loc[X.index]
+		part_bool_cols = list(X.select_dtypes(include="bool").columns)
+		X = X.astype({c: int for c in part_bool_cols})
+		splits[f"X_{part}"], splits[f"y_{part}"] = X, y
+		if part == "train":
+			bool_cols = part_bool_cols
+	return splits, bool_cols
+
+
+def make_preprocessor(X, bool_cols, scaler="robust"):
+	"""
+	Build the notebooks' ColumnTransformer: scale numeric columns, pass booleans through.
+
+	Any other column is passed through unscaled after them, so it must be
+	numeric to fit in the float32 matrices; other columns raise ValueError
+	here instead of failing halfway through a build.
+	"""
+	numerical_cols = [c for c in X.select_dtypes(include=["int64", "float64"]).columns if c not in bool_cols]
+	remainder = [c for c in X.columns if c not in numerical_cols and c not in bool_cols]
+	non_numeric = [c for c in remainder if not pd.api.types.is_numeric_dtype(X[c])]
+	if non_numeric:
+		raise ValueError(f"Non-numeric columns would be passed through unscaled: {non_numeric}")
+	scaler_class = SCALERS[scaler]
+	return ColumnTransformer(
+		transformers=[
+			("num", scaler_class() if scaler_class else "passthrough", numerical_cols),
+			("bool", "passthrough", list(bool_cols)),
+		],
+		remainder="passthrough",
+		verbose_feature_names_out=False,
+	)
+
+
+def _build(data_dir, target, scaler, dedup):
+	splits, bool_cols = load_splits(data_dir, dedup)
+	preprocessor = make_preprocessor(splits["X_train"], bool_cols, scaler)
+	label_encoder = LabelEncoder()
+
+	arrays = {
+		"X_train": preprocessor.fit_transform(splits["X_train"]),
+		"X_test": preprocessor.transform(splits["X_test"]),
+		"y_train": label_encoder.fit_transform(splits["y_train"]),
+		"y_test": label_encoder.transform(splits["y_test"]),
+	}
+	for split, array in arrays.items():
+		if split.startswith("X_"):
+			array = np.ascontiguousarray(array, dtype=np.float32)
+		np.save(os.path.join(target, f"{split}.npy"), array)
+
+	joblib.dump({"preprocessor": preprocessor, "label_encoder": label_encoder}, os.path.join(target, "transformers.joblib"))
+	with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+		json.dump({
+			"config": {"scaler": scaler, "dedup": dedup, "version": PREPROCESSING_VERSION},
+			"columns": list(splits["X_train"].columns),
+			"feature_names": list(preprocessor.get_feature_names_out()),
+			"classes": label_encoder.classes_.tolist(),
+			"rows": {split: len(array) for split, array in arrays.items()},
+		}, f, indent=2)
+
+
+class PreparedData:
+	"""
+	Preprocessed splits read back from a cache directory written by prepare().
+
+	`X_train`/`X_test` are float32 matrices in `feature_names` order and
+	`y_train`/`y_test` label-encoded vectors, all memory-mapped read-only:
+	loading costs no copy, and processes that open the same entry share its
+	pages through the OS page cache. `preprocessor`, `label_encoder` and
+	`columns` are what assessor.save_model needs to score new code.
+	"""
+
+	def __init__(self, path, mmap_mode="r"):
+		self.path = path
+		with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+			meta = json.load(f)
+		self.key = os.path.basename(os.path.normpath(path))
+		self.config = meta["config"]
+		self.columns = meta["columns"]
+		self.feature_names = meta["feature_names"]
+		for split in SPLITS:
+			setattr(self, split, np.load(os.path.join(path, f"{split}.npy"), mmap_mode=mmap_mode))
+		transformers = joblib.load(os.path.join(path, "transformers.joblib"))
+		self.preprocessor = transformers["preprocessor"]
+		self.label_encoder = transformers["label_encoder"]
+
+	def frame(self, split="X_train"):
+		"""Return a split's matrix as a DataFrame with the feature names, like the notebooks' X_*_scaled."""
+		return pd.DataFrame(getattr(self, split), columns=self.feature_names, copy=False)
+
+	def labels(self, split="y_test"):
+		"""Return a split's original labels."""
+		return self.label_encoder.inverse_transform(getattr(self, split))
+
+
+def prepare(data_dir, scaler="robust", dedup=True, cache_dir=None):
+	"""
+	Preprocess the splits in `data_dir` once and return them as PreparedData.
+
+	Results are cached under `cache_dir` (default `{data_dir}/cache`) by a
+	hash of the split files and the settings, so later calls with the same
+	data, from any process, only memory-map the stored arrays. An entry is
+	written to a temporary directory and renamed into place when complete.
+	"""
+	if scaler not in SCALERS:
+		raise ValueError(f"Unknown scaler: {scaler}")
+	cache_dir = cache_dir or os.path.join(data_dir, "cache")
+	path = os.path.join(cache_dir, cache_key(data_dir, scaler, dedup))
+	if not os.path.exists(os.path.join(path, "meta.json")):
+		os.makedirs(cache_dir, exist_ok=True)
+		target = tempfile.mkdtemp(dir=cache_dir, prefix=".building-")
+		try:
+			_build(data_dir, target, scaler, dedup)
+			os.rename(target, path)
+		except OSError:
+			# Another process finished the same entry first
+			if not os.path.exists(os.path.join(path, "meta.json")):
+				raise
+		finally:
+			shutil.rmtree(target, ignore_errors=True)
+	return PreparedData(path)
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Preprocess the train/test splits once and cache them as memory-mappable arrays.")
+	parser.add_argument("--data-dir", default="../data/processed", help="directory of X_train/X_test/y_train/y_test.parquet")
+	parser.add_argument("--scaler", default="robust", choices=["robust", "standard", "none"])
+	parser.add_argument("--no-dedup", action="store_true", help="keep duplicate feature rows")
+	parser.add_argument("--cache-dir", help="default: {data-dir}/cache")
+	args = parser.parse_args()
+
+	data = prepare(
+		args.data_dir,
+		scaler=None if args.scaler == "none" else args.scaler,
+		dedup=not args.no_dedup,
+		cache_dir=args.cache_dir,
+	)
+	print(f"Cached at {data.path}")
+	for split in SPLITS:
+		print(f"{split}: {getattr(data, split).shape} {getattr(data, split).dtype}")
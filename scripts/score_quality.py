@@ -1,70 +1,283 @@
+import argparse
+import json
+import os
+import threading
+from collections import Counter
 import pandas as pd
-import subprocess
-import tempfile
 from tqdm import tqdm
 from multiprocessing import Pool, cpu_count
+from lint_backend import InProcessLinter, score_from_violations, summarize_violations
+from feature_store import iter_feature_batches, open_dataset, read_features, write_features
+import metrics
 
-# File paths
+# File paths; a path without .csv is a feature store directory (see feature_store)
 INPUT_FILE = "data/raw/function_features.csv"
 OUTPUT_FILE = "data/interim/function_features_with_scores.csv"
 LOG_ERRORS = "flake8_failures.log"
-LOG_DEBUG = "flake8_debug.log"
+
+# Snippets sent to a worker per task
+BATCH_SIZE = 256
+
+# Streaming mode: rows read per input chunk, source characters per task (so
+# long snippets make smaller batches) and rows written between checkpoints
+CHUNK_ROWS = 50000
+BATCH_CHARS = 256 * 1024
+CHECKPOINT_ROWS = 50000
+
+SCORE_COLUMNS = ("quality_score", "num_violations", "violation_codes")
+
+# One linter per worker process, created by init_worker
+_linter = None
+
+def init_worker():
+	global _linter
+	_linter = InProcessLinter()
+
+def get_linter():
+	if _linter is None:
+		init_worker()
+	return _linter
+
+def lint_batch(code_strings):
+	"""Lint a batch of snippets in memory and return one result dict per snippet."""
+	linter = get_linter()
+	results = []
+	for code_string in code_strings:
+		try:
+			with metrics.timer("lint"):
+				num_violations, codes = summarize_violations(linter.check(code_string))
+			results.append({
+				"quality_score": score_from_violations(num_violations),
+				"num_violations": num_violations,
+				"violation_codes": json.dumps(codes, sort_keys=True),
+			})
+		except Exception as e:
+			metrics.inc("lint_errors_total")
+			with open(LOG_ERRORS, 'a', encoding='utf-8') as f:
+				f.write(f"Error for code:\n{str(code_string)[:80]}\n{str(e)}\n\n")
+			results.append({"quality_score": None, "num_violations": None, "violation_codes": None})
+	return results
+
+def lint_task(task):
+	task_id, code_strings = task
+	results = lint_batch(code_strings)
+	return task_id, results, metrics.drain()
 
 def get_flake8_score(code_string):
-	try:
-		# Save the function code to a temp file
-		with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as tmp:
-			tmp.write(code_string)
-			tmp_path = tmp.name
-
-		# Run flake8 on the temp file
-		result = subprocess.run(
-			[r'C:\Users\Nour\AppData\Roaming\Python\Python312\Scripts\flake8.exe', tmp_path],
-			capture_output=True,
-			text=True
-		)
-
-		# Count violations
-		violations = result.stdout.strip().splitlines()
-		num_violations = len(violations)
-
-		# Log for debugging
-		with open(LOG_DEBUG, 'a', encoding='utf-8') as log:
-			log.write("\n==== SNIPPET ====\n" + code_string[:300])
-			log.write(f"\nViolations: {num_violations}\n")
-			log.write("STDOUT:\n" + result.stdout + "\nSTDERR:\n" + result.stderr + "\n")
-
-		# Convert number of violations into a score from 10 to 0
-		score = max(10.0 - num_violations, 0.0)
-		return score
-
-	except Exception as e:
-		with open(LOG_ERRORS, 'a', encoding='utf-8') as f:
-			f.write(f"Error for code:\n{code_string[:80]}\n{str(e)}\n\n")
-	return None
-
-def run_parallel(data, func, workers=None):
+	return lint_batch([code_string])[0]["quality_score"]
+
+def run_parallel(data, func, workers=None, batch_size=None, initializer=None):
+	"""
+	Map `func` over `data` in a process pool.
+
+	With `batch_size`, `func` receives lists of up to `batch_size` items and
+	must return one result per item; results are flattened back in order.
+	"""
 	workers = workers or cpu_count()
 	print(f"Running on {workers} workers...")
-	with Pool(processes=workers) as pool:
-		return list(tqdm(pool.imap(func, data), total=len(data)))
+	with Pool(processes=workers, initializer=initializer) as pool:
+		if not batch_size:
+			return list(tqdm(pool.imap(func, data), total=len(data)))
+
+		batches = [data[i:i + batch_size] for i in range(0, len(data), batch_size)]
+		results = []
+		with tqdm(total=len(data)) as progress:
+			for batch_results in pool.imap(func, batches):
+				results.extend(batch_results)
+				progress.update(len(batch_results))
+		return results
+
+def iter_input_chunks(path, chunk_rows):
+	"""Yield DataFrames of up to `chunk_rows` rows, indexed by row id, from a CSV or feature store."""
+	if path.endswith(".csv"):
+		chunks = pd.read_csv(path, chunksize=chunk_rows)
+	else:
+		chunks = iter_feature_batches(path, batch_size=chunk_rows)
+
+	row_id = 0
+	for chunk in chunks:
+		chunk.index = pd.RangeIndex(row_id, row_id + len(chunk))
+		row_id += len(chunk)
+		yield chunk
+
+def iter_lint_tasks(chunks, done, pending, batch_size, batch_chars):
+	"""Split chunks into (task id, snippets) tasks, skipping `done` row ids; rows wait in `pending`."""
+	for chunk in chunks:
+		if done:
+			chunk = chunk[~chunk.index.isin(done)]
+		if 'quality_score' in chunk.columns:
+			# Rows the scraper already scored in the context of their file pass through as they are
+			scored = chunk[chunk['quality_score'].notna()]
+			if len(scored):
+				task_id = int(scored.index[0])
+				pending[task_id] = scored
+				yield task_id, []
+			chunk = chunk[chunk['quality_score'].isna()]
+		snippets = chunk['code_snippet'].tolist()
+		start = 0
+		while start < len(snippets):
+			end, size = start, 0
+			while end < len(snippets) and end - start < batch_size and (end == start or size < batch_chars):
+				size += len(snippets[end]) if isinstance(snippets[end], str) else 0
+				end += 1
+			task_id = int(chunk.index[start])
+			pending[task_id] = chunk.iloc[start:end]
+			yield task_id, snippets[start:end]
+			start = end
+
+def _bounded(tasks, slots, stopped):
+	# Pool.imap_unordered reads its input eagerly; this keeps it to the free slots
+	for task in tasks:
+		slots.acquire()
+		if stopped.is_set():
+			return
+		yield task
+
+def input_columns(path):
+	if path.endswith(".csv"):
+		return pd.read_csv(path, nrows=0).columns.tolist()
+	return open_dataset(path).schema.names
+
+def checkpoint_path(output_file):
+	return output_file + ".checkpoint"
+
+def write_checkpoint(output_file, out):
+	out.flush()
+	os.fsync(out.fileno())
+	tmp_path = checkpoint_path(output_file) + ".tmp"
+	with open(tmp_path, "w", encoding="utf-8") as f:
+		json.dump({"offset": out.tell()}, f)
+	os.replace(tmp_path, checkpoint_path(output_file))
+
+def load_checkpoint(output_file):
+	"""Cut the output back to its last checkpoint and return the row ids it holds."""
+	if not os.path.exists(output_file) or not os.path.exists(checkpoint_path(output_file)):
+		return set()
+	with open(checkpoint_path(output_file), encoding="utf-8") as f:
+		offset = json.load(f)["offset"]
+	# Rows written after the last checkpoint may be torn, so they are scored again
+	with open(output_file, "r+b") as f:
+		f.truncate(offset)
+	if offset == 0:
+		return set()
+	return set(pd.read_csv(output_file, usecols=["row_id"])["row_id"])
+
+def score_streaming(
+	input_file,
+	output_file,
+	resume=False,
+	workers=None,
+	chunk_rows=CHUNK_ROWS,
+	batch_size=BATCH_SIZE,
+	batch_chars=BATCH_CHARS,
+):
+	"""
+	Score a dataset without loading it whole, writing rows as they finish.
+
+	Input is read `chunk_rows` at a time and linted in tasks of at most
+	`batch_size` snippets or `batch_chars` characters, dispatched unordered
+	so slow snippets do not hold up the rest. Output rows carry a `row_id`
+	(the input row number) and are in completion order; sort on it to
+	restore input order. The output is checkpointed every CHECKPOINT_ROWS
+	rows, and `resume` continues from the last checkpoint.
+	"""
+	if not output_file.endswith(".csv"):
+		raise ValueError("Streaming output must be a .csv file.")
+	if 'code_snippet' not in input_columns(input_file):
+		raise ValueError("Missing 'code_snippet' column in input file.")
+
+	done = load_checkpoint(output_file) if resume else set()
+	if done:
+		print(f"Resuming: {len(done)} rows already scored")
+	elif os.path.exists(checkpoint_path(output_file)):
+		os.remove(checkpoint_path(output_file))
+
+	workers = workers or cpu_count()
+	print(f"Running on {workers} workers...")
+
+	pending = {}
+	slots = threading.Semaphore(workers * 4)
+	stopped = threading.Event()
+	tasks = iter_lint_tasks(iter_input_chunks(input_file, chunk_rows), done, pending, batch_size, batch_chars)
+	scores = Counter()
+	since_checkpoint = 0
+
+	with open(output_file, "a" if done else "w", encoding="utf-8", newline="") as out, \
+			Pool(processes=workers, initializer=init_worker) as pool:
+		write_header = out.tell() == 0
+		try:
+			with tqdm(initial=len(done)) as progress:
+				for task_id, results, worker_metrics in pool.imap_unordered(lint_task, _bounded(tasks, slots, stopped)):
+					slots.release()
+					metrics.merge(worker_metrics)
+					rows = pending.pop(task_id)
+					if results:
+						rows = rows.assign(**{column: [r[column] for r in results] for column in SCORE_COLUMNS})
+					rows.insert(0, "row_id", rows.index)
+					with metrics.timer("csv_write"):
+						rows.to_csv(out, header=write_header, index=False)
+					write_header = False
+
+					scores.update(rows['quality_score'].tolist())
+					progress.update(len(rows))
+					since_checkpoint += len(rows)
+					if since_checkpoint >= CHECKPOINT_ROWS:
+						write_checkpoint(output_file, out)
+						since_checkpoint = 0
+			write_checkpoint(output_file, out)
+		finally:
+			# Unblock the pool's task feeder so the pool can shut down
+			stopped.set()
+			slots.release()
+
+	print(f"✅ Done. Saved to {output_file}")
+	print("\n🔍 Quality score summary:")
+	print(pd.Series(scores).sort_values(ascending=False))
 
 def main():
 	print("Loading dataset...")
-	df = pd.read_csv(INPUT_FILE)
+	# A path without .csv is a feature store written by feature_sink
+	df = pd.read_csv(INPUT_FILE) if INPUT_FILE.endswith(".csv") else read_features(INPUT_FILE)
 
 	if 'code_snippet' not in df.columns:
 		raise ValueError("Missing 'code_snippet' column in input file.")
 
-	print("Scoring functions in parallel with flake8...")
-	df['quality_score'] = run_parallel(df['code_snippet'].tolist(), get_flake8_score)
+	# Rows the scraper already scored in the context of their file keep their scores
+	unscored = df['quality_score'].isna() if 'quality_score' in df.columns else pd.Series(True, index=df.index)
+	print(f"Scoring {unscored.sum()} of {len(df)} functions in parallel with flake8...")
+	results = run_parallel(
+		df.loc[unscored, 'code_snippet'].tolist(), lint_batch, batch_size=BATCH_SIZE, initializer=init_worker
+	)
+	for column in SCORE_COLUMNS:
+		if column not in df.columns:
+			df[column] = None
+		df.loc[unscored, column] = [r[column] for r in results]
 
 	print("Saving output...")
-	df.to_csv(OUTPUT_FILE, index=False)
+	if OUTPUT_FILE.endswith(".csv"):
+		df.to_csv(OUTPUT_FILE, index=False)
+	else:
+		# Typed and partitioned by repo like the input, so readers skip text parsing
+		write_features(df, OUTPUT_FILE)
 	print(f"✅ Done. Saved to {OUTPUT_FILE}")
 
 	print("\n🔍 Quality score summary:")
 	print(df['quality_score'].value_counts(dropna=False))
 
 if __name__ == "__main__":
-	main()
+	parser = argparse.ArgumentParser(description="Score function snippets with flake8 rules.")
+	parser.add_argument("--stream", action="store_true", help="read and write in chunks instead of all at once")
+	parser.add_argument("--resume", action="store_true", help="continue an interrupted --stream run")
+	parser.add_argument("--metrics-file", help="write a JSON metrics summary here when done (--stream only)")
+	parser.add_argument("--profile", default="", help="comma-separated stages to run under cProfile, e.g. lint")
+	args = parser.parse_args()
+
+	if args.profile:
+		metrics.enable_profiling(args.profile.split(","))
+
+	if args.stream or args.resume:
+		score_streaming(INPUT_FILE, OUTPUT_FILE, resume=args.resume)
+		if args.metrics_file:
+			metrics.REGISTRY.write_summary(args.metrics_file)
+	else:
+		main()
@@ -0,0 +1,50 @@
+import re
+
+# Line breaks as the Python parser sees them: form feeds and the other
+# separators str.splitlines knows do not end a line
+_NEWLINE = re.compile(rb"\r\n?|\n")
+
+# A line whose first non-blank character starts a comment
+_COMMENT_LINE = re.compile(rb"[ \t\f\v]*#")
+
+
+class SourceBuffer:
+	"""
+	A file's source as UTF-8 bytes plus the offset of every line, built once per file.
+
+	AST column offsets count UTF-8 bytes, so the source of any node is one
+	contiguous slice of the buffer: snippets are offset ranges or memoryviews
+	rather than copies, and lines are never split out per function, which
+	keeps large files linear instead of quadratic in their function count.
+	"""
+
+	def __init__(self, code):
+		self.data = code.encode("utf-8")
+		self.view = memoryview(self.data)
+		self.line_starts = [0]
+		self.line_starts.extend(match.end() for match in _NEWLINE.finditer(self.data))
+
+	def span(self, node):
+		"""(start, end) byte offsets of `node`'s source in the buffer."""
+		return (
+			self.line_starts[node.lineno - 1] + node.col_offset,
+			self.line_starts[node.end_lineno - 1] + node.end_col_offset,
+		)
+
+	def segment(self, node):
+		"""`node`'s source as a memoryview into the buffer, without copying."""
+		start, end = self.span(node)
+		return self.view[start:end]
+
+	def text(self, node):
+		"""`node`'s source as a string, the same as ast.get_source_segment."""
+		return str(self.segment(node), "utf-8")
+
+	def count_comment_lines(self, node):
+		"""Number of lines in `node`'s source that are comments."""
+		start, end = self.span(node)
+		count = 0
+		for line in range(node.lineno - 1, node.end_lineno):
+			if _COMMENT_LINE.match(self.data, max(self.line_starts[line], start), end):
+				count += 1
+		return count
@@ -0,0 +1,251 @@
+import abc
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+# Lower runs first: files before repos, so listed repos drain before new ones are listed
+PRIORITY = {"file": 0, "repo": 1}
+
+
+class Lease:
+	"""A job handed to one worker until `expires`; only the holder of `token` can finish it."""
+
+	def __init__(self, job_id, kind, payload, token, expires):
+		self.job_id = job_id
+		self.kind = kind
+		self.payload = payload
+		self.token = token
+		self.expires = expires
+
+
+class WorkQueue(abc.ABC):
+	"""
+	Interface of the crawl job queue shared by every worker on every node.
+
+	Jobs have a kind ("repo" or "file"), a unique key (enqueueing a key
+	twice is a no-op) and a JSON payload. `lease` hands a pending job, or
+	one whose lease expired, to a worker; `heartbeat` extends a lease and
+	reports whether the worker still holds it. `complete` stores the result
+	and enqueues follow-up jobs only if the lease is still held, in one
+	step, so each job's result is committed at most once even when a
+	stalled worker wakes up after its job was given to another.
+	"""
+
+	@abc.abstractmethod
+	def enqueue(self, jobs):
+		"""Add (kind, key, payload) jobs; return how many were new."""
+
+	@abc.abstractmethod
+	def lease(self, worker, duration):
+		"""Return a Lease for the next job, or None if nothing is ready."""
+
+	@abc.abstractmethod
+	def heartbeat(self, lease, duration):
+		"""Extend `lease`; False if it expired and the job was given to another worker or finished."""
+
+	@abc.abstractmethod
+	def complete(self, lease, result=None, children=()):
+		"""Commit `result` and enqueue `children`; False, with nothing committed, if the lease was lost."""
+
+	@abc.abstractmethod
+	def fail(self, lease, error):
+		"""Give the job back for a retry, or mark it failed after too many attempts."""
+
+	@abc.abstractmethod
+	def results(self, kind="file"):
+		"""Yield (payload, result) for every finished job of `kind`."""
+
+	@abc.abstractmethod
+	def summary(self):
+		"""Return {kind: {state: count}}."""
+
+	@abc.abstractmethod
+	def is_drained(self):
+		"""True once no job is pending or leased."""
+
+	def close(self):
+		pass
+
+
+class SqliteWorkQueue(WorkQueue):
+	"""
+	WorkQueue in a SQLite file, the default backend.
+
+	Every process opens the file itself; leases are taken in an immediate
+	transaction, so two workers never get the same job. Results are stored
+	zlib-compressed next to their job. Fits any number of workers on one
+	machine; across machines the file must be on storage with working
+	locks, or another backend used. Safe to share between threads.
+	"""
+
+	def __init__(self, path, max_attempts=3):
+		self.path = path
+		self.max_attempts = max_attempts
+		self.lock = threading.Lock()
+		# Transactions are opened explicitly, so leasing can take the write lock up front
+		self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60, isolation_level=None)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.executescript(
+			"""
+			CREATE TABLE IF NOT EXISTS jobs (
+				id INTEGER PRIMARY KEY,
+				kind TEXT NOT NULL,
+				key TEXT NOT NULL UNIQUE,
+				priority INTEGER NOT NULL,
+				payload TEXT NOT NULL,
+				state TEXT NOT NULL DEFAULT 'pending',
+				attempts INTEGER NOT NULL DEFAULT 0,
+				worker TEXT,
+				lease_token TEXT,
+				lease_expires REAL,
+				result BLOB,
+				error TEXT,
+				updated_at REAL
+			);
+			CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority, id);
+			"""
+		)
+
+	def _transaction(self):
+		self.conn.execute("BEGIN IMMEDIATE")
+
+	def enqueue(self, jobs):
+		with self.lock:
+			self._transaction()
+			added = self._insert(jobs)
+			self.conn.execute("COMMIT")
+		return added
+
+	def _insert(self, jobs):
+		before = self.conn.total_changes
+		self.conn.executemany(
+			"INSERT OR IGNORE INTO jobs (kind, key, priority, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+			[(kind, key, PRIORITY.get(kind, 0), json.dumps(payload), time.time()) for kind, key, payload in jobs]
+		)
+		return self.conn.total_changes - before
+
+	def lease(self, worker, duration):
+		with self.lock:
+			self._transaction()
+			try:
+				lease = self._next_lease(worker, duration)
+			except BaseException:
+				self.conn.execute("ROLLBACK")
+				raise
+			self.conn.execute("COMMIT")
+		return lease
+
+	def _next_lease(self, worker, duration):
+		while True:
+			now = time.time()
+			row = self.conn.execute(
+				"""SELECT id, kind, payload, attempts FROM jobs
+				WHERE state = 'pending' OR (state = 'leased' AND lease_expires < ?)
+				ORDER BY priority, id LIMIT 1""",
+				(now,)
+			).fetchone()
+			if row is None:
+				return None
+			job_id, kind, payload, attempts = row
+			if attempts >= self.max_attempts:
+				# Every earlier holder stalled or crashed on it
+				self.conn.execute(
+					"""UPDATE jobs SET state = 'failed', lease_token = NULL, updated_at = ?,
+						error = COALESCE(error, 'lease expired') WHERE id = ?""",
+					(now, job_id)
+				)
+				continue
+			token = uuid.uuid4().hex
+			self.conn.execute(
+				"""UPDATE jobs SET state = 'leased', attempts = attempts + 1, worker = ?,
+					lease_token = ?, lease_expires = ?, updated_at = ? WHERE id = ?""",
+				(worker, token, now + duration, now, job_id)
+			)
+			return Lease(job_id, kind, json.loads(payload), token, now + duration)
+
+	def heartbeat(self, lease, duration):
+		expires = time.time() + duration
+		with self.lock:
+			cursor = self.conn.execute(
+				"UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_token = ? AND state = 'leased'",
+				(expires, lease.job_id, lease.token)
+			)
+		if cursor.rowcount != 1:
+			return False
+		lease.expires = expires
+		return True
+
+	def complete(self, lease, result=None, children=()):
+		payload = None if result is None else zlib.compress(json.dumps(result).encode("utf-8"))
+		with self.lock:
+			self._transaction()
+			try:
+				cursor = self.conn.execute(
+					"""UPDATE jobs SET state = 'done', result = ?, lease_token = NULL, updated_at = ?
+					WHERE id = ? AND lease_token = ? AND state = 'leased'""",
+					(payload, time.time(), lease.job_id, lease.token)
+				)
+				held = cursor.rowcount == 1
+				if held:
+					self._insert(children)
+			except BaseException:
+				self.conn.execute("ROLLBACK")
+				raise
+			self.conn.execute("COMMIT" if held else "ROLLBACK")
+		return held
+
+	def fail(self, lease, error):
+		with self.lock:
+			self.conn.execute(
+				"""UPDATE jobs SET
+					state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+					lease_token = NULL, error = ?, updated_at = ?
+				WHERE id = ? AND lease_token = ? AND state = 'leased'""",
+				(self.max_attempts, str(error), time.time(), lease.job_id, lease.token)
+			)
+
+	def results(self, kind="file"):
+		with self.lock:
+			rows = self.conn.execute(
+				"SELECT id FROM jobs WHERE kind = ? AND state = 'done' AND result IS NOT NULL ORDER BY id", (kind,)
+			).fetchall()
+		for (job_id,) in rows:
+			with self.lock:
+				payload, result = self.conn.execute(
+					"SELECT payload, result FROM jobs WHERE id = ?", (job_id,)
+				).fetchone()
+			yield json.loads(payload), json.loads(zlib.decompress(result))
+
+	def summary(self):
+		with self.lock:
+			rows = self.conn.execute("SELECT kind, state, COUNT(*) FROM jobs GROUP BY kind, state").fetchall()
+		summary = {}
+		for kind, state, count in rows:
+			summary.setdefault(kind, {})[state] = count
+		return summary
+
+	def is_drained(self):
+		with self.lock:
+			row = self.conn.execute("SELECT 1 FROM jobs WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+		return row is None
+
+	def close(self):
+		with self.lock:
+			self.conn.close()
+
+
+# Backends by URL scheme; a plain path is a SQLite file
+BACKENDS = {"sqlite": SqliteWorkQueue}
+
+
+def make_queue(spec, **kwargs):
+	"""Open the queue at `spec`, e.g. crawl_queue.sqlite or sqlite:///shared/crawl_queue.sqlite."""
+	scheme, sep, location = spec.partition("://")
+	if not sep:
+		return SqliteWorkQueue(spec, **kwargs)
+	if scheme not in BACKENDS:
+		raise ValueError(f"Unknown work queue backend: {scheme}")
+	return BACKENDS[scheme](location, **kwargs)